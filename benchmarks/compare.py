@@ -0,0 +1,50 @@
+"""Side by side comparison of two benchmark results files written by run.py."""
+
+import json
+
+from typing import Dict
+from typing import Iterator
+from typing import Tuple
+
+import click
+
+
+def flatten(results: Dict) -> Iterator[Tuple[Tuple[int, int, str], float]]:
+    """Yields ((sites, depth, timing name), seconds) for all timings in a results file."""
+    for result in results['results']:
+        for file_format, stages in result['stages'].items():
+            for stage, seconds in stages.items():
+                yield (result['sites'], result['depth'], f'{stage} ({file_format})'), seconds
+        for command, seconds in result['commands'].items():
+            yield (result['sites'], result['depth'], command), seconds
+
+
+@click.command()
+@click.argument('baseline_json_file', type=click.Path(exists=True))
+@click.argument('candidate_json_file', type=click.Path(exists=True))
+@click.option('--threshold', default=1.1, show_default=True, help='Flag timings slower than baseline by this factor')
+def main(baseline_json_file, candidate_json_file, threshold):
+    """Compare timings of two benchmark runs. Exits with status 1 if any timing regressed."""
+
+    with open(baseline_json_file, 'rt') as f:
+        baseline = dict(flatten(json.load(f)))
+    with open(candidate_json_file, 'rt') as f:
+        candidate = dict(flatten(json.load(f)))
+
+    regressed = False
+    click.echo('\t'.join(['sites', 'depth', 'timing', 'baseline', 'candidate', 'ratio']))
+    for key in sorted(baseline.keys() & candidate.keys()):
+        ratio = candidate[key] / baseline[key] if baseline[key] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = '\tSLOWER'
+            regressed = True
+        sites, depth, name = key
+        click.echo(f'{sites}\t{depth}\t{name}\t{baseline[key]:.4f}\t{candidate[key]:.4f}\t{ratio:.2f}{flag}')
+
+    if regressed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Timing of snpahoy stages and end-to-end commands on synthetic datasets.
+
+Results are written as JSON, so runs on different commits can be compared
+with compare.py."""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+from datetime import timezone
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import click
+import pysam
+
+from snpahoy.api import Panel
+from snpahoy.api import read_bed_file
+from snpahoy.api import sample_sites
+from snpahoy.results import get_details
+from snpahoy.core import Genotyper
+from snpahoy.counting import FetchCounter
+from snpahoy.counting import WindowedCounter
+from snpahoy.parsers import get_snp_table
+from snpahoy.parsers import get_snps
+from snpahoy.parsers import parse_bed_file
+
+from synthetic import Dataset
+from synthetic import generate_dataset
+
+
+def best_of(function: Callable[[], object], repeats: int) -> float:
+    """Returns the fastest of a number of wall clock timings (in seconds)."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def get_counts(alignment: pysam.AlignmentFile, chromosome: str, position: int, minimum_base_quality: int) -> Dict[str, int]:
+    """Counts bases at a single position with one count_coverage call, the baseline for the windowed counters."""
+    coverage = alignment.count_coverage(contig=chromosome, start=position, stop=position + 1, quality_threshold=minimum_base_quality)
+    return {'A': coverage[0][0], 'C': coverage[1][0], 'G': coverage[2][0], 'T': coverage[3][0]}
+
+
+def time_stages(dataset: Dataset, alignment_file: str, repeats: int) -> Dict[str, float]:
+    """Times the individual stages of a germline run on one alignment file."""
+
+    genotyper = Genotyper(minimum_coverage=30, homozygosity_threshold=0.95)
+    timings: Dict[str, float] = {}
+
+    def parse() -> None:
+        with open(dataset.bed_file, 'rt') as f:
+            parse_bed_file(f)
+
+    timings['parse_bed_file'] = best_of(parse, repeats)
+    timings['read_bed_file'] = best_of(lambda: read_bed_file(dataset.bed_file), repeats)
+
+    coordinates, _, _ = sample_sites(source=alignment_file,
+                                     panel=Panel.from_bed_file(bed_file=dataset.bed_file),
+                                     reference_fasta_file=dataset.reference_fasta_file)
+
+    with pysam.AlignmentFile(alignment_file, reference_filename=dataset.reference_fasta_file) as alignment:
+
+        def count_per_site() -> None:
+            for chromosome, position in coordinates:
+                get_counts(alignment, chromosome, position, 1)
+
+        def count_windowed() -> None:
+            counter = WindowedCounter(alignment=alignment, coordinates=coordinates, minimum_base_quality=1)
+            for chromosome, position in coordinates:
+                counter(chromosome, position)
+
+        def count_fetched() -> None:
+            counter = FetchCounter(alignment=alignment, coordinates=coordinates, minimum_base_quality=1)
+            for chromosome, position in coordinates:
+                counter(chromosome, position)
+
+        timings['get_counts'] = best_of(count_per_site, repeats)
+        timings['windowed_counts'] = best_of(count_windowed, repeats)
+        timings['fetch_counts'] = best_of(count_fetched, repeats)
+
+        counter = FetchCounter(alignment=alignment, coordinates=coordinates, minimum_base_quality=1)
+        counts = {(chromosome, position): counter(chromosome, position) for chromosome, position in coordinates}
+
+    def lookup(chromosome: str, position: int) -> Dict[str, int]:
+        return counts[(chromosome, position)]
+
+    timings['get_snps'] = best_of(lambda: get_snps(coordinates=coordinates, genotyper=genotyper, get_counts=lookup), repeats)
+    timings['get_snp_table'] = best_of(lambda: get_snp_table(coordinates=coordinates, genotyper=genotyper, get_counts=lookup), repeats)
+
+    snps = get_snp_table(coordinates=coordinates, genotyper=genotyper, get_counts=lookup)
+    timings['get_details'] = best_of(lambda: get_details(snps), repeats)
+
+    return timings
+
+
+def time_command(options: List[str], arguments: List[str], repeats: int) -> float:
+    """Times a snpahoy command line in a fresh interpreter, without the count cache."""
+    command = [sys.executable, '-c', 'from snpahoy.client import run; run()', '--no_cache', *options, *arguments]
+    return best_of(lambda: subprocess.run(command, check=True, stdout=subprocess.DEVNULL), repeats)
+
+
+def time_commands(dataset: Dataset, options: List[str], repeats: int, workers: int = 1) -> Dict[str, float]:
+    """Times the germline and somatic commands. Timings with more than one worker are named after the number of workers."""
+    timings: Dict[str, float] = {}
+    suffix = f'_workers{workers}' if workers > 1 else ''
+    options = ['--workers', str(workers), *options]
+    with tempfile.TemporaryDirectory() as directory:
+        output_json_file = os.path.join(directory, 'output.json')
+        for file_format, germline_file, tumor_file in [('bam', dataset.germline_bam_file, dataset.tumor_bam_file),
+                                                       ('cram', dataset.germline_cram_file, dataset.tumor_cram_file)]:
+            timings[f'germline_{file_format}{suffix}'] = time_command(options, ['germline',
+                                                                        '--bed_file', dataset.bed_file,
+                                                                        '--bam_file', germline_file,
+                                                                        '--reference_fasta_file', dataset.reference_fasta_file,
+                                                                        '--output_json_file', output_json_file], repeats)
+            timings[f'somatic_{file_format}{suffix}'] = time_command(options, ['somatic',
+                                                                       '--bed_file', dataset.bed_file,
+                                                                       '--tumor_bam_file', tumor_file,
+                                                                       '--germline_bam_file', germline_file,
+                                                                       '--reference_fasta_file', dataset.reference_fasta_file,
+                                                                       '--output_json_file', output_json_file], repeats)
+    return timings
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], check=True, capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@click.command()
+@click.option('--data_directory', type=click.Path(), required=True, help='Directory for (reused) synthetic datasets')
+@click.option('--output_json_file', type=click.Path(), required=True, help='JSON results file')
+@click.option('--sites', type=int, multiple=True, default=[100, 1000, 10000], show_default=True, help='Panel sizes. May be given several times')
+@click.option('--depth', type=int, multiple=True, default=[100], show_default=True, help='Read depths. May be given several times')
+@click.option('--repeats', default=3, show_default=True, help='Number of repeats (the fastest is reported)')
+@click.option('--seed', default=0, show_default=True, help='Random seed for dataset generation')
+@click.option('--workers', type=click.IntRange(min=1), multiple=True, default=[1], show_default=True,
+              help='Numbers of worker processes for the end-to-end commands. May be given several times')
+@click.option('--snpahoy_options', default='', help='Extra snpahoy options for the end-to-end commands, e.g. "--threads 4"')
+def main(data_directory, output_json_file, sites, depth, repeats, seed, workers, snpahoy_options):
+    """Time snpahoy stages and commands over a matrix of panel sizes and read depths."""
+
+    results = []
+    for number_of_sites in sites:
+        for read_depth in depth:
+            click.echo(f'sites={number_of_sites} depth={read_depth}', err=True)
+            dataset = generate_dataset(directory=data_directory, number_of_sites=number_of_sites, depth=read_depth, seed=seed)
+            commands: Dict[str, float] = {}
+            for number_of_workers in workers:
+                commands.update(time_commands(dataset=dataset, options=snpahoy_options.split(), repeats=repeats, workers=number_of_workers))
+            results.append({'sites': number_of_sites,
+                            'depth': read_depth,
+                            'stages': {'bam': time_stages(dataset=dataset, alignment_file=dataset.germline_bam_file, repeats=repeats),
+                                       'cram': time_stages(dataset=dataset, alignment_file=dataset.germline_cram_file, repeats=repeats)},
+                            'commands': commands})
+
+    with open(output_json_file, 'w') as f:
+        json.dump({'commit': git_commit(),
+                   'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                   'python': platform.python_version(),
+                   'pysam': pysam.__version__,
+                   'platform': platform.platform(),
+                   'cpus': os.cpu_count(),
+                   'repeats': repeats,
+                   'snpahoy-options': snpahoy_options,
+                   'results': results}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Generation of synthetic reference, BED panel and BAM/CRAM files for benchmarks."""
+
+import os
+import random
+
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import click
+import pysam
+
+
+READ_LENGTH = 100
+
+# Sizes of the synthetic chromosomes. SNP positions are spread evenly over them.
+CONTIGS = [('chr1', 12000000), ('chr2', 10000000), ('chr3', 8000000)]
+
+
+class Dataset:
+    """Paths of a generated dataset."""
+
+    def __init__(self, directory: str, number_of_sites: int, depth: int) -> None:
+        prefix = os.path.join(directory, f'sites{number_of_sites}_depth{depth}')
+        self.reference_fasta_file = os.path.join(directory, 'reference.fa')
+        self.bed_file = f'{prefix}.bed'
+        self.germline_bam_file = f'{prefix}_germline.bam'
+        self.tumor_bam_file = f'{prefix}_tumor.bam'
+        self.germline_cram_file = f'{prefix}_germline.cram'
+        self.tumor_cram_file = f'{prefix}_tumor.cram'
+
+    def exists(self) -> bool:
+        return all(os.path.exists(path) for path in [self.reference_fasta_file, self.bed_file, self.germline_bam_file,
+                                                     self.tumor_bam_file, self.germline_cram_file, self.tumor_cram_file])
+
+
+def write_reference(reference_fasta_file: str, rng: random.Random) -> Dict[str, str]:
+    sequences = {contig: ''.join(rng.choices('ACGT', k=length)) for contig, length in CONTIGS}
+    with open(reference_fasta_file, 'w') as f:
+        for contig, sequence in sequences.items():
+            f.write(f'>{contig}\n')
+            for start in range(0, len(sequence), 60):
+                f.write(f'{sequence[start:start + 60]}\n')
+    pysam.faidx(reference_fasta_file)
+    return sequences
+
+
+def read_reference(reference_fasta_file: str) -> Dict[str, str]:
+    with pysam.FastaFile(reference_fasta_file) as fasta:
+        return {contig: fasta.fetch(contig) for contig in fasta.references}
+
+
+def make_panel(number_of_sites: int, rng: random.Random) -> List[Tuple[str, int]]:
+    """Spreads SNP positions over the chromosomes, at least one read length apart."""
+    total_length = sum(length for _, length in CONTIGS)
+    numbers_of_contig_sites = [number_of_sites * length // total_length for _, length in CONTIGS]
+    numbers_of_contig_sites[0] += number_of_sites - sum(numbers_of_contig_sites)
+    sites: List[Tuple[str, int]] = []
+    for (contig, length), number_of_contig_sites in zip(CONTIGS, numbers_of_contig_sites):
+        if not number_of_contig_sites:
+            continue
+        spacing = (length - 2 * READ_LENGTH) // number_of_contig_sites
+        if spacing < READ_LENGTH:
+            raise click.BadParameter(f'Too many sites ({number_of_sites}) for the synthetic genome')
+        sites.extend((contig, READ_LENGTH + index * spacing + rng.randrange(spacing - READ_LENGTH)) for index in range(number_of_contig_sites))
+    return sites
+
+
+def write_alignments(alignment_file: str, reference: Dict[str, str], sites: List[Tuple[str, int]], genotypes: Dict[Tuple[str, int], str],
+                     depth: int, rng: random.Random, error_rate: float = 0.005) -> None:
+    """Writes a coordinate sorted and indexed BAM file with depth reads covering each
+    site. Reads carry an allele drawn from the genotype of the site."""
+
+    header = {'HD': {'VN': '1.6', 'SO': 'coordinate'}, 'SQ': [{'SN': contig, 'LN': length} for contig, length in CONTIGS]}
+    contig_ids = {contig: index for index, (contig, _) in enumerate(CONTIGS)}
+    qualities = pysam.qualitystring_to_array('I' * READ_LENGTH)
+
+    with pysam.AlignmentFile(alignment_file, 'wb', header=header) as output:
+        read = pysam.AlignedSegment(output.header)
+        number = 0
+        for contig, position in sorted(sites, key=lambda site: (contig_ids[site[0]], site[1])):
+            starts = sorted(position - rng.randrange(READ_LENGTH) for _ in range(depth))
+            for start in starts:
+                sequence = list(reference[contig][start:start + READ_LENGTH])
+                sequence[position - start] = rng.choice(genotypes[(contig, position)])
+                if rng.random() < error_rate:
+                    sequence[position - start] = rng.choice('ACGT')
+                read.query_name = f'read{number}'
+                read.flag = 16 if number % 2 else 0
+                read.reference_id = contig_ids[contig]
+                read.reference_start = start
+                read.mapping_quality = 60
+                read.cigartuples = [(0, READ_LENGTH)]
+                read.query_sequence = ''.join(sequence)
+                read.query_qualities = qualities
+                output.write(read)
+                number += 1
+
+    pysam.index(alignment_file)
+
+
+def generate_dataset(directory: str, number_of_sites: int, depth: int, seed: int = 0) -> Dataset:
+    """Generates (or reuses) reference, panel and germline/tumor BAM and CRAM files."""
+
+    os.makedirs(directory, exist_ok=True)
+    dataset = Dataset(directory=directory, number_of_sites=number_of_sites, depth=depth)
+    if dataset.exists():
+        return dataset
+
+    rng = random.Random(seed)
+
+    if os.path.exists(dataset.reference_fasta_file):
+        reference = read_reference(reference_fasta_file=dataset.reference_fasta_file)
+    else:
+        reference = write_reference(reference_fasta_file=dataset.reference_fasta_file, rng=rng)
+
+    sites = make_panel(number_of_sites=number_of_sites, rng=rng)
+    with open(dataset.bed_file, 'w') as f:
+        for contig, position in sites:
+            f.write(f'{contig}\t{position}\t{position + 1}\n')
+
+    # Roughly half of the sites are heterozygote.
+    genotypes = {site: reference[site[0]][site[1]] + (rng.choice('ACGT') if rng.random() < 0.5 else reference[site[0]][site[1]]) for site in sites}
+
+    for bam_file, cram_file in [(dataset.germline_bam_file, dataset.germline_cram_file), (dataset.tumor_bam_file, dataset.tumor_cram_file)]:
+        write_alignments(alignment_file=bam_file, reference=reference, sites=sites, genotypes=genotypes, depth=depth, rng=rng)
+        # The CRAM file holds the same reads as the BAM file.
+        with pysam.AlignmentFile(bam_file) as bam, pysam.AlignmentFile(cram_file, 'wc', template=bam, reference_filename=dataset.reference_fasta_file) as cram:
+            for read in bam:
+                cram.write(read)
+        pysam.index(cram_file)
+
+    return dataset
+
+
+@click.command()
+@click.option('--directory', type=click.Path(), required=True, help='Output directory')
+@click.option('--sites', default=1000, show_default=True, help='Number of SNP positions in panel')
+@click.option('--depth', default=100, show_default=True, help='Read depth at each SNP position')
+@click.option('--seed', default=0, show_default=True, help='Random seed')
+def main(directory, sites, depth, seed):
+    """Generate a synthetic dataset for benchmarking."""
+    dataset = generate_dataset(directory=directory, number_of_sites=sites, depth=depth, seed=seed)
+    click.echo(dataset.bed_file)
+
+
+if __name__ == '__main__':
+    main()
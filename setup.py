@@ -17,7 +17,8 @@ setup(
     python_requires='>=3.7',
 
     install_requires=[
-        'click',
+        'click >=8.0',
+        'numpy >=1.18',
         'pysam >=0.15',
     ],
 
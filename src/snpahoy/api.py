@@ -0,0 +1,469 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from pysam import AlignmentFile
+
+from snpahoy.cache import CountsCache
+from snpahoy.core import BASES
+from snpahoy.core import Genotyper
+from snpahoy.core import RAW_DEPTH
+from snpahoy.core import SNP
+from snpahoy.core import SNPTable
+from snpahoy.counting import DecodingOptions
+from snpahoy.counting import FetchCounter
+from snpahoy.counting import ReadFilter
+from snpahoy.counting import Window
+from snpahoy.counting import count_in_parallel
+from snpahoy.counting import open_alignment_file
+from snpahoy.metrics import Metrics
+from snpahoy.metrics import measure
+from snpahoy.panels import BasePanel
+from snpahoy.panels import CompiledPanel
+from snpahoy.panels import Panel
+from snpahoy.panels import read_bed_file
+from snpahoy.panels import write_panel_file
+from snpahoy.parsers import generate_snps
+from snpahoy.parsers import get_snp_table
+from snpahoy.sources import CountsFile
+from snpahoy.summaries import PairSummary
+from snpahoy.summaries import SampleSummary
+from snpahoy.summaries import summarize_pair
+from snpahoy.summaries import summarize_sample
+from snpahoy.triage import DEFAULT_CONFIDENCE
+from snpahoy.triage import TriageResult
+from snpahoy.triage import shuffle_coordinates
+from snpahoy.triage import triage_pair
+
+
+class Settings:
+    """Counting and genotyping settings, with the same defaults as the command line."""
+
+    def __init__(self, minimum_coverage: int = 30, minimum_base_quality: int = 1, homozygosity_threshold: float = 0.95,
+                 maximum_depth: Optional[int] = None, minimum_mapping_quality: int = 0, exclude_supplementary: bool = False) -> None:
+        if maximum_depth is not None and maximum_depth < minimum_coverage:
+            raise ValueError('Maximum depth must be at least the minimum coverage')
+        self.minimum_coverage = minimum_coverage
+        self.minimum_base_quality = minimum_base_quality
+        self.homozygosity_threshold = homozygosity_threshold
+        self.maximum_depth = maximum_depth
+        self.genotyper = Genotyper(minimum_coverage=minimum_coverage, homozygosity_threshold=homozygosity_threshold)
+        self.read_filter = ReadFilter(minimum_mapping_quality=minimum_mapping_quality,
+                                      exclude_supplementary=exclude_supplementary,
+                                      maximum_depth=maximum_depth)
+
+    def describe(self) -> Dict:
+        """Settings as reported in the results. Optional features are only included when used."""
+        settings = {'minimum-coverage': self.minimum_coverage,
+                    'minimum-base-quality': self.minimum_base_quality,
+                    'homozygosity-threshold': self.homozygosity_threshold}
+        settings.update(self.read_filter.describe())
+        return settings
+
+
+class PrecomputedCounts:
+    """A file with base counts at the SNP positions (see CountsFile), to be used instead of
+    an alignment file. The format is given by the file name unless counts_format is set."""
+
+    def __init__(self, counts_file: str, counts_format: Optional[str] = None) -> None:
+        self.counts_file = counts_file
+        self.counts_format = counts_format
+
+
+# A sample is given by the path of a BAM/CRAM file, an open BAM/CRAM file or precomputed counts.
+Source = Union[str, AlignmentFile, PrecomputedCounts]
+
+# A panel is given by a Panel or CompiledPanel, the path of a BED file or (chromosome, start, stop) intervals.
+PanelLike = Union[BasePanel, str, Iterable[Tuple[str, int, int]]]
+
+
+class GermlineFingerprint:
+
+    def __init__(self, snps: SNPTable, summary: SampleSummary) -> None:
+        self.snps = snps
+        self.summary = summary
+
+
+class SomaticFingerprint:
+    """Genotypes of a germline sample and one or more tumor samples, with a summary per tumor."""
+
+    def __init__(self, germline_snps: SNPTable, tumors_snps: List[SNPTable], summaries: List[PairSummary]) -> None:
+        self.germline_snps = germline_snps
+        self.tumors_snps = tumors_snps
+        self.summaries = summaries
+
+    @property
+    def tumor_snps(self) -> SNPTable:
+        """Genotypes of the (first) tumor sample."""
+        return self.tumors_snps[0]
+
+    @property
+    def summary(self) -> PairSummary:
+        """Summary of the (first) tumor sample."""
+        return self.summaries[0]
+
+
+def compile_panel(bed_file: str, reference_fasta_file: str, panel_file: str) -> CompiledPanel:
+    """Compiles the intervals of a BED file into a panel file (see CompiledPanel) and opens it.
+    Raises PanelFileError if intervals are not on contigs of the reference."""
+    write_panel_file(path=panel_file, intervals=read_bed_file(bed_file=bed_file), reference_fasta_file=reference_fasta_file, bed_file=bed_file)
+    return CompiledPanel(panel_file=panel_file)
+
+
+def count_snps(bam_file: str, reference_fasta_file: Optional[str], coordinates: List[Tuple[str, int]],
+               genotyper: Genotyper, minimum_base_quality: int, workers: int, cache: Optional[CountsCache] = None,
+               decoding: Optional[DecodingOptions] = None, read_filter: Optional[ReadFilter] = None,
+               metrics: Optional[Metrics] = None, alignment: Optional[AlignmentFile] = None, windows: Optional[List[Window]] = None) -> SNPTable:
+    """Counts and genotypes SNP positions, using the count cache if given. An already open handle
+    to bam_file (alignment) is used for counting instead of opening the file again. Windows of the
+    positions are made while counting, unless given (see Panel.windows)."""
+
+    if cache is not None:
+        with measure(metrics, 'cache'):
+            key = cache.key(alignment_file=bam_file, coordinates=coordinates, minimum_base_quality=minimum_base_quality,
+                            read_filter=read_filter.describe() if read_filter else None)
+            cached_counts = cache.get(key=key)
+        if cached_counts is not None:
+            if metrics:
+                metrics.increment('cache-hits')
+            counts = dict(zip(coordinates, cached_counts))
+            return get_snp_table(coordinates=coordinates,
+                                 genotyper=genotyper,
+                                 get_counts=lambda chromosome, position: counts[(chromosome, position)],
+                                 metrics=metrics)
+        snps = count_snps(bam_file=bam_file,
+                          reference_fasta_file=reference_fasta_file,
+                          coordinates=coordinates,
+                          genotyper=genotyper,
+                          minimum_base_quality=minimum_base_quality,
+                          workers=workers,
+                          decoding=decoding,
+                          read_filter=read_filter,
+                          metrics=metrics,
+                          alignment=alignment,
+                          windows=windows)
+        with measure(metrics, 'cache'):
+            rows = snps.counts.tolist()
+            if snps.capped:
+                rows = [site_counts + [raw_depth] for site_counts, raw_depth in zip(rows, snps.raw_depths().tolist())]
+            cache.put(key=key, counts=[dict(zip((*BASES, RAW_DEPTH), site_counts)) for site_counts in rows])
+        return snps
+
+    if workers > 1 and alignment is None:
+        with measure(metrics, 'counting'):
+            counts = count_in_parallel(alignment_file=bam_file,
+                                       reference_fasta_file=reference_fasta_file,
+                                       coordinates=coordinates,
+                                       minimum_base_quality=minimum_base_quality,
+                                       workers=workers,
+                                       decoding=decoding,
+                                       read_filter=read_filter,
+                                       metrics=metrics,
+                                       windows=windows)
+        return get_snp_table(coordinates=coordinates,
+                             genotyper=genotyper,
+                             get_counts=lambda chromosome, position: counts[(chromosome, position)],
+                             metrics=metrics)
+
+    if alignment is None:
+        with open_alignment_file(alignment_file=bam_file, reference_fasta_file=reference_fasta_file, decoding=decoding) as opened_alignment:
+            if metrics:
+                metrics.increment('file-opens')
+            return count_snps(bam_file=bam_file,
+                              reference_fasta_file=reference_fasta_file,
+                              coordinates=coordinates,
+                              genotyper=genotyper,
+                              minimum_base_quality=minimum_base_quality,
+                              workers=1,
+                              read_filter=read_filter,
+                              metrics=metrics,
+                              alignment=opened_alignment,
+                              windows=windows)
+
+    return get_snp_table(coordinates=coordinates,
+                         genotyper=genotyper,
+                         get_counts=FetchCounter(alignment=alignment,
+                                                 coordinates=coordinates,
+                                                 minimum_base_quality=minimum_base_quality,
+                                                 read_filter=read_filter,
+                                                 metrics=metrics,
+                                                 windows=windows),
+                         metrics=metrics)
+
+
+def _count_snps_in_worker(collect_metrics: bool, **kwargs) -> Tuple[SNPTable, Optional[Metrics]]:
+    """Runs count_snps in a worker process, returning the metrics collected there (if any) along with the SNPs."""
+    metrics = Metrics() if collect_metrics else None
+    return count_snps(metrics=metrics, **kwargs), metrics
+
+
+def read_snps(counts_file: str, coordinates: List[Tuple[str, int]], genotyper: Genotyper, minimum_base_quality: int,
+              counts_format: Optional[str] = None, reference_fasta_file: Optional[str] = None,
+              metrics: Optional[Metrics] = None) -> SNPTable:
+    """Genotypes SNP positions from precomputed counts (see CountsFile) instead of an alignment file."""
+    with measure(metrics, 'read-counts-file'):
+        counts = CountsFile(counts_file=counts_file,
+                            coordinates=coordinates,
+                            counts_format=counts_format,
+                            minimum_base_quality=minimum_base_quality,
+                            reference_fasta_file=reference_fasta_file)
+    return get_snp_table(coordinates=coordinates, genotyper=genotyper, get_counts=counts, metrics=metrics)
+
+
+def as_panel(panel: PanelLike) -> BasePanel:
+    if isinstance(panel, BasePanel):
+        return panel
+    if isinstance(panel, str):
+        return Panel.from_bed_file(bed_file=panel)
+    return Panel(intervals=panel)
+
+
+def source_path(source: Source) -> str:
+    """Path of the file holding a sample."""
+    if isinstance(source, PrecomputedCounts):
+        return source.counts_file
+    if isinstance(source, AlignmentFile):
+        return os.fsdecode(source.filename)
+    return source
+
+
+def sample_contigs(source: Source, panel: BasePanel, reference_fasta_file: Optional[str] = None,
+                   metrics: Optional[Metrics] = None) -> Optional[Dict[str, int]]:
+    """Contigs (names and lengths) in the header of the alignment file of a sample, after checking
+    those of the panel against them (see Panel.check_contigs). None for precomputed counts."""
+    if isinstance(source, PrecomputedCounts):
+        return None
+    if isinstance(source, AlignmentFile):
+        contigs = dict(zip(source.references, source.lengths))
+    else:
+        with measure(metrics, 'coordinates'):
+            with AlignmentFile(source, reference_filename=reference_fasta_file) as alignment:
+                contigs = dict(zip(alignment.references, alignment.lengths))
+            if metrics:
+                metrics.increment('file-opens')
+    panel.check_contigs(contigs=contigs)
+    return contigs
+
+
+def sample_sites(source: Source, panel: BasePanel, reference_fasta_file: Optional[str] = None,
+                 metrics: Optional[Metrics] = None) -> Tuple[List[Tuple[str, int]], Optional[List[Window]], Optional[str]]:
+    """SNP positions of a panel, ordered as in the header of the alignment file of a sample (and as
+    in the BED file for precomputed counts), with their counting windows and reference bases in the
+    same order (see Panel.windows and Panel.reference_bases)."""
+    contigs = sample_contigs(source=source, panel=panel, reference_fasta_file=reference_fasta_file, metrics=metrics)
+    contig_order = list(contigs) if contigs is not None else None
+    return panel.coordinates(contig_order=contig_order), panel.windows(contig_order=contig_order), panel.reference_bases(contig_order=contig_order)
+
+
+def count_sample(source: Source, coordinates: List[Tuple[str, int]], settings: Settings, reference_fasta_file: Optional[str] = None,
+                 workers: int = 1, cache: Optional[CountsCache] = None, decoding: Optional[DecodingOptions] = None,
+                 metrics: Optional[Metrics] = None, windows: Optional[List[Window]] = None) -> SNPTable:
+    """Counts and genotypes the SNP positions of a sample (in the given windows, if any)."""
+    if isinstance(source, PrecomputedCounts):
+        return read_snps(counts_file=source.counts_file,
+                         coordinates=coordinates,
+                         genotyper=settings.genotyper,
+                         minimum_base_quality=settings.minimum_base_quality,
+                         counts_format=source.counts_format,
+                         reference_fasta_file=reference_fasta_file,
+                         metrics=metrics)
+    return count_snps(bam_file=source_path(source),
+                      reference_fasta_file=reference_fasta_file,
+                      coordinates=coordinates,
+                      genotyper=settings.genotyper,
+                      minimum_base_quality=settings.minimum_base_quality,
+                      workers=workers,
+                      cache=cache,
+                      decoding=decoding,
+                      read_filter=settings.read_filter,
+                      metrics=metrics,
+                      alignment=source if isinstance(source, AlignmentFile) else None,
+                      windows=windows)
+
+
+def fingerprint_germline(source: Source, panel: PanelLike, settings: Optional[Settings] = None, reference_fasta_file: Optional[str] = None,
+                         workers: int = 1, cache: Optional[CountsCache] = None, decoding: Optional[DecodingOptions] = None,
+                         metrics: Optional[Metrics] = None) -> GermlineFingerprint:
+    """Genotypes a sample at all SNP positions of a panel and summarizes the genotypes."""
+
+    settings = settings or Settings()
+    panel = as_panel(panel=panel)
+
+    coordinates, windows, reference_bases = sample_sites(source=source, panel=panel, reference_fasta_file=reference_fasta_file, metrics=metrics)
+    snps = count_sample(source=source,
+                        coordinates=coordinates,
+                        settings=settings,
+                        reference_fasta_file=reference_fasta_file,
+                        workers=workers,
+                        cache=cache,
+                        decoding=decoding,
+                        metrics=metrics,
+                        windows=windows)
+    snps.reference_bases = reference_bases
+
+    with measure(metrics, 'summary'):
+        summary = summarize_sample(snps=snps)
+
+    return GermlineFingerprint(snps=snps, summary=summary)
+
+
+def fingerprint_somatic(tumors: Union[Source, Sequence[Source]], germline: Source, panel: PanelLike, settings: Optional[Settings] = None,
+                        reference_fasta_file: Optional[str] = None, workers: int = 1, cache: Optional[CountsCache] = None,
+                        decoding: Optional[DecodingOptions] = None, metrics: Optional[Metrics] = None) -> SomaticFingerprint:
+    """Genotypes one or more tumor samples and a germline sample at all SNP positions of a panel,
+    and compares each tumor to the germline sample. SNP positions are ordered by the germline sample."""
+
+    settings = settings or Settings()
+    panel = as_panel(panel=panel)
+    tumors = [tumors] if isinstance(tumors, (str, AlignmentFile, PrecomputedCounts)) else list(tumors)
+
+    # Contigs of all samples are checked before counting any of them.
+    for tumor in tumors:
+        sample_contigs(source=tumor, panel=panel, reference_fasta_file=reference_fasta_file, metrics=metrics)
+    coordinates, windows, reference_bases = sample_sites(source=germline, panel=panel, reference_fasta_file=reference_fasta_file, metrics=metrics)
+
+    def count(source: Source, workers: int) -> SNPTable:
+        return count_sample(source=source,
+                            coordinates=coordinates,
+                            settings=settings,
+                            reference_fasta_file=reference_fasta_file,
+                            workers=workers,
+                            cache=cache,
+                            decoding=decoding,
+                            metrics=metrics,
+                            windows=windows)
+
+    # The germline sample is counted once and compared against every tumor.
+    germline_snps = count(source=germline, workers=workers)
+
+    tumors_snps: Dict[int, SNPTable] = {}
+    alignment_files = [index for index, tumor in enumerate(tumors) if isinstance(tumor, str)]
+
+    if len(alignment_files) > 1 and workers > 1:
+        # Count the tumors concurrently, one worker process per tumor.
+        with measure(metrics, 'counting'), ProcessPoolExecutor(max_workers=min(workers, len(alignment_files))) as executor:
+            futures = {index: executor.submit(_count_snps_in_worker,
+                                              collect_metrics=metrics is not None,
+                                              bam_file=tumors[index],
+                                              reference_fasta_file=reference_fasta_file,
+                                              coordinates=coordinates,
+                                              genotyper=settings.genotyper,
+                                              minimum_base_quality=settings.minimum_base_quality,
+                                              workers=1,
+                                              cache=cache,
+                                              decoding=decoding,
+                                              read_filter=settings.read_filter,
+                                              windows=windows) for index in alignment_files}
+            for index, future in futures.items():
+                tumor_snps, tumor_metrics = future.result()
+                tumors_snps[index] = tumor_snps
+                if metrics and tumor_metrics:
+                    metrics.merge(tumor_metrics)
+
+    for index, tumor in enumerate(tumors):
+        if index not in tumors_snps:
+            tumors_snps[index] = count(source=tumor, workers=workers)
+
+    for snps in [germline_snps, *tumors_snps.values()]:
+        snps.reference_bases = reference_bases
+
+    with measure(metrics, 'summary'):
+        summaries = [summarize_pair(germline_snps=germline_snps, tumor_snps=tumors_snps[index]) for index in range(len(tumors))]
+
+    return SomaticFingerprint(germline_snps=germline_snps, tumors_snps=[tumors_snps[index] for index in range(len(tumors))], summaries=summaries)
+
+
+def iterate_snps(source: Source, panel: PanelLike, settings: Optional[Settings] = None, reference_fasta_file: Optional[str] = None,
+                 decoding: Optional[DecodingOptions] = None) -> Iterator[SNP]:
+    """Yields the SNPs of a sample one by one, as they are counted and genotyped. The count cache is not used."""
+
+    settings = settings or Settings()
+    panel = as_panel(panel=panel)
+
+    if isinstance(source, str):
+        with open_alignment_file(alignment_file=source, reference_fasta_file=reference_fasta_file, decoding=decoding) as alignment:
+            yield from iterate_snps(source=alignment, panel=panel, settings=settings, reference_fasta_file=reference_fasta_file)
+        return
+
+    coordinates, windows, reference_bases = sample_sites(source=source, panel=panel)
+    get_counts: Callable[[str, int], Dict[str, int]]
+    if isinstance(source, PrecomputedCounts):
+        get_counts = CountsFile(counts_file=source.counts_file,
+                                coordinates=coordinates,
+                                counts_format=source.counts_format,
+                                minimum_base_quality=settings.minimum_base_quality,
+                                reference_fasta_file=reference_fasta_file)
+    else:
+        get_counts = FetchCounter(alignment=source,
+                                  coordinates=coordinates,
+                                  minimum_base_quality=settings.minimum_base_quality,
+                                  read_filter=settings.read_filter,
+                                  windows=windows)
+
+    yield from generate_snps(coordinates=coordinates, genotyper=settings.genotyper, get_counts=get_counts, reference_bases=reference_bases)
+
+
+def _site_counter(source: Source, coordinates: List[Tuple[str, int]], settings: Settings, stack: ExitStack,
+                  reference_fasta_file: Optional[str] = None, decoding: Optional[DecodingOptions] = None,
+                  metrics: Optional[Metrics] = None) -> Callable[[str, int], Dict[str, int]]:
+    """Counts bases of a sample one SNP position at a time (without reading the neighbouring
+    positions along), remembering the counts. Files opened are closed with the stack."""
+    if isinstance(source, PrecomputedCounts):
+        with measure(metrics, 'read-counts-file'):
+            return CountsFile(counts_file=source.counts_file,
+                              coordinates=coordinates,
+                              counts_format=source.counts_format,
+                              minimum_base_quality=settings.minimum_base_quality,
+                              reference_fasta_file=reference_fasta_file)
+    if isinstance(source, str):
+        source = stack.enter_context(open_alignment_file(alignment_file=source, reference_fasta_file=reference_fasta_file, decoding=decoding))
+        if metrics:
+            metrics.increment('file-opens')
+    return FetchCounter(alignment=source,
+                        coordinates=coordinates,
+                        minimum_base_quality=settings.minimum_base_quality,
+                        read_filter=settings.read_filter,
+                        maximum_size=1,
+                        metrics=metrics)
+
+
+def triage_somatic(tumors: Union[Source, Sequence[Source]], germline: Source, panel: PanelLike, settings: Optional[Settings] = None,
+                   reference_fasta_file: Optional[str] = None, confidence: float = DEFAULT_CONFIDENCE, seed: int = 0,
+                   decoding: Optional[DecodingOptions] = None, metrics: Optional[Metrics] = None) -> List[TriageResult]:
+    """Decides whether each tumor sample comes from the same person as the germline sample, visiting
+    SNP positions in a random (but reproducible) order and stopping as soon as a sequential test
+    reaches the confidence (see triage_pair). Only the positions visited are counted. The germline
+    counts are shared between tumors. The count cache is not used."""
+
+    settings = settings or Settings()
+    panel = as_panel(panel=panel)
+    tumors = [tumors] if isinstance(tumors, (str, AlignmentFile, PrecomputedCounts)) else list(tumors)
+
+    for tumor in tumors:
+        sample_contigs(source=tumor, panel=panel, reference_fasta_file=reference_fasta_file, metrics=metrics)
+    coordinates, _, _ = sample_sites(source=germline, panel=panel, reference_fasta_file=reference_fasta_file, metrics=metrics)
+    order = shuffle_coordinates(coordinates=coordinates, seed=seed)
+
+    results = []
+    with ExitStack() as stack:
+        germline_counts = _site_counter(source=germline, coordinates=coordinates, settings=settings, stack=stack,
+                                        reference_fasta_file=reference_fasta_file, decoding=decoding, metrics=metrics)
+        for tumor in tumors:
+            with ExitStack() as tumor_stack, measure(metrics, 'triage'):
+                tumor_counts = _site_counter(source=tumor, coordinates=coordinates, settings=settings, stack=tumor_stack,
+                                             reference_fasta_file=reference_fasta_file, decoding=decoding, metrics=metrics)
+                results.append(triage_pair(germline_snps=generate_snps(coordinates=order, genotyper=settings.genotyper, get_counts=germline_counts),
+                                           tumor_snps=generate_snps(coordinates=order, genotyper=settings.genotyper, get_counts=tumor_counts),
+                                           confidence=confidence))
+
+    return results
@@ -0,0 +1,58 @@
+import os
+
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+
+from snpahoy.exceptions import ManifestError
+
+
+class Sample:
+
+    def __init__(self, name: str, bam_file: str, germline_bam_file: Optional[str] = None) -> None:
+        self.name = name
+        self.bam_file = bam_file
+        self.germline_bam_file = germline_bam_file
+
+
+def parse_manifest(stream: Iterable[str]) -> List[Sample]:
+    """Parses a tab-separated manifest with columns sample, bam_file and (optionally)
+    germline_bam_file. Samples with a germline BAM file are run in somatic mode."""
+
+    lines = [line for line in stream if line.strip() and not line.startswith('#')]
+    if not lines:
+        raise ManifestError('Manifest is empty')
+
+    columns = lines[0].rstrip('\n').split('\t')
+    for column in ['sample', 'bam_file']:
+        if column not in columns:
+            raise ManifestError(f'Manifest is missing column {column}')
+
+    result: List[Sample] = []
+    for line in lines[1:]:
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) != len(columns):
+            raise ManifestError(f'Expected {len(columns)} columns in manifest line: {line.rstrip()}')
+        row = dict(zip(columns, fields))
+        result.append(Sample(name=row['sample'], bam_file=row['bam_file'], germline_bam_file=row.get('germline_bam_file') or None))
+
+    names = [sample.name for sample in result]
+    if len(set(names)) < len(names):
+        raise ManifestError('Sample names in manifest are not unique')
+
+    return result
+
+
+def read_checkpoint(checkpoint_file: str) -> Set[str]:
+    """Returns the names of samples recorded as completed."""
+    if not os.path.exists(checkpoint_file):
+        return set()
+    with open(checkpoint_file, 'rt') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def write_checkpoint(checkpoint_file: str, name: str) -> None:
+    """Records a sample as completed."""
+    with open(checkpoint_file, 'at') as f:
+        f.write(f'{name}\n')
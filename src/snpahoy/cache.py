@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'snpahoy')
+
+# Default upper bound on the total size of the cache (in megabytes).
+DEFAULT_CACHE_SIZE = 1024
+
+# Columns of the cached counts of a site (the raw depth only if the depth was capped).
+CACHED_FIELDS = ('A', 'C', 'G', 'T', 'raw_depth')
+
+
+def find_index_file(alignment_file: str) -> Optional[str]:
+    """Returns the path of the index belonging to a BAM/CRAM file, if any."""
+    root, _ = os.path.splitext(alignment_file)
+    for candidate in [f'{alignment_file}.bai', f'{alignment_file}.crai', f'{alignment_file}.csi', f'{root}.bai', f'{root}.crai', f'{root}.csi']:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+class CountsCache:
+    """On-disk cache of base counts at all SNP positions of a panel, with least
+    recently used entries evicted when the cache grows beyond maximum_size."""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIRECTORY, maximum_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self._directory = directory
+        self._maximum_size = maximum_size * 1024 * 1024
+
+    def key(self, alignment_file: str, coordinates: List[Tuple[str, int]], minimum_base_quality: int, read_filter: Optional[Dict] = None) -> str:
+        """Identifies an alignment file (by path, size and modification times), a panel, a base quality
+        threshold and read filter settings (as given by ReadFilter.describe)."""
+        index_file = find_index_file(alignment_file)
+        stat = os.stat(alignment_file)
+        identity = {'path': os.path.abspath(alignment_file),
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime_ns,
+                    'index-mtime': os.stat(index_file).st_mtime_ns if index_file else None,
+                    'panel': hashlib.sha256(repr(coordinates).encode()).hexdigest(),
+                    'minimum-base-quality': minimum_base_quality}
+        if read_filter:
+            # Only added when set, so entries written before read filters existed stay valid.
+            identity['read-filter'] = read_filter
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, int]]]:
+        path = os.path.join(self._directory, f'{key}.json')
+        try:
+            with open(path, 'rt') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return [dict(zip(CACHED_FIELDS, counts)) for counts in entry]
+
+    def put(self, key: str, counts: List[Dict[str, int]]) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        # Write to a temporary file first, so concurrent readers never see partial entries.
+        handle, temporary_path = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+        with os.fdopen(handle, 'wt') as f:
+            json.dump([[site[field] for field in CACHED_FIELDS if field in site] for site in counts], f, separators=(',', ':'))
+        os.replace(temporary_path, os.path.join(self._directory, f'{key}.json'))
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for name in os.listdir(self._directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self._directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self._maximum_size:
+                break
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except FileNotFoundError:
+                pass
+            total_size -= size
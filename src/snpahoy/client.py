@@ -1,174 +1,549 @@
 import click
+import cProfile
 import json
 import os
+import signal
+import sys
+import time
 
-from collections import defaultdict
-from typing import Dict, List
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from typing import Dict, Iterator, Optional
 
 from pysam import AlignmentFile
 
-from snpahoy.core import Genotyper, SNP
-from snpahoy.parsers import get_snps
-from snpahoy.parsers import parse_bed_file
-from snpahoy.utilities import count_heterozygotes
-from snpahoy.utilities import mean_minor_allele_frequency
-from snpahoy.utilities import mean_off_genotype_frequency
-
-
-def get_counts(alignment: AlignmentFile, chromosome: str, position: int, minimum_base_quality: int) -> Dict[str, int]:
-    coverage = alignment.count_coverage(contig=chromosome, start=position, stop=position + 1, quality_threshold=minimum_base_quality)
-    return {'A': coverage[0][0], 'C': coverage[1][0], 'G': coverage[2][0], 'T': coverage[3][0]}
-
-
-def get_details(snps: List[SNP]):
-
-    return {
-        snp.__str__(): {
-            'depth': snp.depth,
-            'counts': {base: snp.count(base) for base in list('ACGT')},
-            'alleles': {
-                'major': {
-                    'base': snp.major_allele if snp.count(snp.major_allele) > 0 else '',
-                    'frequency': float('%.4f' % snp.major_allele_frequency())
-                },
-                'minor': {
-                    'base': snp.minor_allele if snp.count(snp.minor_allele) > 0 else '',
-                    'frequency': float('%.4f' % snp.minor_allele_frequency())
-                }
-            },
-            'genotype': snp.genotype if snp.genotype else '',
-            'off_genotype_frequency': float('%.4f' % snp.off_genotype_frequency()) if snp.genotype else 0.0
-        }
-        for snp in snps}
+from snpahoy.api import PrecomputedCounts
+from snpahoy.api import Settings
+from snpahoy.api import compile_panel
+from snpahoy.api import count_sample
+from snpahoy.api import sample_contigs
+from snpahoy.batch import Sample
+from snpahoy.batch import parse_manifest
+from snpahoy.batch import read_checkpoint
+from snpahoy.batch import write_checkpoint
+from snpahoy.cache import CountsCache
+from snpahoy.cache import DEFAULT_CACHE_DIRECTORY
+from snpahoy.cache import DEFAULT_CACHE_SIZE
+from snpahoy.counting import DecodingOptions
+from snpahoy.counting import open_alignment_file
+from snpahoy.database import FingerprintDatabase
+from snpahoy.exceptions import ContigMismatchError
+from snpahoy.exceptions import CountsFileError
+from snpahoy.exceptions import JobError
+from snpahoy.exceptions import ManifestError
+from snpahoy.exceptions import PanelFileError
+from snpahoy.exceptions import PanelMismatchError
+from snpahoy.metrics import Metrics
+from snpahoy.metrics import measure
+from snpahoy.panels import BasePanel
+from snpahoy.panels import Panel
+from snpahoy.results import germline_results
+from snpahoy.results import somatic_results
+from snpahoy.results import source_name
+from snpahoy.results import triage_results
+from snpahoy.server import DEFAULT_MAXIMUM_OPEN_FILES
+from snpahoy.server import FingerprintService
+from snpahoy.server import FingerprintServer
+from snpahoy.server import HandlePool
+from snpahoy.server import remove_stale_socket
+from snpahoy.server import submit as submit_request
+from snpahoy.sources import COUNTS_FORMATS
+from snpahoy.triage import DEFAULT_CONFIDENCE
+from snpahoy.writers import DetailsWriter
+from snpahoy.writers import WRITERS
+
+
+@contextmanager
+def open_details_writer(output_format: str, output_details_file: Optional[str], summary_only: bool) -> Iterator[Optional[DetailsWriter]]:
+    """Opens a writer for SNP details in ndjson or tsv format. Nothing is opened for
+    json output (where details are part of the results) or if details are not wanted."""
+
+    if output_format == 'json' or summary_only:
+        yield None
+        return
+
+    if not output_details_file:
+        raise click.UsageError(f'--output_details_file is required with --output_format {output_format}')
+
+    with open(output_details_file, 'w') as details_file_handle:
+        yield WRITERS[output_format](details_file_handle)
+
+
+def write_results(results: Dict, output_json_file: str, metrics: Optional[Metrics] = None) -> None:
+    """Writes results as JSON. With metrics, these are reported in a metrics section."""
+
+    with measure(metrics, 'write-json'):
+        text = json.dumps(results, indent=4)
+
+    if metrics:
+        # The results are serialized before the metrics section is added, so that serialization can be part
+        # of it. The section is then spliced in as the last key, indented the same way as the other keys.
+        section = json.dumps(metrics.report(), indent=4).replace('\n', '\n    ')
+        text = f'{text[:-2]},\n    "metrics": {section}\n}}'
+
+    with open(output_json_file, 'w') as json_file_handle:
+        json_file_handle.write(text)
+
+
+def load_panel(bed_file: str) -> BasePanel:
+    """Reads the panel given with --bed_file (a BED file or a compiled panel)."""
+    try:
+        return BasePanel.load(path=bed_file)
+    except PanelFileError as error:
+        raise click.BadParameter(str(error), param_hint='--bed_file')
+
+
+def check_bam_contigs(bam_file: str, panel: BasePanel, reference_fasta_file: Optional[str]) -> None:
+    """Checks that all chromosomes of the panel are in the header of the BAM/CRAM file given with --bam_file."""
+    try:
+        sample_contigs(source=bam_file, panel=panel, reference_fasta_file=reference_fasta_file)
+    except ContigMismatchError as error:
+        raise click.BadParameter(str(error), param_hint='--bam_file')
+
+
+# Panel shared by all jobs in a batch worker process. Set once per process by
+# _initialize_batch_worker to avoid sending the panel along with every job.
+_batch_panel: BasePanel = Panel(intervals=[])
+
+
+def _initialize_batch_worker(panel: BasePanel) -> None:
+    global _batch_panel
+    _batch_panel = panel
+
+
+def _run_batch_job(sample: Sample, settings: Settings, bed_file: str, reference_fasta_file: Optional[str], output_json_file: str,
+                   cache: Optional[CountsCache], include_details: bool, decoding: Optional[DecodingOptions] = None,
+                   collect_metrics: bool = False) -> None:
+
+    metrics = Metrics() if collect_metrics else None
+
+    if sample.germline_bam_file:
+        results = somatic_results(settings=settings,
+                                  panel=_batch_panel,
+                                  bed_file=bed_file,
+                                  tumors=[sample.bam_file],
+                                  germline=sample.germline_bam_file,
+                                  reference_fasta_file=reference_fasta_file,
+                                  workers=1,
+                                  cache=cache,
+                                  include_details=include_details,
+                                  decoding=decoding,
+                                  metrics=metrics)
+    else:
+        results = germline_results(settings=settings,
+                                   panel=_batch_panel,
+                                   bed_file=bed_file,
+                                   source=sample.bam_file,
+                                   reference_fasta_file=reference_fasta_file,
+                                   workers=1,
+                                   cache=cache,
+                                   include_details=include_details,
+                                   decoding=decoding,
+                                   metrics=metrics)
+
+    write_results(results=results, output_json_file=output_json_file, metrics=metrics)
 
 
 @click.group()
 @click.option('--minimum_coverage', default=30, show_default=True, help='Only consider SNP positions with a least this coverage')
 @click.option('--minimum_base_quality', default=1, show_default=True, help='Only count bases with at least this quality')
+@click.option('--minimum_mapping_quality', default=0, show_default=True, type=click.IntRange(min=0), help='Only count reads with at least this mapping quality')
+@click.option('--exclude_supplementary', is_flag=True, help='Do not count supplementary alignments')
 @click.option('--homozygosity_threshold', default=0.95, show_default=True, help='Consider a SNP position homozygote if frequency of most common allele is this or higher')
+@click.option('--max_depth', type=click.IntRange(min=1), required=False, help='Count at most this many bases at each SNP position in BAM/CRAM files')
+@click.option('--workers', default=1, show_default=True, type=click.IntRange(min=1), help='Number of worker processes used for counting')
+@click.option('--cache_directory', type=click.Path(), default=DEFAULT_CACHE_DIRECTORY, show_default=True, help='Directory for caching base counts')
+@click.option('--cache_size', default=DEFAULT_CACHE_SIZE, show_default=True, help='Maximum size of the count cache in megabytes')
+@click.option('--no_cache', is_flag=True, help='Do not read or write cached base counts')
+@click.option('--threads', default=1, show_default=True, type=click.IntRange(min=1), help='Number of decompression threads per BAM/CRAM file')
+@click.option('--skip_reference_md5', is_flag=True, help='Do not verify MD5 checksums of the reference sequence when decoding CRAM files')
+@click.option('--profile', is_flag=True, help='Report timings and resource usage in a metrics section of the JSON output')
+@click.option('--profile_file', type=click.Path(), required=False, help='Write cProfile statistics of the run to this file')
 @click.pass_context
-def client(ctx, minimum_coverage, homozygosity_threshold, minimum_base_quality):
+def client(ctx, minimum_coverage, homozygosity_threshold, minimum_base_quality, minimum_mapping_quality, exclude_supplementary, max_depth, workers, cache_directory, cache_size, no_cache, threads, skip_reference_md5, profile, profile_file):
+
+    if max_depth is not None and max_depth < minimum_coverage:
+        raise click.BadParameter('Must be at least --minimum_coverage', param_hint='--max_depth')
 
-    ctx.obj['genotyper'] = Genotyper(minimum_coverage=minimum_coverage,
-                                     homozygosity_threshold=homozygosity_threshold)
+    ctx.obj['settings'] = Settings(minimum_coverage=minimum_coverage,
+                                   minimum_base_quality=minimum_base_quality,
+                                   homozygosity_threshold=homozygosity_threshold,
+                                   maximum_depth=max_depth,
+                                   minimum_mapping_quality=minimum_mapping_quality,
+                                   exclude_supplementary=exclude_supplementary)
 
-    results = {}
+    ctx.obj['workers'] = workers
+    ctx.obj['cache'] = None if no_cache else CountsCache(directory=cache_directory, maximum_size=cache_size)
+    ctx.obj['decoding'] = DecodingOptions(threads=threads, verify_reference_md5=not skip_reference_md5)
+    ctx.obj['metrics'] = Metrics() if profile else None
 
-    results['input'] = defaultdict(dict)
-    results['output'] = defaultdict(dict)
+    if profile_file:
+        profiler = cProfile.Profile()
+        profiler.enable()
 
-    results['input']['settings'] = {'minimum-coverage': minimum_coverage,
-                                    'minimum-base-quality': minimum_base_quality,
-                                    'homozygosity-threshold': homozygosity_threshold}
+        def dump_profile():
+            profiler.disable()
+            profiler.dump_stats(profile_file)
 
-    ctx.obj['results'] = results
+        ctx.call_on_close(dump_profile)
 
 
 @client.command()
-@click.option('--bed_file', type=click.Path(), required=True, help='BED file with SNP postions')
-@click.option('--tumor_bam_file', type=click.Path(), required=True, help='Tumor BAM file (must be indexed)')
-@click.option('--germline_bam_file', type=click.Path(), required=True, help='Germline BAM file (must be indexed)')
-@click.option('--reference_fasta_file', type=click.Path(), required=False, help='Reference FASTA file for CRAM files')
+@click.option('--bed_file', type=click.Path(), required=True, help='BED file with SNP postions, or a panel file made with panel compile')
+@click.option('--tumor_bam_file', type=click.Path(), required=False, multiple=True, help='Tumor BAM file (must be indexed). May be given several times')
+@click.option('--tumor_counts_file', type=click.Path(exists=True), required=False, multiple=True, help='Tumor base counts file (instead of a BAM file). May be given several times')
+@click.option('--germline_bam_file', type=click.Path(), required=False, help='Germline BAM file (must be indexed)')
+@click.option('--germline_counts_file', type=click.Path(exists=True), required=False, help='Germline base counts file (instead of a BAM file)')
+@click.option('--counts_format', type=click.Choice(COUNTS_FORMATS), required=False, help='Format of counts files  [default: given by file names]')
+@click.option('--reference_fasta_file', type=click.Path(), required=False, help='Reference FASTA file for CRAM files and gVCF reference blocks')
 @click.option('--output_json_file', type=click.Path(), required=True, help='JSON output file')
+@click.option('--output_format', type=click.Choice(['json', 'ndjson', 'tsv']), default='json', show_default=True, help='Format of SNP details. Details in ndjson and tsv format are written to --output_details_file')
+@click.option('--output_details_file', type=click.Path(), required=False, help='Output file for SNP details in ndjson or tsv format')
+@click.option('--summary_only', is_flag=True, help='Do not report details for each SNP position')
+@click.option('--triage', is_flag=True, help='Only decide whether the samples match, stopping as soon as the decision is confident')
+@click.option('--triage_confidence', type=click.FloatRange(0.5, 1, min_open=True, max_open=True), default=DEFAULT_CONFIDENCE, show_default=True, help='Confidence at which --triage decides')
 @click.pass_context
-def somatic(ctx, bed_file, tumor_bam_file, germline_bam_file, reference_fasta_file, output_json_file):
-
-    results = ctx.obj['results']
-
-    results['input']['files'] = {'bed-file': os.path.basename(bed_file)}
-    results['input']['files']['tumor-bam-file'] = os.path.basename(tumor_bam_file)
-    results['input']['files']['germline-bam-file'] = os.path.basename(germline_bam_file)
-
-    with open(bed_file, 'rt') as f:
-        snp_coordinates = parse_bed_file(f.read().splitlines())
-
-    germline_snps = get_snps(coordinates=snp_coordinates,
-                             genotyper=ctx.obj['genotyper'],
-                             get_counts=lambda chromosome, position: get_counts(alignment=AlignmentFile(germline_bam_file, reference_filename=reference_fasta_file),
-                                                                                chromosome=chromosome,
-                                                                                position=position,
-                                                                                minimum_base_quality=results['input']['settings']['minimum-base-quality']))
-
-    tumor_snps = get_snps(coordinates=snp_coordinates,
-                          genotyper=ctx.obj['genotyper'],
-                          get_counts=lambda chromosome, position: get_counts(alignment=AlignmentFile(tumor_bam_file, reference_filename=reference_fasta_file),
-                                                                             chromosome=chromosome,
-                                                                             position=position,
-                                                                             minimum_base_quality=results['input']['settings']['minimum-base-quality']))
-
-    results['output']['details'] = {'tumor': get_details(snps=tumor_snps),
-                                    'germline': get_details(snps=germline_snps)}
-
-    # Only consider SNPs which are genotyped in both germline and tumor sample.
-    genotyped_snp_pairs = []
-    for germline_snp, tumor_snp in zip(germline_snps, tumor_snps):
-        if germline_snp.genotype and tumor_snp.genotype:
-            genotyped_snp_pairs.append({'germline': germline_snp, 'tumor': tumor_snp})
-
-    number_of_heterozygotes_germline = count_heterozygotes(snps=[pair['germline'] for pair in genotyped_snp_pairs])
-    number_of_heterozygotes_tumor = count_heterozygotes(snps=[pair['tumor'] for pair in genotyped_snp_pairs])
-
-    # Homozygote positions are those at which the germline sample is homzygote.
-    germline_snps_at_homozygote_positions = [pair['germline'] for pair in genotyped_snp_pairs if pair['germline'].is_homozygote()]
-    tumor_snps_at_homozygote_positions = [pair['tumor'] for pair in genotyped_snp_pairs if pair['germline'].is_homozygote()]
-
-    results['output']['summary'] = {'snps': {'total': len(snp_coordinates), 'genotyped': len(genotyped_snp_pairs)}}
-
-    if genotyped_snp_pairs:
-        results['output']['summary']['tumor'] = {
-            'heterozygotes-fraction': float('%.4f' % (number_of_heterozygotes_tumor / len(genotyped_snp_pairs))),
-            'mean-maf-homozygote-sites': float('%.4f' % mean_minor_allele_frequency(snps=tumor_snps_at_homozygote_positions)),
-            'mean-off-genotype-frequency': float('%.4f' % mean_off_genotype_frequency(snps=[pair['tumor'] for pair in genotyped_snp_pairs]))
-        }
-        results['output']['summary']['germline'] = {
-            'heterozygotes-fraction': float('%.4f' % (number_of_heterozygotes_germline / len(genotyped_snp_pairs))),
-            'mean-maf-homozygote-sites': float('%.4f' % mean_minor_allele_frequency(snps=germline_snps_at_homozygote_positions)),
-            'mean-off-genotype-frequency': float('%.4f' % mean_off_genotype_frequency(snps=[pair['germline'] for pair in genotyped_snp_pairs]))
-        }
+def somatic(ctx, bed_file, tumor_bam_file, tumor_counts_file, germline_bam_file, germline_counts_file, counts_format, reference_fasta_file,
+            output_json_file, output_format, output_details_file, summary_only, triage, triage_confidence):
+
+    if not tumor_bam_file and not tumor_counts_file:
+        raise click.UsageError('Give at least one --tumor_bam_file or --tumor_counts_file')
+    if bool(germline_bam_file) == bool(germline_counts_file):
+        raise click.UsageError('Give exactly one of --germline_bam_file and --germline_counts_file')
+
+    tumors = [*tumor_bam_file, *(PrecomputedCounts(counts_file=path, counts_format=counts_format) for path in tumor_counts_file)]
+    tumor_names = [source_name(source=tumor) for tumor in tumors]
+    if len(set(tumor_names)) < len(tumor_names):
+        raise click.BadParameter('Tumor files must have distinct names', param_hint='--tumor_bam_file')
+
+    germline = PrecomputedCounts(counts_file=germline_counts_file, counts_format=counts_format) if germline_counts_file else germline_bam_file
+
+    if triage and (output_format != 'json' or output_details_file):
+        raise click.UsageError('No SNP details are reported with --triage')
+
+    with measure(ctx.obj['metrics'], 'read-bed-file'):
+        panel = load_panel(bed_file=bed_file)
+
+    if triage:
+        try:
+            results = triage_results(settings=ctx.obj['settings'],
+                                     panel=panel,
+                                     bed_file=bed_file,
+                                     tumors=tumors,
+                                     germline=germline,
+                                     reference_fasta_file=reference_fasta_file,
+                                     confidence=triage_confidence,
+                                     decoding=ctx.obj['decoding'],
+                                     metrics=ctx.obj['metrics'])
+        except (CountsFileError, ContigMismatchError) as error:
+            raise click.ClickException(str(error))
+        write_results(results=results, output_json_file=output_json_file, metrics=ctx.obj['metrics'])
+        return
+
+    try:
+        with open_details_writer(output_format=output_format, output_details_file=output_details_file, summary_only=summary_only) as details_writer:
+            results = somatic_results(settings=ctx.obj['settings'],
+                                      panel=panel,
+                                      bed_file=bed_file,
+                                      tumors=tumors,
+                                      germline=germline,
+                                      reference_fasta_file=reference_fasta_file,
+                                      workers=ctx.obj['workers'],
+                                      cache=ctx.obj['cache'],
+                                      include_details=output_format == 'json' and not summary_only,
+                                      details_writer=details_writer,
+                                      decoding=ctx.obj['decoding'],
+                                      metrics=ctx.obj['metrics'])
+    except (CountsFileError, ContigMismatchError) as error:
+        raise click.ClickException(str(error))
+
+    write_results(results=results, output_json_file=output_json_file, metrics=ctx.obj['metrics'])
 
-    with open(output_json_file, 'w') as json_file_handle:
-        json.dump(results, json_file_handle, indent=4)
+
+@client.command()
+@click.option('--bed_file', type=click.Path(), required=True, help='BED file with SNP postions, or a panel file made with panel compile')
+@click.option('--bam_file', type=click.Path(), required=False, help='BAM file (must be indexed)')
+@click.option('--counts_file', type=click.Path(exists=True), required=False, help='Base counts file (instead of a BAM file)')
+@click.option('--counts_format', type=click.Choice(COUNTS_FORMATS), required=False, help='Format of the counts file  [default: given by file name]')
+@click.option('--reference_fasta_file', type=click.Path(), required=False, help='Reference FASTA file for CRAM files and gVCF reference blocks')
+@click.option('--output_json_file', type=click.Path(), required=True, help='JSON output file')
+@click.option('--output_format', type=click.Choice(['json', 'ndjson', 'tsv']), default='json', show_default=True, help='Format of SNP details. Details in ndjson and tsv format are written to --output_details_file')
+@click.option('--output_details_file', type=click.Path(), required=False, help='Output file for SNP details in ndjson or tsv format')
+@click.option('--summary_only', is_flag=True, help='Do not report details for each SNP position')
+@click.pass_context
+def germline(ctx, bed_file, bam_file, counts_file, counts_format, reference_fasta_file, output_json_file, output_format, output_details_file, summary_only):
+
+    if bool(bam_file) == bool(counts_file):
+        raise click.UsageError('Give exactly one of --bam_file and --counts_file')
+
+    source = PrecomputedCounts(counts_file=counts_file, counts_format=counts_format) if counts_file else bam_file
+
+    with measure(ctx.obj['metrics'], 'read-bed-file'):
+        panel = load_panel(bed_file=bed_file)
+
+    try:
+        with open_details_writer(output_format=output_format, output_details_file=output_details_file, summary_only=summary_only) as details_writer:
+            results = germline_results(settings=ctx.obj['settings'],
+                                       panel=panel,
+                                       bed_file=bed_file,
+                                       source=source,
+                                       reference_fasta_file=reference_fasta_file,
+                                       workers=ctx.obj['workers'],
+                                       cache=ctx.obj['cache'],
+                                       include_details=output_format == 'json' and not summary_only,
+                                       details_writer=details_writer,
+                                       decoding=ctx.obj['decoding'],
+                                       metrics=ctx.obj['metrics'])
+    except (CountsFileError, ContigMismatchError) as error:
+        raise click.ClickException(str(error))
+
+    write_results(results=results, output_json_file=output_json_file, metrics=ctx.obj['metrics'])
 
 
 @client.command()
-@click.option('--bed_file', type=click.Path(), required=True, help='BED file with SNP postions')
+@click.option('--bed_file', type=click.Path(), required=True, help='BED file with SNP postions, or a panel file made with panel compile')
+@click.option('--manifest_file', type=click.Path(), required=True, help='Tab-separated manifest with columns sample, bam_file and (for somatic mode) germline_bam_file')
+@click.option('--reference_fasta_file', type=click.Path(), required=False, help='Reference FASTA file for CRAM files')
+@click.option('--output_directory', type=click.Path(), required=True, help='Directory for JSON output files (one per sample)')
+@click.option('--checkpoint_file', type=click.Path(), required=False, help='File recording completed samples  [default: OUTPUT_DIRECTORY/checkpoint.txt]')
+@click.option('--summary_only', is_flag=True, help='Do not report details for each SNP position')
+@click.pass_context
+def batch(ctx, bed_file, manifest_file, reference_fasta_file, output_directory, checkpoint_file, summary_only):
+
+    with open(manifest_file, 'rt') as f:
+        try:
+            samples = parse_manifest(f.read().splitlines())
+        except ManifestError as error:
+            raise click.BadParameter(str(error), param_hint='--manifest_file')
+
+    panel = load_panel(bed_file=bed_file)
+
+    os.makedirs(output_directory, exist_ok=True)
+
+    if not checkpoint_file:
+        checkpoint_file = os.path.join(output_directory, 'checkpoint.txt')
+
+    completed = read_checkpoint(checkpoint_file=checkpoint_file)
+    pending = [sample for sample in samples if sample.name not in completed]
+
+    click.echo(f'Skipping {len(samples) - len(pending)} completed samples', err=True)
+
+    failed = 0
+    start_time = time.time()
+
+    with ProcessPoolExecutor(max_workers=ctx.obj['workers'], initializer=_initialize_batch_worker, initargs=(panel,)) as executor:
+        futures = {executor.submit(_run_batch_job,
+                                   sample=sample,
+                                   settings=ctx.obj['settings'],
+                                   bed_file=bed_file,
+                                   reference_fasta_file=reference_fasta_file,
+                                   output_json_file=os.path.join(output_directory, f'{sample.name}.json'),
+                                   cache=ctx.obj['cache'],
+                                   include_details=not summary_only,
+                                   decoding=ctx.obj['decoding'],
+                                   collect_metrics=ctx.obj['metrics'] is not None): sample for sample in pending}
+        for future in as_completed(futures):
+            sample = futures[future]
+            try:
+                future.result()
+            except Exception as error:
+                failed += 1
+                click.echo(f'Sample {sample.name} failed: {error}', err=True)
+            else:
+                write_checkpoint(checkpoint_file=checkpoint_file, name=sample.name)
+
+    minutes = (time.time() - start_time) / 60
+    processed = len(pending) - failed
+    click.echo(f'Processed {processed} samples in {minutes:.2f} minutes ({processed / minutes if minutes else 0.0:.1f} samples per minute)', err=True)
+
+    if failed:
+        raise click.ClickException(f'{failed} samples failed')
+
+
+@client.group()
+def panel():
+    """Compile panels for faster loading."""
+
+
+@panel.command('compile')
+@click.option('--bed_file', type=click.Path(exists=True), required=True, help='BED file with SNP postions')
+@click.option('--reference_fasta_file', type=click.Path(exists=True), required=True, help='Reference FASTA file (must be indexed)')
+@click.option('--output_panel_file', type=click.Path(), required=True, help='Compiled panel file, to be given as --bed_file')
+def compile_command(bed_file, reference_fasta_file, output_panel_file):
+    """Compile a BED file into a memory-mapped panel with reference bases."""
+
+    try:
+        compiled_panel = compile_panel(bed_file=bed_file, reference_fasta_file=reference_fasta_file, panel_file=output_panel_file)
+    except PanelFileError as error:
+        raise click.ClickException(str(error))
+
+    click.echo(f'Compiled {len(compiled_panel)} SNP positions on {len(compiled_panel.contigs)} contigs', err=True)
+
+
+@client.group()
+def db():
+    """Store and search genotype fingerprints."""
+
+
+@db.command()
+@click.option('--database_file', type=click.Path(), required=True, help='Fingerprint database file (created if missing)')
+@click.option('--bed_file', type=click.Path(), required=True, help='BED file with SNP postions, or a panel file made with panel compile')
 @click.option('--bam_file', type=click.Path(), required=True, help='BAM file (must be indexed)')
 @click.option('--reference_fasta_file', type=click.Path(), required=False, help='Reference FASTA file for CRAM files')
-@click.option('--output_json_file', type=click.Path(), required=True, help='JSON output file')
+@click.option('--sample_name', required=False, help='Name of sample in database  [default: BAM file name]')
+@click.pass_context
+def add(ctx, database_file, bed_file, bam_file, reference_fasta_file, sample_name):
+
+    panel = load_panel(bed_file=bed_file)
+    check_bam_contigs(bam_file=bam_file, panel=panel, reference_fasta_file=reference_fasta_file)
+
+    # Sites are kept in BED file order, so the database does not depend on BAM headers.
+    snp_coordinates = panel.coordinates()
+
+    snps = count_sample(source=bam_file,
+                        coordinates=snp_coordinates,
+                        settings=ctx.obj['settings'],
+                        reference_fasta_file=reference_fasta_file,
+                        workers=ctx.obj['workers'],
+                        cache=ctx.obj['cache'],
+                        decoding=ctx.obj['decoding'])
+
+    try:
+        with FingerprintDatabase(path=database_file, coordinates=snp_coordinates) as database:
+            database.add(name=sample_name or os.path.basename(bam_file), genotypes=snps.genotypes)
+    except PanelMismatchError:
+        raise click.ClickException('Database was created with a different BED file')
+
+
+@db.command()
+@click.option('--database_file', type=click.Path(exists=True), required=True, help='Fingerprint database file')
+@click.option('--bed_file', type=click.Path(), required=True, help='BED file with SNP postions, or a panel file made with panel compile')
+@click.option('--bam_file', type=click.Path(), required=True, help='BAM file (must be indexed)')
+@click.option('--reference_fasta_file', type=click.Path(), required=False, help='Reference FASTA file for CRAM files')
+@click.option('--top', default=10, show_default=True, type=click.IntRange(min=1), help='Number of best matching samples to report')
 @click.pass_context
-def germline(ctx, bed_file, bam_file, reference_fasta_file, output_json_file):
+def query(ctx, database_file, bed_file, bam_file, reference_fasta_file, top):
 
-    results = ctx.obj['results']
+    panel = load_panel(bed_file=bed_file)
+    check_bam_contigs(bam_file=bam_file, panel=panel, reference_fasta_file=reference_fasta_file)
 
-    results['input']['files'] = {'bed-file': os.path.basename(bed_file)}
-    results['input']['files']['bam-file'] = os.path.basename(bam_file)
+    # Sites are kept in BED file order, so the database does not depend on BAM headers.
+    snp_coordinates = panel.coordinates()
 
-    with open(bed_file, 'rt') as f:
-        snp_coordinates = parse_bed_file(f.read().splitlines())
+    snps = count_sample(source=bam_file,
+                        coordinates=snp_coordinates,
+                        settings=ctx.obj['settings'],
+                        reference_fasta_file=reference_fasta_file,
+                        workers=ctx.obj['workers'],
+                        cache=ctx.obj['cache'],
+                        decoding=ctx.obj['decoding'])
 
-    snps = get_snps(coordinates=snp_coordinates,
-                    genotyper=ctx.obj['genotyper'],
-                    get_counts=lambda chromosome, position: get_counts(alignment=AlignmentFile(bam_file, reference_filename=reference_fasta_file),
-                                                                       chromosome=chromosome,
-                                                                       position=position,
-                                                                       minimum_base_quality=results['input']['settings']['minimum-base-quality']))
+    try:
+        with FingerprintDatabase(path=database_file, coordinates=snp_coordinates) as database:
+            matches = database.query(genotypes=snps.genotypes, top=top)
+    except PanelMismatchError:
+        raise click.ClickException('Database was created with a different BED file')
 
-    genotyped_snps = [snp for snp in snps if snp.genotype]
+    click.echo('\t'.join(['sample', 'concordance', 'genotyped']))
+    for name, concordance, genotyped in matches:
+        click.echo('\t'.join([name, '%.4f' % concordance, str(genotyped)]))
 
-    results['output']['details'] = get_details(snps=snps)
-    results['output']['summary'] = {'snps': {'total': len(snps), 'genotyped': len(genotyped_snps)}}
 
-    number_of_heterozygotes = count_heterozygotes(snps=genotyped_snps)
-    homozygote_snps = [snp for snp in snps if snp.is_homozygote()]
+@client.command()
+@click.option('--socket', 'socket_file', type=click.Path(), required=True, help='Unix socket to listen on')
+@click.option('--bed_file', type=click.Path(), required=True, help='BED file with SNP postions, or a panel file made with panel compile')
+@click.option('--max_open_files', default=DEFAULT_MAXIMUM_OPEN_FILES, show_default=True, type=click.IntRange(min=1), help='Maximum number of idle BAM/CRAM files kept open')
+@click.pass_context
+def serve(ctx, socket_file, bed_file, max_open_files):
+    """Run germline and somatic jobs submitted over a Unix socket."""
+
+    decoding = ctx.obj['decoding']
+
+    def open_file(alignment_file: str, reference_fasta_file: Optional[str]) -> AlignmentFile:
+        return open_alignment_file(alignment_file=alignment_file, reference_fasta_file=reference_fasta_file, decoding=decoding)
+
+    pool = HandlePool(open_file=open_file, maximum_size=max_open_files)
+    service = FingerprintService(settings=ctx.obj['settings'],
+                                 panel=load_panel(bed_file=bed_file),
+                                 bed_file=bed_file,
+                                 pool=pool,
+                                 cache=ctx.obj['cache'],
+                                 collect_metrics=ctx.obj['metrics'] is not None)
+
+    try:
+        remove_stale_socket(socket_file=socket_file)
+    except JobError as error:
+        raise click.ClickException(str(error))
+
+    # Shut down cleanly (closing files and removing the socket) when terminated.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    server = FingerprintServer(socket_file=socket_file, run_job=service.run)
+    click.echo(f'Listening on {socket_file}', err=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+        os.remove(socket_file)
+
+
+@client.group()
+@click.option('--socket', 'socket_file', type=click.Path(), required=True, help='Unix socket of a running server')
+@click.pass_context
+def submit(ctx, socket_file):
+    """Submit jobs to a running server."""
+    ctx.obj['socket_file'] = socket_file
 
-    if genotyped_snps:
-        results['output']['summary']['heterozygotes-fraction'] = float('%.4f' % (number_of_heterozygotes / len(genotyped_snps)))
-        results['output']['summary']['mean-maf-homozygote-sites'] = float('%.4f' % mean_minor_allele_frequency(snps=homozygote_snps))
-        results['output']['summary']['mean-off-genotype-frequency'] = float('%.4f' % mean_off_genotype_frequency(snps=genotyped_snps))
+
+def _submit_job(socket_file: str, request: Dict, output_json_file: str) -> None:
+    try:
+        results = submit_request(socket_file=socket_file, request=request)
+    except (OSError, JobError) as error:
+        raise click.ClickException(str(error))
 
     with open(output_json_file, 'w') as json_file_handle:
         json.dump(results, json_file_handle, indent=4)
 
 
+@submit.command(name='germline')
+@click.option('--bam_file', type=click.Path(), required=True, help='BAM file (must be indexed)')
+@click.option('--reference_fasta_file', type=click.Path(), required=False, help='Reference FASTA file for CRAM files')
+@click.option('--output_json_file', type=click.Path(), required=True, help='JSON output file')
+@click.option('--summary_only', is_flag=True, help='Do not report details for each SNP position')
+@click.pass_context
+def submit_germline(ctx, bam_file, reference_fasta_file, output_json_file, summary_only):
+
+    # Paths are sent as absolute paths, as the server may run in another directory.
+    request = {'mode': 'germline',
+               'bam_file': os.path.abspath(bam_file),
+               'reference_fasta_file': os.path.abspath(reference_fasta_file) if reference_fasta_file else None,
+               'summary_only': summary_only}
+
+    _submit_job(socket_file=ctx.obj['socket_file'], request=request, output_json_file=output_json_file)
+
+
+@submit.command(name='somatic')
+@click.option('--tumor_bam_file', type=click.Path(), required=True, multiple=True, help='Tumor BAM file (must be indexed). May be given several times')
+@click.option('--germline_bam_file', type=click.Path(), required=True, help='Germline BAM file (must be indexed)')
+@click.option('--reference_fasta_file', type=click.Path(), required=False, help='Reference FASTA file for CRAM files')
+@click.option('--output_json_file', type=click.Path(), required=True, help='JSON output file')
+@click.option('--summary_only', is_flag=True, help='Do not report details for each SNP position')
+@click.pass_context
+def submit_somatic(ctx, tumor_bam_file, germline_bam_file, reference_fasta_file, output_json_file, summary_only):
+
+    # Paths are sent as absolute paths, as the server may run in another directory.
+    request = {'mode': 'somatic',
+               'tumor_bam_files': [os.path.abspath(path) for path in tumor_bam_file],
+               'germline_bam_file': os.path.abspath(germline_bam_file),
+               'reference_fasta_file': os.path.abspath(reference_fasta_file) if reference_fasta_file else None,
+               'summary_only': summary_only}
+
+    _submit_job(socket_file=ctx.obj['socket_file'], request=request, output_json_file=output_json_file)
+
+
 def run():
     client(obj={})
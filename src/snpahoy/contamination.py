@@ -0,0 +1,213 @@
+from typing import Dict
+from typing import Optional
+
+import numpy as np
+
+from snpahoy.core import SNPTable
+
+
+# Contamination fractions are estimated between 0 and this (beyond it, the contaminant is the main sample).
+MAXIMUM_FRACTION = 0.5
+
+# Contamination is only estimated from at least this many sites, as a few sites say little about a
+# contaminant of unknown genotype (and a single site with reads of a third allele gives a large fraction).
+MINIMUM_SITES = 10
+
+# Number of points of each grid of contamination fractions, and number of grids (each one spanning
+# the neighbours of the best fraction of the previous grid).
+GRID_SIZE = 11
+GRID_REFINEMENTS = 3
+
+# Bounds on the per-base error rate, estimated from reads supporting neither allele of heterozygote sites.
+MINIMUM_ERROR_RATE = 1e-4
+MAXIMUM_ERROR_RATE = 0.1
+
+# Sites where the second most common base has at least this frequency are taken to be heterozygote
+# when estimating the error rate (as the third and fourth most common bases are then errors).
+HETEROZYGOTE_FREQUENCY = 0.2
+
+# Genotype states of a site in the sample itself: known homozygote (from a germline sample) or unknown.
+HOMOZYGOTE, UNKNOWN = 0, 1
+
+# Fraction of reads differing from the main allele of a site in each genotype, relative to the main allele:
+# homozygote for it, heterozygote, and homozygote for the other allele.
+ALLELE_FRACTIONS = np.array([0.0, 0.5, 1.0])
+
+# Probability of a site not following the model at all (like from mapping artifacts), in which case
+# any number of reads may differ from the main allele. Keeps a few such sites from dominating the estimate.
+OUTLIER_PROBABILITY = 0.01
+
+# Bounds on the heterozygosity used for genotype probabilities.
+MINIMUM_HETEROZYGOSITY = 0.01
+MAXIMUM_HETEROZYGOSITY = 0.5
+
+# Sites are evaluated in chunks of this many, so that the arrays of all components and fractions stay small.
+CHUNK_SITES = 1024
+
+# Components less likely than the most likely one at a site by more than this log ratio are left out,
+# as they would not change its likelihood in double precision.
+NEGLIGIBLE_LOG_RATIO = -40.0
+
+
+def genotype_priors(heterozygosity: float) -> np.ndarray:
+    """Probabilities of each genotype of the sample and the contaminant (relative to the main allele of
+    a site, which the sample has) for each genotype state of the sample, as a 2 x 3 x 3 array. Without
+    allele frequencies of the sites, all sites are taken to have the same minor allele frequency,
+    giving the heterozygosity of the panel under Hardy-Weinberg equilibrium. The contaminant is
+    unrelated, but more likely to share the allele of a homozygote sample (which is more likely the
+    major allele)."""
+
+    heterozygosity = min(max(heterozygosity, MINIMUM_HETEROZYGOSITY), MAXIMUM_HETEROZYGOSITY)
+    minor = (1 - np.sqrt(1 - 2 * heterozygosity)) / 2
+    major = 1 - minor
+
+    homozygote = major ** 2 + minor ** 2
+    given_homozygote = np.array([major ** 4 + minor ** 4, heterozygosity * homozygote, 2 * major ** 2 * minor ** 2]) / homozygote
+    given_heterozygote = np.array([(1 - heterozygosity) / 2, heterozygosity, (1 - heterozygosity) / 2])
+
+    priors = np.zeros((2, len(ALLELE_FRACTIONS), len(ALLELE_FRACTIONS)))
+    priors[HOMOZYGOTE, 0] = given_homozygote
+    priors[UNKNOWN, 0] = (1 - heterozygosity) * given_homozygote
+    priors[UNKNOWN, 1] = heterozygosity * given_heterozygote
+    return priors
+
+
+class ContaminationEstimate:
+    """Maximum likelihood estimate of the fraction of reads from another person, with the
+    log-likelihood ratio of the estimate against no contamination and the number of sites used."""
+
+    def __init__(self, fraction: float, log_likelihood_ratio: float, sites: int) -> None:
+        self.fraction = fraction
+        self.log_likelihood_ratio = log_likelihood_ratio
+        self.sites = sites
+
+    def as_dict(self) -> Dict:
+        return {'fraction': float('%.4f' % self.fraction),
+                'log-likelihood-ratio': float('%.4f' % self.log_likelihood_ratio),
+                'sites': self.sites}
+
+
+class _Likelihood:
+    """Log-likelihood of contamination fractions over a set of sites. At each site, k of n reads
+    differ from the main allele. The reads are a mixture of reads from the sample (in the given
+    genotype state) and from a contaminant (of unknown genotype), read with errors, unless the
+    site is an outlier. Sites with the same k, n and state are only evaluated once."""
+
+    def __init__(self, other_counts: np.ndarray, depths: np.ndarray, states: np.ndarray, error_rate: float, priors: np.ndarray) -> None:
+        # Sites are packed into one integer each, which is much faster to make unique than rows.
+        keys, weights = np.unique((depths.astype(np.int64) << 33) | (other_counts.astype(np.int64) << 1) | states, return_counts=True)
+        self._error_rate = error_rate
+
+        # Binomial coefficients are left out of the likelihoods of the genotype combinations, and so divided out of
+        # the (uniform) likelihood of outliers instead. The logarithms of factorials are cumulative sums.
+        log_factorials = np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, (keys >> 33).max() + 1)))])
+
+        # Sites are evaluated by genotype state, each with the genotype combinations possible in that state. The
+        # log-likelihood of each component is linear in k, n - k, 1 and the outlier log-likelihood of a site, so
+        # these make up one row per site, and all components are evaluated at once by a matrix product.
+        self._groups = []
+        for state in np.unique(keys & 1).tolist():
+            in_state = (keys & 1) == state
+            k = (keys[in_state] >> 1) & 0xFFFFFFFF
+            n = keys[in_state] >> 33
+            log_binomial_coefficients = log_factorials[n] - log_factorials[k] - log_factorials[n - k]
+            outlier_log_likelihoods = np.log(OUTLIER_PROBABILITY) - np.log(n + 1.0) - log_binomial_coefficients
+            components = np.array([(sample_fraction, contaminant_fraction, np.log((1 - OUTLIER_PROBABILITY) * priors[state, sample_genotype, contaminant_genotype]))
+                                   for sample_genotype, sample_fraction in enumerate(ALLELE_FRACTIONS)
+                                   for contaminant_genotype, contaminant_fraction in enumerate(ALLELE_FRACTIONS)
+                                   if priors[state, sample_genotype, contaminant_genotype] > 0])
+            sites = np.stack([k, n - k, np.ones(len(k)), outlier_log_likelihoods], axis=1).astype(np.float64)
+            self._groups.append((sites, weights[in_state].astype(np.float64), components))
+
+    def __call__(self, fractions: np.ndarray) -> np.ndarray:
+        """Total log-likelihood of each contamination fraction."""
+        fractions = np.asarray(fractions, dtype=np.float64)
+        total = np.zeros(len(fractions))
+        for sites, weights, components in self._groups:
+            sample_fractions, contaminant_fractions, log_priors = components[:, :1], components[:, 1:2], components[:, 2:]
+            allele_fractions = (1 - fractions) * sample_fractions + fractions * contaminant_fractions
+            # Reads of the other allele differ unless miscalled as the main allele, and reads of the
+            # main allele differ if miscalled as any of the three other bases.
+            p = allele_fractions * (1 - self._error_rate) + (1 - allele_fractions) * 3 * self._error_rate
+
+            # Coefficients of the rows of sites for each component (the last one for outliers) and fraction.
+            coefficients = np.zeros((len(components) + 1, 4, len(fractions)))
+            coefficients[:-1, 0] = np.log(p)
+            coefficients[:-1, 1] = np.log1p(-p)
+            coefficients[:-1, 2] = log_priors
+            coefficients[-1, 3] = 1.0
+
+            for start in range(0, len(sites), CHUNK_SITES):
+                # Components x sites x fractions, so that reducing over components is elementwise.
+                component_log_likelihoods = sites[start:start + CHUNK_SITES] @ coefficients
+                maximum = component_log_likelihoods.max(axis=0)
+                component_log_likelihoods -= maximum
+                likelihood_ratios = np.zeros_like(component_log_likelihoods)
+                np.exp(component_log_likelihoods, out=likelihood_ratios, where=component_log_likelihoods > NEGLIGIBLE_LOG_RATIO)
+                total += weights[start:start + CHUNK_SITES] @ (maximum + np.log(likelihood_ratios.sum(axis=0)))
+        return total
+
+
+def _maximize(likelihood: _Likelihood) -> float:
+    """Finds the most likely fraction on a grid, which is refined around the best fraction a number of
+    times. The final fraction is interpolated from a parabola through the best and neighbouring fractions."""
+
+    low, high = 0.0, MAXIMUM_FRACTION
+    for _ in range(GRID_REFINEMENTS):
+        grid = np.linspace(low, high, GRID_SIZE)
+        values = likelihood(grid)
+        best = int(np.argmax(values))
+        low, high = grid[max(best - 1, 0)], grid[min(best + 1, GRID_SIZE - 1)]
+
+    fraction = float(grid[best])
+    if 0 < best < GRID_SIZE - 1:
+        before, at, after = values[best - 1:best + 2]
+        curvature = before - 2 * at + after
+        if curvature < 0:
+            fraction += float((grid[1] - grid[0]) * (before - after) / (2 * curvature))
+    return fraction
+
+
+def estimate_contamination(snps: SNPTable, germline_snps: Optional[SNPTable] = None, sites: Optional[np.ndarray] = None) -> Optional[ContaminationEstimate]:
+    """Estimates the contamination fraction of a sample from the base counts at its SNP positions
+    (only at sites, if given as a boolean mask). Without germline_snps, the genotypes of the sample
+    are unknown. With germline_snps (somatic mode), only sites where the germline sample is
+    homozygote are used, as tumors may lose either allele of heterozygote sites. Returns None
+    if there are fewer than MINIMUM_SITES such sites with coverage."""
+
+    counts = snps.counts.astype(np.int64)
+    depths = counts.sum(axis=1)
+    if sites is None:
+        sites = np.ones(len(snps), dtype=np.bool_)
+    sites = sites & (depths > 0)
+    if sites.sum() < MINIMUM_SITES:
+        return None
+
+    # At sites where the second most common base is frequent, the two most common bases are
+    # the alleles of the site, and the other two bases are errors (whatever the contamination).
+    sorted_counts = np.sort(counts, axis=1)
+    heterozygotes = sites & (sorted_counts[:, -2] >= HETEROZYGOTE_FREQUENCY * depths)
+    error_sites = heterozygotes if heterozygotes.any() else sites
+    error_rate = sorted_counts[error_sites, :2].sum() / (2 * depths[error_sites].sum())
+    error_rate = float(np.clip(error_rate, MINIMUM_ERROR_RATE, MAXIMUM_ERROR_RATE))
+
+    # The main allele of a site is the most common base of the sample giving the genotypes.
+    if germline_snps is not None:
+        heterozygosity = float(germline_snps.heterozygotes()[sites].mean())
+        sites = sites & germline_snps.homozygotes()
+        if sites.sum() < MINIMUM_SITES:
+            return None
+        main_allele = np.argmax(germline_snps.counts, axis=1)
+        states = np.full(len(snps), HOMOZYGOTE)
+    else:
+        heterozygosity = float(heterozygotes[sites].mean())
+        main_allele = np.argmax(counts, axis=1)
+        states = np.full(len(snps), UNKNOWN)
+    other_counts = depths - counts[np.arange(len(counts)), main_allele]
+
+    likelihood = _Likelihood(other_counts=other_counts[sites], depths=depths[sites], states=states[sites], error_rate=error_rate,
+                             priors=genotype_priors(heterozygosity=heterozygosity))
+    fraction = _maximize(likelihood=likelihood)
+    log_likelihood_ratio = float(np.diff(likelihood(np.array([0.0, fraction])))[0])
+
+    return ContaminationEstimate(fraction=fraction, log_likelihood_ratio=log_likelihood_ratio, sites=int(sites.sum()))
@@ -1,16 +1,34 @@
 from typing import Dict
+from typing import Iterator
+from typing import List
 from typing import Optional
 
+import numpy as np
+
 from snpahoy.exceptions import MissingGenotypeError, UnknownBaseError
 
 
+BASES = 'ACGT'
+
+# Key of the depth before capping in the base counts of a site, if bases were capped at a maximum depth while counting.
+RAW_DEPTH = 'raw_depth'
+
+# Genotype strings indexed by allele number (position in BASES).
+HOMOZYGOTE_GENOTYPES = np.array([2 * base for base in BASES], dtype=object)
+HETEROZYGOTE_GENOTYPES = np.array([[''.join(sorted([first, second])) for second in BASES] for first in BASES], dtype=object)
+
+
 class SNP:
 
-    def __init__(self, chromosome: str, position: int, genotype: Optional[str], counts: Dict[str, int]) -> None:
+    def __init__(self, chromosome: str, position: int, genotype: Optional[str], counts: Dict[str, int], raw_depth: Optional[int] = None,
+                 reference: Optional[str] = None) -> None:
         self._chromosome = chromosome
         self._position = position
         self._genotype = genotype
         self._counts = counts
+        self._raw_depth = raw_depth
+        self._reference = reference
+        self._alleles: Optional[List[str]] = None
 
     def __str__(self) -> str:
         return f'{self._chromosome}:{self._position}'
@@ -23,13 +41,35 @@ class SNP:
     def depth(self) -> int:
         return sum(self._counts.values())
 
+    @property
+    def raw_depth(self) -> Optional[int]:
+        """Number of bases at the site which passed the read and base filters, if bases were capped
+        at a maximum depth while counting (None otherwise). The depth is that of the bases counted."""
+        return self._raw_depth
+
+    @property
+    def reference(self) -> Optional[str]:
+        """Reference base (None if not known, as for panels which are not compiled)."""
+        return self._reference
+
+    @property
+    def alternate(self) -> str:
+        """Alleles of the genotype other than the reference base, comma-separated (empty if none or not genotyped)."""
+        return ','.join(sorted(set(self._genotype or '') - {self._reference}))
+
     @property
     def minor_allele(self) -> str:
-        return sorted(self._counts.items(), key=lambda x: (x[1], x[0]))[-2][0]
+        return self._sorted_alleles()[-2]
 
     @property
     def major_allele(self) -> str:
-        return sorted(self._counts.items(), key=lambda x: (x[1], x[0]))[-1][0]
+        return self._sorted_alleles()[-1]
+
+    def _sorted_alleles(self) -> List[str]:
+        # Sorting is done once, as the major and minor alleles are looked up repeatedly.
+        if self._alleles is None:
+            self._alleles = [base for base, _ in sorted(self._counts.items(), key=lambda x: (x[1], x[0]))]
+        return self._alleles
 
     def count(self, base: str) -> int:
         try:
@@ -82,3 +122,91 @@ class Genotyper:
         if max(frequencies) < self._homozygosity_threshold:
             return ''.join(sorted([most_frequent_allele, second_most_frequent_allele]))
         return 2 * most_frequent_allele
+
+    def genotype_batch(self, counts: np.ndarray) -> List[Optional[str]]:
+        """Genotypes all rows of an N x 4 matrix of A, C, G and T counts at once.
+        Gives the same result as calling genotype on each row."""
+
+        counts = counts.astype(np.int64)
+        coverage = counts.sum(axis=1)
+        genotyped = (coverage > 0) & (coverage >= self._minimum_coverage)
+
+        # A stable sort ranks tied alleles in ACGT order, just like genotype does.
+        order = np.argsort(-counts, axis=1, kind='stable')
+        most_frequent_allele, second_most_frequent_allele = order[:, 0], order[:, 1]
+
+        maximum_frequency = np.divide(counts.max(axis=1), coverage, out=np.zeros(len(counts)), where=coverage > 0)
+        homozygote = maximum_frequency >= self._homozygosity_threshold
+
+        genotypes = np.where(homozygote,
+                             HOMOZYGOTE_GENOTYPES[most_frequent_allele],
+                             HETEROZYGOTE_GENOTYPES[most_frequent_allele, second_most_frequent_allele])
+
+        return [genotype if is_genotyped else None for genotype, is_genotyped in zip(genotypes.tolist(), genotyped.tolist())]
+
+
+class SNPTable:
+    """Columnar storage of many SNPs: chromosomes, positions and genotypes, plus
+    an N x 4 matrix with A, C, G and T counts. Indexing and iteration give SNP
+    objects, so tables can be used wherever lists of SNPs are expected. If bases
+    were capped at a maximum depth while counting, the depths before capping are kept as raw_depths.
+    Reference bases are only known for compiled panels."""
+
+    def __init__(self, chromosomes: List[str], positions: List[int], counts: np.ndarray, genotypes: List[Optional[str]],
+                 raw_depths: Optional[np.ndarray] = None, reference_bases: Optional[str] = None) -> None:
+        self.chromosomes = chromosomes
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.uint32).reshape(-1, len(BASES))
+        self.genotypes = genotypes
+        self.capped = raw_depths is not None
+        self._raw_depths = np.asarray(raw_depths, dtype=np.int64) if raw_depths is not None else None
+        self.reference_bases = reference_bases
+        self._alleles = np.array([[base in (genotype or '') for base in BASES] for genotype in genotypes], dtype=np.bool_).reshape(-1, len(BASES))
+
+    @classmethod
+    def from_snps(cls, snps: List[SNP]) -> 'SNPTable':
+        return cls(chromosomes=[snp._chromosome for snp in snps],
+                   positions=[snp._position for snp in snps],
+                   counts=np.array([[snp.count(base) for base in BASES] for snp in snps], dtype=np.uint32),
+                   genotypes=[snp.genotype for snp in snps])
+
+    def __len__(self) -> int:
+        return len(self.chromosomes)
+
+    def __getitem__(self, index: int) -> SNP:
+        return SNP(chromosome=self.chromosomes[index],
+                   position=int(self.positions[index]),
+                   genotype=self.genotypes[index],
+                   counts=dict(zip(BASES, self.counts[index].tolist())),
+                   raw_depth=int(self._raw_depths[index]) if self._raw_depths is not None else None,
+                   reference=self.reference_bases[index] if self.reference_bases is not None else None)
+
+    def __iter__(self) -> Iterator[SNP]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def depths(self) -> np.ndarray:
+        return self.counts.sum(axis=1, dtype=np.int64)
+
+    def raw_depths(self) -> np.ndarray:
+        return self._raw_depths if self._raw_depths is not None else self.depths()
+
+    def genotyped(self) -> np.ndarray:
+        return self._alleles.sum(axis=1) > 0
+
+    def homozygotes(self) -> np.ndarray:
+        return self._alleles.sum(axis=1) == 1
+
+    def heterozygotes(self) -> np.ndarray:
+        return self._alleles.sum(axis=1) == 2
+
+    def minor_allele_frequencies(self) -> np.ndarray:
+        """Frequency of the second most common allele at each site (0.0 at uncovered sites)."""
+        depths = self.depths()
+        return np.divide(np.sort(self.counts, axis=1)[:, -2], depths, out=np.zeros(len(self)), where=depths > 0)
+
+    def off_genotype_frequencies(self) -> np.ndarray:
+        """Frequency of bases not in the genotype at each site (0.0 at sites which are not genotyped)."""
+        depths = self.depths()
+        off_genotype_counts = np.where(self._alleles, 0, self.counts).sum(axis=1)
+        return np.divide(off_genotype_counts, depths, out=np.zeros(len(self)), where=self.genotyped() & (depths > 0))
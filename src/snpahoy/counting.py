@@ -0,0 +1,289 @@
+import time
+
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from pysam import AlignmentFile
+
+from snpahoy.core import BASES
+from snpahoy.core import RAW_DEPTH
+from snpahoy.metrics import Metrics
+
+
+# Positions closer than this are counted in the same window.
+MAXIMUM_WINDOW_GAP = 1000
+
+# Upper bound on the size of a single window (in base pairs).
+MAXIMUM_WINDOW_SIZE = 100000
+
+# CRAM record fields needed for counting bases: FLAG, RNAME, POS, MAPQ, CIGAR, SEQ
+# and QUAL (the SAM_* flags of htslib). Other fields are not decoded at all.
+CRAM_REQUIRED_FIELDS = 0x2 | 0x4 | 0x8 | 0x10 | 0x20 | 0x200 | 0x400
+
+
+class DecodingOptions:
+    """Settings for opening and decoding BAM/CRAM files."""
+
+    def __init__(self, threads: int = 1, verify_reference_md5: bool = True) -> None:
+        self.threads = threads
+        self.verify_reference_md5 = verify_reference_md5
+
+
+def open_alignment_file(alignment_file: str, reference_fasta_file: Optional[str], decoding: Optional[DecodingOptions] = None) -> AlignmentFile:
+    """Opens a BAM/CRAM file for counting. CRAM decoding is restricted to the fields
+    needed for counting, and optionally skips verifying reference MD5 checksums."""
+    decoding = decoding or DecodingOptions()
+    format_options = [f'required_fields={CRAM_REQUIRED_FIELDS}']
+    if not decoding.verify_reference_md5:
+        format_options.append('ignore_md5=1')
+    return AlignmentFile(alignment_file, reference_filename=reference_fasta_file, threads=decoding.threads, format_options=format_options)
+
+
+class Window:
+
+    def __init__(self, chromosome: str, positions: List[int]) -> None:
+        self.chromosome = chromosome
+        self.positions = positions
+
+    @property
+    def start(self) -> int:
+        return self.positions[0]
+
+    @property
+    def stop(self) -> int:
+        return self.positions[-1] + 1
+
+
+def make_windows(coordinates: Iterable[Tuple[str, int]],
+                 maximum_gap: int = MAXIMUM_WINDOW_GAP,
+                 maximum_size: int = MAXIMUM_WINDOW_SIZE) -> List[Window]:
+    """Groups coordinates into windows of nearby positions on the same chromosome."""
+
+    positions: Dict[str, Set[int]] = defaultdict(set)
+    for chromosome, position in coordinates:
+        positions[chromosome].add(position)
+
+    result: List[Window] = []
+    for chromosome, chromosome_positions in positions.items():
+        window = None
+        for position in sorted(chromosome_positions):
+            if window and position - window.stop < maximum_gap and position + 1 - window.start <= maximum_size:
+                window.positions.append(position)
+            else:
+                window = Window(chromosome=chromosome, positions=[position])
+                result.append(window)
+
+    return result
+
+
+class WindowedCounter:
+    """Counts bases at SNP positions using one coverage call per window of nearby
+    positions. Instances are callable and can be passed to get_snps as get_counts.
+    Windows are made from the coordinates, unless already made (like in compiled panels)."""
+
+    def __init__(self, alignment: AlignmentFile, coordinates: Iterable[Tuple[str, int]], minimum_base_quality: int,
+                 maximum_gap: int = MAXIMUM_WINDOW_GAP, maximum_size: int = MAXIMUM_WINDOW_SIZE, metrics: Optional[Metrics] = None,
+                 windows: Optional[List[Window]] = None) -> None:
+        self._alignment = alignment
+        self._minimum_base_quality = minimum_base_quality
+        self._metrics = metrics
+        self._windows: Dict[Tuple[str, int], Window] = {}
+        if windows is None:
+            windows = make_windows(coordinates=coordinates, maximum_gap=maximum_gap, maximum_size=maximum_size)
+        for window in windows:
+            self._windows.update({(window.chromosome, position): window for position in window.positions})
+        self._counts: Dict[Tuple[str, int], Dict[str, int]] = {}
+
+    def __call__(self, chromosome: str, position: int) -> Dict[str, int]:
+        if (chromosome, position) not in self._counts:
+            window = self._windows.get((chromosome, position), Window(chromosome=chromosome, positions=[position]))
+            self._count_window(window=window)
+        return dict(self._counts[(chromosome, position)])
+
+    def _count_window(self, window: Window) -> None:
+        start = time.perf_counter() if self._metrics else 0.0
+        counts = self._count_bases(window=window)
+        if self._metrics:
+            self._metrics.add_contig_time(chromosome=window.chromosome, seconds=time.perf_counter() - start)
+        for position, position_counts in zip(window.positions, counts):
+            self._counts[(window.chromosome, position)] = dict(zip((*BASES, RAW_DEPTH), position_counts))
+
+    def _count_bases(self, window: Window) -> List[List[int]]:
+        """Returns A, C, G and T counts at each position of a window (followed by the raw depth, if capped)."""
+        coverage = self._alignment.count_coverage(contig=window.chromosome, start=window.start, stop=window.stop, quality_threshold=self._minimum_base_quality)
+        return [[coverage[base][position - window.start] for base in range(4)] for position in window.positions]
+
+
+# Reads with any of these flags are never counted: unmapped (0x4), secondary (0x100),
+# QC failed (0x200) and duplicate (0x400). This is the same as count_coverage.
+EXCLUDED_FLAGS = 0x4 | 0x100 | 0x200 | 0x400
+
+SUPPLEMENTARY_FLAG = 0x800
+
+# CIGAR operations consuming both query and reference (M, = and X), reference only (D and N) and query only (I and S).
+ALIGNMENT_MATCH_OPERATIONS = {0, 7, 8}
+REFERENCE_OPERATIONS = {2, 3}
+QUERY_OPERATIONS = {1, 4}
+
+BASE_INDEXES = {'A': 0, 'C': 1, 'G': 2, 'T': 3}
+
+
+class ReadFilter:
+    """Reads to leave out when counting, on top of those always excluded (see EXCLUDED_FLAGS).
+    With a maximum depth, only that many reads are counted at each position (see FetchCounter)."""
+
+    def __init__(self, minimum_mapping_quality: int = 0, exclude_supplementary: bool = False, maximum_depth: Optional[int] = None) -> None:
+        self.minimum_mapping_quality = minimum_mapping_quality
+        self.exclude_supplementary = exclude_supplementary
+        self.maximum_depth = maximum_depth
+
+    @property
+    def excluded_flags(self) -> int:
+        return EXCLUDED_FLAGS | (SUPPLEMENTARY_FLAG if self.exclude_supplementary else 0)
+
+    def describe(self) -> Dict:
+        """Settings differing from the defaults (which match count_coverage)."""
+        settings: Dict = {}
+        if self.maximum_depth is not None:
+            settings['maximum-depth'] = self.maximum_depth
+        if self.minimum_mapping_quality > 0:
+            settings['minimum-mapping-quality'] = self.minimum_mapping_quality
+        if self.exclude_supplementary:
+            settings['exclude-supplementary'] = True
+        return settings
+
+
+class FetchCounter(WindowedCounter):
+    """Counts bases at SNP positions with one fetch per window, walking the alignment of
+    each read once and adding its bases at all SNP positions it covers. Reads are filtered
+    on flags and mapping quality, and bases on base quality, in the same pass. With the
+    default filter, counts are the same as those of count_coverage.
+
+    With a maximum depth, only the first that many bases passing the filters at a position (from reads
+    in the order of the file) are counted there. All of them are counted towards its raw depth."""
+
+    def __init__(self, alignment: AlignmentFile, coordinates: Iterable[Tuple[str, int]], minimum_base_quality: int,
+                 read_filter: Optional[ReadFilter] = None, maximum_gap: int = MAXIMUM_WINDOW_GAP, maximum_size: int = MAXIMUM_WINDOW_SIZE,
+                 metrics: Optional[Metrics] = None, windows: Optional[List[Window]] = None) -> None:
+        super().__init__(alignment=alignment, coordinates=coordinates, minimum_base_quality=minimum_base_quality,
+                         maximum_gap=maximum_gap, maximum_size=maximum_size, metrics=metrics, windows=windows)
+        self._read_filter = read_filter or ReadFilter()
+
+    def _count_bases(self, window: Window) -> List[List[int]]:
+        positions = window.positions
+        number_of_positions = len(positions)
+        maximum_depth = self._read_filter.maximum_depth
+        # With a maximum depth, counts are followed by the raw depth.
+        counts = [[0, 0, 0, 0] if maximum_depth is None else [0, 0, 0, 0, 0] for _ in positions]
+        excluded_flags = self._read_filter.excluded_flags
+        minimum_mapping_quality = self._read_filter.minimum_mapping_quality
+        minimum_base_quality = self._minimum_base_quality
+
+        for read in self._alignment.fetch(contig=window.chromosome, start=window.start, stop=window.stop):
+            if read.flag & excluded_flags or read.mapping_quality < minimum_mapping_quality:
+                continue
+            sequence = read.query_sequence
+            cigar = read.cigartuples
+            reference_end = read.reference_end
+            if not sequence or not cigar or reference_end is None:
+                continue
+            qualities = read.query_qualities
+            if qualities is None:
+                if minimum_base_quality > 0:
+                    continue
+                # Never looked at when not filtering on base quality.
+                qualities = array('B')
+
+            reference_position = read.reference_start
+            index = bisect_left(positions, reference_position)
+            if index == number_of_positions or positions[index] >= reference_end:
+                continue
+
+            query_position = 0
+            for operation, length in cigar:
+                end = reference_position + length
+                if operation in ALIGNMENT_MATCH_OPERATIONS:
+                    while index < number_of_positions and positions[index] < end:
+                        offset = query_position + positions[index] - reference_position
+                        base_index = BASE_INDEXES.get(sequence[offset])
+                        if base_index is not None and (minimum_base_quality == 0 or qualities[offset] >= minimum_base_quality):
+                            position_counts = counts[index]
+                            if maximum_depth is None:
+                                position_counts[base_index] += 1
+                            else:
+                                position_counts[4] += 1
+                                if position_counts[4] <= maximum_depth:
+                                    position_counts[base_index] += 1
+                        index += 1
+                    reference_position = end
+                    query_position += length
+                elif operation in REFERENCE_OPERATIONS:
+                    while index < number_of_positions and positions[index] < end:
+                        index += 1
+                    reference_position = end
+                elif operation in QUERY_OPERATIONS:
+                    query_position += length
+                if index == number_of_positions:
+                    break
+
+        return counts
+
+
+def make_shards(windows: List[Window], number_of_shards: int) -> List[List[Window]]:
+    """Splits windows into at most number_of_shards consecutive groups holding roughly the same number of positions."""
+    total = sum(len(window.positions) for window in windows)
+    result: List[List[Window]] = []
+    shard: List[Window] = []
+    size = 0
+    for window in windows:
+        shard.append(window)
+        size += len(window.positions)
+        if size * number_of_shards >= total * (len(result) + 1):
+            result.append(shard)
+            shard = []
+    if shard:
+        result.append(shard)
+    return result
+
+
+def _count_shard(alignment_file: str, reference_fasta_file: Optional[str], windows: List[Window], minimum_base_quality: int,
+                 decoding: Optional[DecodingOptions] = None, read_filter: Optional[ReadFilter] = None,
+                 collect_metrics: bool = False) -> Tuple[Dict[Tuple[str, int], Dict[str, int]], Optional[Metrics]]:
+    coordinates = [(window.chromosome, position) for window in windows for position in window.positions]
+    metrics = Metrics() if collect_metrics else None
+    with open_alignment_file(alignment_file=alignment_file, reference_fasta_file=reference_fasta_file, decoding=decoding) as alignment:
+        if metrics:
+            metrics.increment('file-opens')
+        counter = FetchCounter(alignment=alignment, coordinates=coordinates, minimum_base_quality=minimum_base_quality,
+                               read_filter=read_filter, metrics=metrics, windows=windows)
+        return {coordinate: counter(*coordinate) for coordinate in coordinates}, metrics
+
+
+def count_in_parallel(alignment_file: str, reference_fasta_file: Optional[str], coordinates: Iterable[Tuple[str, int]],
+                      minimum_base_quality: int, workers: int, decoding: Optional[DecodingOptions] = None,
+                      read_filter: Optional[ReadFilter] = None, metrics: Optional[Metrics] = None,
+                      windows: Optional[List[Window]] = None) -> Dict[Tuple[str, int], Dict[str, int]]:
+    """Counts bases at all coordinates, spreading the windows (made from the coordinates, unless
+    given) over a pool of worker processes. Each worker opens its own handle to the alignment file."""
+
+    shards = make_shards(windows=windows if windows is not None else make_windows(coordinates=coordinates), number_of_shards=workers)
+
+    result: Dict[Tuple[str, int], Dict[str, int]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_count_shard, alignment_file, reference_fasta_file, shard, minimum_base_quality, decoding,
+                                   read_filter, metrics is not None) for shard in shards]
+        for future in futures:
+            counts, shard_metrics = future.result()
+            result.update(counts)
+            if metrics and shard_metrics:
+                metrics.merge(shard_metrics)
+
+    return result
@@ -0,0 +1,93 @@
+import hashlib
+import sqlite3
+
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+
+from snpahoy.exceptions import PanelMismatchError
+
+
+# Number of set bits in each possible byte value.
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint16)
+
+
+def encode_genotypes(genotypes: List[Optional[str]]) -> np.ndarray:
+    """Packs genotypes into five bit planes: one marking the genotyped sites,
+    followed by one per base (A, C, G, T) marking sites where it is an allele."""
+    planes = np.zeros((5, len(genotypes)), dtype=bool)
+    for index, genotype in enumerate(genotypes):
+        if genotype:
+            planes[0, index] = True
+            for plane, base in enumerate('ACGT', start=1):
+                planes[plane, index] = base in genotype
+    return np.packbits(planes, axis=1)
+
+
+def compare_fingerprints(query: np.ndarray, fingerprints: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Compares one packed fingerprint with a stack of packed fingerprints. Returns
+    the number of jointly genotyped sites and the number of concordant sites."""
+    genotyped = fingerprints[:, 0, :] & query[0, :]
+    discordant = np.bitwise_or.reduce(fingerprints[:, 1:, :] ^ query[1:, :], axis=1) & genotyped
+    return POPCOUNT[genotyped].sum(axis=1), POPCOUNT[genotyped & ~discordant].sum(axis=1)
+
+
+class FingerprintDatabase:
+    """SQLite database of packed genotype fingerprints at the SNP positions of a single panel."""
+
+    def __init__(self, path: str, coordinates: List[Tuple[str, int]]) -> None:
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS panel (hash TEXT NOT NULL, sites INTEGER NOT NULL)')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS fingerprints (name TEXT PRIMARY KEY, fingerprint BLOB NOT NULL)')
+
+        panel_hash = hashlib.sha256(repr(coordinates).encode()).hexdigest()
+        row = self._connection.execute('SELECT hash FROM panel').fetchone()
+        if row is None:
+            self._connection.execute('INSERT INTO panel VALUES (?, ?)', (panel_hash, len(coordinates)))
+            self._connection.commit()
+        elif row[0] != panel_hash:
+            self._connection.close()
+            raise PanelMismatchError
+
+        self._number_of_sites = len(coordinates)
+
+    def __enter__(self) -> 'FingerprintDatabase':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def add(self, name: str, genotypes: List[Optional[str]]) -> None:
+        """Stores the fingerprint of a sample, replacing any previous one with the same name."""
+        if len(genotypes) != self._number_of_sites:
+            raise PanelMismatchError
+        fingerprint = encode_genotypes(genotypes=genotypes)
+        self._connection.execute('INSERT OR REPLACE INTO fingerprints VALUES (?, ?)', (name, fingerprint.tobytes()))
+        self._connection.commit()
+
+    def query(self, genotypes: List[Optional[str]], top: Optional[int] = None) -> List[Tuple[str, float, int]]:
+        """Ranks stored samples by concordance with the given genotypes over jointly genotyped
+        sites. Returns tuples of sample name, concordance and number of jointly genotyped sites."""
+
+        if len(genotypes) != self._number_of_sites:
+            raise PanelMismatchError
+
+        rows = self._connection.execute('SELECT name, fingerprint FROM fingerprints').fetchall()
+        if not rows:
+            return []
+
+        query = encode_genotypes(genotypes=genotypes)
+        names = [name for name, _ in rows]
+        fingerprints = np.frombuffer(b''.join(fingerprint for _, fingerprint in rows), dtype=np.uint8).reshape(len(rows), *query.shape)
+
+        genotyped, concordant = compare_fingerprints(query=query, fingerprints=fingerprints)
+        concordance = np.divide(concordant, genotyped, out=np.zeros(len(rows)), where=genotyped > 0)
+
+        # Highest concordance first, ties broken by the number of jointly genotyped sites.
+        order = np.lexsort((-genotyped, -concordance))[:top]
+        return [(names[index], float(concordance[index]), int(genotyped[index])) for index in order]
@@ -4,3 +4,27 @@ class MissingGenotypeError(Exception):
 
 class UnknownBaseError(Exception):
     pass
+
+
+class ManifestError(Exception):
+    pass
+
+
+class PanelMismatchError(Exception):
+    pass
+
+
+class JobError(Exception):
+    pass
+
+
+class CountsFileError(Exception):
+    pass
+
+
+class PanelFileError(Exception):
+    pass
+
+
+class ContigMismatchError(Exception):
+    pass
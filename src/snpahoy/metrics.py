@@ -0,0 +1,68 @@
+import resource
+import sys
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from contextlib import nullcontext
+from typing import ContextManager
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+
+
+class Metrics:
+    """Wall clock time per phase and per chromosome, and counters, collected during a run."""
+
+    def __init__(self) -> None:
+        self._start = time.perf_counter()
+        self.phases: Dict[str, float] = defaultdict(float)
+        self.contigs: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def add_contig_time(self, chromosome: str, seconds: float) -> None:
+        self.contigs[chromosome] += seconds
+
+    def increment(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+    def merge(self, other: 'Metrics') -> None:
+        """Adds the chromosome times and counters of work done in a worker process. Phases
+        are not merged, as they overlap with the phases timed in this process."""
+        for chromosome, seconds in other.contigs.items():
+            self.contigs[chromosome] += seconds
+        for name, value in other.counters.items():
+            self.counters[name] += value
+
+    def report(self) -> Dict:
+        counting_time = self.phases.get('counting', 0.0)
+        return {
+            'wall-time': float('%.4f' % (time.perf_counter() - self._start)),
+            'phases': {name: float('%.4f' % seconds) for name, seconds in self.phases.items()},
+            'contigs': {chromosome: float('%.4f' % seconds) for chromosome, seconds in self.contigs.items()},
+            'sites': self.counters['sites'],
+            'sites-per-second': float('%.1f' % (self.counters['sites'] / counting_time)) if counting_time else 0.0,
+            'file-opens': self.counters['file-opens'],
+            'cache-hits': self.counters['cache-hits'],
+            'peak-rss-mb': float('%.1f' % peak_rss())
+        }
+
+
+def measure(metrics: Optional[Metrics], name: str) -> ContextManager:
+    """Times a phase if metrics are being collected, and does nothing otherwise."""
+    return metrics.phase(name) if metrics is not None else nullcontext()
+
+
+def peak_rss() -> float:
+    """Peak resident set size (in megabytes) of this process or any of its finished worker processes."""
+    maximum = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Reported in bytes on macOS and in kilobytes elsewhere.
+    return maximum / (1024 * 1024) if sys.platform == 'darwin' else maximum / 1024
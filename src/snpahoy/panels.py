@@ -0,0 +1,324 @@
+import gzip
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from abc import ABC
+from abc import abstractmethod
+from itertools import groupby
+from itertools import repeat
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+
+from pysam import FastaFile
+
+from snpahoy.counting import MAXIMUM_WINDOW_GAP
+from snpahoy.counting import MAXIMUM_WINDOW_SIZE
+from snpahoy.counting import Window
+from snpahoy.counting import make_windows
+from snpahoy.exceptions import ContigMismatchError
+from snpahoy.exceptions import PanelFileError
+from snpahoy.parsers import iterate_sites
+from snpahoy.parsers import merge_intervals
+from snpahoy.parsers import parse_bed_intervals
+
+
+# Panel files start with these bytes, followed by the length of a JSON header (as a little-endian
+# 64-bit integer), the header itself and the arrays it describes, each aligned to 8 bytes.
+MAGIC = b'SNPAHOYP'
+FORMAT_VERSION = 1
+
+# Arrays of a panel file: positions of all sites (grouped by contig, and sorted within contigs), index
+# of the first site of each counting window (grouped the same way), and reference base of each site.
+ARRAY_TYPES = {'positions': '<u4', 'window-starts': '<u4', 'reference-bases': 'S1'}
+
+
+def is_panel_file(path: str) -> bool:
+    """Whether a file is a compiled panel (rather than a BED file)."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _aligned(size: int) -> int:
+    return (size + 7) // 8 * 8
+
+
+def write_panel_file(path: str, intervals: List[Tuple[str, int, int]], reference_fasta_file: str, bed_file: Optional[str] = None) -> None:
+    """Writes merged intervals (as given by merge_intervals) to a panel file, with the counting
+    windows of each contig and the reference base of each site. Contigs must be in the reference."""
+
+    contigs: List[Dict] = []
+    positions: List[int] = []
+    window_starts: List[int] = []
+    reference_bases: List[bytes] = []
+
+    with FastaFile(reference_fasta_file) as reference:
+        lengths = dict(zip(reference.references, reference.lengths))
+        for chromosome, grouped_intervals in groupby(intervals, key=lambda interval: interval[0]):
+            contig_intervals = list(grouped_intervals)
+            if chromosome not in lengths:
+                raise PanelFileError(f'Contig {chromosome} is not in {reference_fasta_file}')
+            if contig_intervals[-1][2] > lengths[chromosome]:
+                raise PanelFileError(f'Interval {chromosome}:{contig_intervals[-1][1]}-{contig_intervals[-1][2]} is beyond the end of the contig')
+
+            first_site, first_window = len(positions), len(window_starts)
+            for window in make_windows(coordinates=iterate_sites(intervals=contig_intervals)):
+                window_starts.append(len(positions))
+                positions.extend(window.positions)
+            reference_bases.extend(reference.fetch(chromosome, start, stop).upper().encode() for _, start, stop in contig_intervals)
+
+            contigs.append({'name': chromosome,
+                            'length': lengths[chromosome],
+                            'sites': [first_site, len(positions)],
+                            'windows': [first_window, len(window_starts)]})
+
+    arrays = {'positions': np.array(positions, dtype=ARRAY_TYPES['positions']),
+              'window-starts': np.array(window_starts, dtype=ARRAY_TYPES['window-starts']),
+              'reference-bases': np.frombuffer(b''.join(reference_bases), dtype=ARRAY_TYPES['reference-bases'])}
+
+    # Offsets of arrays are relative to the end of the header.
+    offsets = {}
+    offset = 0
+    for name, array in arrays.items():
+        offsets[name] = [offset, len(array)]
+        offset = _aligned(offset + array.nbytes)
+
+    header = {'format-version': FORMAT_VERSION,
+              'bed-file': os.path.basename(bed_file) if bed_file else None,
+              'reference-fasta-file': os.path.basename(reference_fasta_file),
+              'maximum-window-gap': MAXIMUM_WINDOW_GAP,
+              'maximum-window-size': MAXIMUM_WINDOW_SIZE,
+              'contigs': contigs,
+              'arrays': offsets}
+    encoded_header = json.dumps(header).encode()
+    encoded_header = encoded_header.ljust(_aligned(len(encoded_header)))
+
+    # Written to a temporary file first, so that processes mapping the panel never see a partial file.
+    handle, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(handle, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(encoded_header)) + encoded_header)
+        for name, array in arrays.items():
+            f.write(array.tobytes())
+            f.write(b'\0' * (_aligned(array.nbytes) - array.nbytes))
+    os.replace(temporary_path, path)
+
+
+class PanelFile:
+    """Read-only memory map of a panel file. Only the header is parsed when opening the file,
+    and arrays are views of the mapped file, so pages are read as they are used (and shared
+    between processes using the same panel)."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if data[:len(MAGIC)] != MAGIC:
+            raise PanelFileError(f'{path} is not a panel file')
+        header_size, = struct.unpack_from('<Q', data, len(MAGIC))
+        arrays_start = len(MAGIC) + 8 + header_size
+        self.header = json.loads(data[len(MAGIC) + 8:arrays_start])
+        if self.header['format-version'] != FORMAT_VERSION:
+            raise PanelFileError(f'{path} has panel file format version {self.header["format-version"]} instead of {FORMAT_VERSION}')
+
+        self.arrays = {name: np.frombuffer(data, dtype=ARRAY_TYPES[name], count=length, offset=arrays_start + offset)
+                       for name, (offset, length) in self.header['arrays'].items()}
+        self.contigs: Dict[str, Dict] = {contig['name']: contig for contig in self.header['contigs']}
+
+    @property
+    def number_of_sites(self) -> int:
+        return len(self.arrays['positions'])
+
+    def positions(self, chromosome: str) -> np.ndarray:
+        first, last = self.contigs[chromosome]['sites']
+        return self.arrays['positions'][first:last]
+
+    def reference_bases(self, chromosome: str) -> str:
+        first, last = self.contigs[chromosome]['sites']
+        return self.arrays['reference-bases'][first:last].tobytes().decode()
+
+    def window_bounds(self, chromosome: str) -> List[Tuple[int, int]]:
+        """First and last (exclusive) index of the sites of each window, relative to the contig."""
+        first_site, last_site = self.contigs[chromosome]['sites']
+        first, last = self.contigs[chromosome]['windows']
+        starts = (self.arrays['window-starts'][first:last].astype(np.int64) - first_site).tolist()
+        return list(zip(starts, starts[1:] + [last_site - first_site]))
+
+
+def read_bed_file(bed_file: str) -> List[Tuple[str, int, int]]:
+    """Reads and merges the intervals of a plain or gzipped (including bgzipped) BED file."""
+    with open(bed_file, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    with (gzip.open(bed_file, 'rt') if compressed else open(bed_file, 'rt')) as f:
+        return merge_intervals(intervals=parse_bed_intervals(stream=f))
+
+
+class BasePanel(ABC):
+    """SNP positions of a panel. Positions are ordered by chromosome as in the header of an alignment
+    file, or else as in the panel, and are kept for each order seen so far. Implemented by Panel (BED
+    intervals) and CompiledPanel (panel files)."""
+
+    def __init__(self) -> None:
+        self._coordinates: Dict[Optional[Tuple[str, ...]], List[Tuple[str, int]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load(path: str) -> 'BasePanel':
+        """Reads a panel compiled with compile_panel, or else a BED file."""
+        if is_panel_file(path=path):
+            return CompiledPanel(panel_file=path)
+        return Panel.from_bed_file(bed_file=path)
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @property
+    @abstractmethod
+    def intervals(self) -> List[Tuple[str, int, int]]:
+        """Merged (chromosome, start, stop) intervals of the positions, in the order of the panel."""
+
+    @property
+    @abstractmethod
+    def contigs(self) -> List[str]:
+        pass
+
+    def check_contigs(self, contigs: Dict[str, int]) -> None:
+        """Checks that all chromosomes of the panel are among contigs (names and lengths, like
+        in the header of an alignment file), raising ContigMismatchError otherwise."""
+        missing = [chromosome for chromosome in self.contigs if chromosome not in contigs]
+        if missing:
+            raise ContigMismatchError(f'Contigs of the panel missing from the alignment file: {", ".join(missing)}')
+
+    def coordinates(self, contig_order: Optional[Sequence[str]] = None) -> List[Tuple[str, int]]:
+        key = tuple(contig_order) if contig_order is not None else None
+        with self._lock:
+            if key not in self._coordinates:
+                self._coordinates[key] = self._make_coordinates(contig_order=contig_order)
+            return self._coordinates[key]
+
+    @abstractmethod
+    def _make_coordinates(self, contig_order: Optional[Sequence[str]]) -> List[Tuple[str, int]]:
+        """Positions of the panel in the given order of chromosomes (see coordinates, which keeps them)."""
+
+    def windows(self, contig_order: Optional[Sequence[str]] = None) -> Optional[List[Window]]:
+        """Counting windows of the positions (in the same order), if made in advance. They are
+        made from the positions while counting otherwise."""
+        return None
+
+    def reference_bases(self, contig_order: Optional[Sequence[str]] = None) -> Optional[str]:
+        """Reference base of each position (in the same order), if known."""
+        return None
+
+
+class Panel(BasePanel):
+    """SNP positions given by BED intervals."""
+
+    def __init__(self, intervals: Iterable[Tuple[str, int, int]]) -> None:
+        super().__init__()
+        self._intervals = merge_intervals(intervals=intervals)
+
+    @classmethod
+    def from_bed_file(cls, bed_file: str) -> 'Panel':
+        return cls(intervals=read_bed_file(bed_file=bed_file))
+
+    def __len__(self) -> int:
+        return sum(stop - start for _, start, stop in self._intervals)
+
+    def __reduce__(self) -> Tuple:
+        # Positions are expanded again after unpickling (like in worker processes).
+        return Panel, (self._intervals,)
+
+    @property
+    def intervals(self) -> List[Tuple[str, int, int]]:
+        return self._intervals
+
+    @property
+    def contigs(self) -> List[str]:
+        return list(dict.fromkeys(chromosome for chromosome, _, _ in self._intervals))
+
+    def _make_coordinates(self, contig_order: Optional[Sequence[str]]) -> List[Tuple[str, int]]:
+        intervals = merge_intervals(intervals=self._intervals, contig_order=list(contig_order or []))
+        return list(iterate_sites(intervals=intervals))
+
+
+class CompiledPanel(BasePanel):
+    """Panel read from a file written by compile_panel, holding the sorted and merged positions,
+    their counting windows and reference bases. The file is memory-mapped, so opening it only
+    reads its header. Contigs are also checked against the lengths in the reference."""
+
+    def __init__(self, panel_file: str) -> None:
+        super().__init__()
+        self.panel_file = panel_file
+        self._file = PanelFile(path=panel_file)
+        self._windows: Dict[Optional[Tuple[str, ...]], List[Window]] = {}
+        self._contig_coordinates: Dict[str, List[Tuple[str, int]]] = {}
+
+    def __len__(self) -> int:
+        return self._file.number_of_sites
+
+    def __reduce__(self) -> Tuple:
+        # The file is mapped again after unpickling, instead of sending the positions along.
+        return CompiledPanel, (self.panel_file,)
+
+    @property
+    def intervals(self) -> List[Tuple[str, int, int]]:
+        result: List[Tuple[str, int, int]] = []
+        for chromosome in self.contigs:
+            positions = self._file.positions(chromosome=chromosome).astype(np.int64)
+            # Intervals end wherever positions are not consecutive.
+            breaks = (np.flatnonzero(np.diff(positions) != 1) + 1).tolist()
+            result.extend((chromosome, int(positions[start]), int(positions[stop - 1]) + 1) for start, stop in zip([0] + breaks, breaks + [len(positions)]))
+        return result
+
+    @property
+    def contigs(self) -> List[str]:
+        return list(self._file.contigs)
+
+    def check_contigs(self, contigs: Dict[str, int]) -> None:
+        super().check_contigs(contigs=contigs)
+        for chromosome in self.contigs:
+            length = self._file.contigs[chromosome]['length']
+            if contigs[chromosome] != length:
+                raise ContigMismatchError(f'Contig {chromosome} has length {contigs[chromosome]} in the alignment file, but {length} in the reference '
+                                          f'of the panel ({self._file.header["reference-fasta-file"]})')
+
+    def _contig_order(self, contig_order: Optional[Sequence[str]]) -> List[str]:
+        rank = {contig: index for index, contig in enumerate(contig_order or [])}
+        return sorted(self.contigs, key=lambda chromosome: rank.get(chromosome, len(rank)))
+
+    def _make_coordinates(self, contig_order: Optional[Sequence[str]]) -> List[Tuple[str, int]]:
+        # Positions of each contig are only read from the file once, whatever the orders asked for.
+        result: List[Tuple[str, int]] = []
+        for chromosome in self._contig_order(contig_order=contig_order):
+            if chromosome not in self._contig_coordinates:
+                self._contig_coordinates[chromosome] = list(zip(repeat(chromosome), self._file.positions(chromosome=chromosome).tolist()))
+            result.extend(self._contig_coordinates[chromosome])
+        return result
+
+    def windows(self, contig_order: Optional[Sequence[str]] = None) -> Optional[List[Window]]:
+        if (self._file.header['maximum-window-gap'], self._file.header['maximum-window-size']) != (MAXIMUM_WINDOW_GAP, MAXIMUM_WINDOW_SIZE):
+            return None
+        key = tuple(contig_order) if contig_order is not None else None
+        with self._lock:
+            if key not in self._windows:
+                windows: List[Window] = []
+                for chromosome in self._contig_order(contig_order=contig_order):
+                    positions = self._file.positions(chromosome=chromosome).tolist()
+                    windows.extend(Window(chromosome=chromosome, positions=positions[start:stop]) for start, stop in self._file.window_bounds(chromosome=chromosome))
+                self._windows[key] = windows
+            return self._windows[key]
+
+    def reference_bases(self, contig_order: Optional[Sequence[str]] = None) -> Optional[str]:
+        return ''.join(self._file.reference_bases(chromosome=chromosome) for chromosome in self._contig_order(contig_order=contig_order))
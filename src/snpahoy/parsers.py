@@ -1,11 +1,21 @@
+from collections import defaultdict
 from typing import Callable
 from typing import Dict
 from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Optional
 from typing import Tuple
 
+import numpy as np
+
+from snpahoy.core import BASES
+from snpahoy.core import RAW_DEPTH
 from snpahoy.core import SNP
+from snpahoy.core import SNPTable
 from snpahoy.core import Genotyper
+from snpahoy.metrics import Metrics
+from snpahoy.metrics import measure
 
 
 def parse_bed_file(stream: Iterable[str]) -> List[Tuple[str, int]]:
@@ -17,6 +27,42 @@ def parse_bed_file(stream: Iterable[str]) -> List[Tuple[str, int]]:
     return result
 
 
+def parse_bed_intervals(stream: Iterable[str]) -> Iterator[Tuple[str, int, int]]:
+    """Yields (chromosome, start, stop) intervals, skipping blank, comment, track and browser lines."""
+    for line in stream:
+        if not line.strip() or line.startswith(('#', 'track', 'browser')):
+            continue
+        chromosome, start, stop, *_ = line.rstrip('\n').split('\t')
+        yield chromosome, int(start), int(stop)
+
+
+def merge_intervals(intervals: Iterable[Tuple[str, int, int]], contig_order: Optional[List[str]] = None) -> List[Tuple[str, int, int]]:
+    """Sorts and merges overlapping intervals. Chromosomes are ordered as in contig_order
+    (typically the BAM header), and any others in order of first appearance."""
+
+    rank: Dict[str, int] = {contig: index for index, contig in enumerate(contig_order or [])}
+    intervals_by_chromosome: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+    for chromosome, start, stop in intervals:
+        rank.setdefault(chromosome, len(rank))
+        intervals_by_chromosome[chromosome].append((start, stop))
+
+    result: List[Tuple[str, int, int]] = []
+    for chromosome in sorted(intervals_by_chromosome, key=lambda chromosome: rank[chromosome]):
+        for start, stop in sorted(intervals_by_chromosome[chromosome]):
+            if result and result[-1][0] == chromosome and start <= result[-1][2]:
+                result[-1] = (chromosome, result[-1][1], max(result[-1][2], stop))
+            else:
+                result.append((chromosome, start, stop))
+
+    return result
+
+
+def iterate_sites(intervals: Iterable[Tuple[str, int, int]]) -> Iterator[Tuple[str, int]]:
+    for chromosome, start, stop in intervals:
+        for position in range(start, stop):
+            yield chromosome, position
+
+
 def get_snps(coordinates: List[Tuple[str, int]], genotyper: Genotyper, get_counts=Callable[[str, int], Dict[str, int]]) -> List[SNP]:
     result: List[SNP] = []
     for chromosome, position in coordinates:
@@ -24,3 +70,43 @@ def get_snps(coordinates: List[Tuple[str, int]], genotyper: Genotyper, get_count
         genotype = genotyper.genotype(counts=counts)
         result.append(SNP(chromosome=chromosome, position=position, counts=counts, genotype=genotype))
     return result
+
+
+def get_snp_table(coordinates: List[Tuple[str, int]], genotyper: Genotyper, get_counts=Callable[[str, int], Dict[str, int]],
+                  metrics: Optional[Metrics] = None) -> SNPTable:
+    counts = np.zeros((len(coordinates), len(BASES)), dtype=np.uint32)
+    raw_depths = np.zeros(len(coordinates), dtype=np.int64)
+    capped = False
+    with measure(metrics, 'counting'):
+        for index, (chromosome, position) in enumerate(coordinates):
+            site_counts = get_counts(chromosome, position)
+            counts[index] = [site_counts[base] for base in BASES]
+            if RAW_DEPTH in site_counts:
+                raw_depths[index] = site_counts[RAW_DEPTH]
+                capped = True
+    chromosomes = [chromosome for chromosome, _ in coordinates]
+    positions = [position for _, position in coordinates]
+    with measure(metrics, 'genotyping'):
+        genotypes = genotyper.genotype_batch(counts=counts)
+    if metrics:
+        metrics.increment('sites', len(coordinates))
+    return SNPTable(chromosomes=chromosomes,
+                    positions=positions,
+                    counts=counts,
+                    genotypes=genotypes,
+                    raw_depths=raw_depths if capped else None)
+
+
+def generate_snps(coordinates: Iterable[Tuple[str, int]], genotyper: Genotyper, get_counts: Callable[[str, int], Dict[str, int]],
+                  reference_bases: Optional[str] = None) -> Iterator[SNP]:
+    """Yields each SNP as soon as it is counted and genotyped. Gives the same SNPs as get_snp_table.
+    Reference bases of the coordinates (in the same order) are added to the SNPs if given."""
+    for index, (chromosome, position) in enumerate(coordinates):
+        site_counts = get_counts(chromosome, position)
+        counts = {base: int(site_counts[base]) for base in BASES}
+        yield SNP(chromosome=chromosome,
+                  position=position,
+                  genotype=genotyper.genotype(counts=counts),
+                  counts=counts,
+                  raw_depth=site_counts.get(RAW_DEPTH),
+                  reference=reference_bases[index] if reference_bases is not None else None)
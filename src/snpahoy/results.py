@@ -0,0 +1,185 @@
+import os
+
+from collections import defaultdict
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+from snpahoy.api import GermlineFingerprint
+from snpahoy.api import PrecomputedCounts
+from snpahoy.api import Settings
+from snpahoy.api import SomaticFingerprint
+from snpahoy.api import Source
+from snpahoy.api import fingerprint_germline
+from snpahoy.api import fingerprint_somatic
+from snpahoy.api import source_path
+from snpahoy.api import triage_somatic
+from snpahoy.cache import CountsCache
+from snpahoy.core import SNP
+from snpahoy.counting import DecodingOptions
+from snpahoy.metrics import Metrics
+from snpahoy.metrics import measure
+from snpahoy.panels import BasePanel
+from snpahoy.writers import DetailsWriter
+from snpahoy.writers import get_detail
+
+
+def get_details(snps: Iterable[SNP]):
+    return {snp.__str__(): get_detail(snp) for snp in snps}
+
+
+def make_results(settings: Dict) -> Dict:
+
+    results: Dict = {}
+
+    results['input'] = defaultdict(dict)
+    results['output'] = defaultdict(dict)
+
+    results['input']['settings'] = dict(settings)
+
+    return results
+
+
+def source_key(source: Source, prefix: str = '') -> str:
+    """Key of an input file in the results: a BAM file or a counts file."""
+    return prefix + ('counts-file' if isinstance(source, PrecomputedCounts) else 'bam-file')
+
+
+def source_name(source: Source) -> str:
+    return os.path.basename(source_path(source=source))
+
+
+def germline_results(settings: Settings, panel: BasePanel, bed_file: str, source: Source, reference_fasta_file: Optional[str], workers: int,
+                     cache: Optional[CountsCache] = None, include_details: bool = True, details_writer: Optional[DetailsWriter] = None,
+                     decoding: Optional[DecodingOptions] = None, metrics: Optional[Metrics] = None) -> Dict:
+
+    fingerprint = fingerprint_germline(source=source,
+                                       panel=panel,
+                                       settings=settings,
+                                       reference_fasta_file=reference_fasta_file,
+                                       workers=workers,
+                                       cache=cache,
+                                       decoding=decoding,
+                                       metrics=metrics)
+
+    return assemble_germline_results(settings=settings,
+                                     bed_file=bed_file,
+                                     source=source,
+                                     fingerprint=fingerprint,
+                                     include_details=include_details,
+                                     details_writer=details_writer,
+                                     metrics=metrics)
+
+
+def assemble_germline_results(settings: Settings, bed_file: str, source: Source, fingerprint: GermlineFingerprint, include_details: bool = True,
+                              details_writer: Optional[DetailsWriter] = None, metrics: Optional[Metrics] = None) -> Dict:
+    """Builds the germline mode results document from a fingerprint."""
+
+    results = make_results(settings=settings.describe())
+
+    results['input']['files'] = {'bed-file': os.path.basename(bed_file)}
+    results['input']['files'][source_key(source=source)] = source_name(source=source)
+
+    with measure(metrics, 'details'):
+        if details_writer:
+            details_writer.write(sample=source_name(source=source), snps=fingerprint.snps)
+        if include_details:
+            results['output']['details'] = get_details(snps=fingerprint.snps)
+
+    results['output']['summary'] = fingerprint.summary.as_dict()
+
+    return results
+
+
+def somatic_results(settings: Settings, panel: BasePanel, bed_file: str, tumors: List[Source], germline: Source,
+                    reference_fasta_file: Optional[str], workers: int, cache: Optional[CountsCache] = None,
+                    include_details: bool = True, details_writer: Optional[DetailsWriter] = None,
+                    decoding: Optional[DecodingOptions] = None, metrics: Optional[Metrics] = None) -> Dict:
+
+    fingerprint = fingerprint_somatic(tumors=tumors,
+                                      germline=germline,
+                                      panel=panel,
+                                      settings=settings,
+                                      reference_fasta_file=reference_fasta_file,
+                                      workers=workers,
+                                      cache=cache,
+                                      decoding=decoding,
+                                      metrics=metrics)
+
+    return assemble_somatic_results(settings=settings,
+                                    bed_file=bed_file,
+                                    tumors=tumors,
+                                    germline=germline,
+                                    fingerprint=fingerprint,
+                                    include_details=include_details,
+                                    details_writer=details_writer,
+                                    metrics=metrics)
+
+
+def somatic_input_files(bed_file: str, tumors: List[Source], germline: Source) -> Dict:
+
+    files: Dict = {'bed-file': os.path.basename(bed_file)}
+    if len(tumors) == 1:
+        files[source_key(source=tumors[0], prefix='tumor-')] = source_name(source=tumors[0])
+    else:
+        for tumor in tumors:
+            files.setdefault(source_key(source=tumor, prefix='tumor-') + 's', []).append(source_name(source=tumor))
+    files[source_key(source=germline, prefix='germline-')] = source_name(source=germline)
+    return files
+
+
+def assemble_somatic_results(settings: Settings, bed_file: str, tumors: List[Source], germline: Source, fingerprint: SomaticFingerprint,
+                             include_details: bool = True, details_writer: Optional[DetailsWriter] = None,
+                             metrics: Optional[Metrics] = None) -> Dict:
+    """Builds the somatic mode results document from a fingerprint."""
+
+    results = make_results(settings=settings.describe())
+
+    tumor_names = [source_name(source=tumor) for tumor in tumors]
+    germline_snps = fingerprint.germline_snps
+
+    results['input']['files'] = somatic_input_files(bed_file=bed_file, tumors=tumors, germline=germline)
+
+    with measure(metrics, 'details'):
+        if details_writer:
+            for name, tumor_snps in zip(tumor_names, fingerprint.tumors_snps):
+                details_writer.write(sample=name, snps=tumor_snps)
+            details_writer.write(sample=source_name(source=germline), snps=germline_snps)
+        if include_details and len(tumors) == 1:
+            results['output']['details'] = {'tumor': get_details(snps=fingerprint.tumor_snps),
+                                            'germline': get_details(snps=germline_snps)}
+        elif include_details:
+            results['output']['details'] = {'tumors': {name: get_details(snps=tumor_snps) for name, tumor_snps in zip(tumor_names, fingerprint.tumors_snps)},
+                                            'germline': get_details(snps=germline_snps)}
+
+    if len(tumors) == 1:
+        results['output']['summary'] = fingerprint.summary.as_dict()
+    else:
+        results['output']['summary'] = {'tumors': {name: summary.as_dict() for name, summary in zip(tumor_names, fingerprint.summaries)}}
+
+    return results
+
+
+def triage_results(settings: Settings, panel: BasePanel, bed_file: str, tumors: List[Source], germline: Source,
+                   reference_fasta_file: Optional[str], confidence: float, decoding: Optional[DecodingOptions] = None,
+                   metrics: Optional[Metrics] = None) -> Dict:
+
+    triages = triage_somatic(tumors=tumors,
+                             germline=germline,
+                             panel=panel,
+                             settings=settings,
+                             reference_fasta_file=reference_fasta_file,
+                             confidence=confidence,
+                             decoding=decoding,
+                             metrics=metrics)
+
+    results = make_results(settings={**settings.describe(), 'triage-confidence': confidence})
+    results['input']['files'] = somatic_input_files(bed_file=bed_file, tumors=tumors, germline=germline)
+
+    if len(tumors) == 1:
+        results['output']['triage'] = triages[0].as_dict()
+    else:
+        results['output']['triage'] = {'tumors': {source_name(source=tumor): triage.as_dict() for tumor, triage in zip(tumors, triages)}}
+
+    return results
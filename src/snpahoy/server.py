@@ -0,0 +1,220 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+
+from contextlib import ExitStack
+from contextlib import contextmanager
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from pysam import AlignmentFile
+
+from snpahoy.api import Settings
+from snpahoy.api import Source
+from snpahoy.cache import CountsCache
+from snpahoy.cache import find_index_file
+from snpahoy.exceptions import JobError
+from snpahoy.metrics import Metrics
+from snpahoy.panels import BasePanel
+from snpahoy.results import germline_results
+from snpahoy.results import somatic_results
+
+
+# Default upper bound on the number of idle alignment file handles kept open by a server.
+DEFAULT_MAXIMUM_OPEN_FILES = 64
+
+
+def file_identity(alignment_file: str) -> Tuple[int, int, Optional[int]]:
+    """Size and modification time of an alignment file and the modification time of its index."""
+    stat = os.stat(alignment_file)
+    index_file = find_index_file(alignment_file)
+    return stat.st_size, stat.st_mtime_ns, os.stat(index_file).st_mtime_ns if index_file else None
+
+
+class HandlePool:
+    """Keeps alignment files open between jobs, closing the least recently used handles when
+    more than maximum_size are idle. A handle is only used by one job at a time, so concurrent
+    jobs on the same file get handles of their own. Files changed on disk are opened again."""
+
+    def __init__(self, open_file: Callable[[str, Optional[str]], AlignmentFile], maximum_size: int = DEFAULT_MAXIMUM_OPEN_FILES) -> None:
+        self._open_file = open_file
+        self._maximum_size = maximum_size
+        self._lock = threading.Lock()
+        # Idle handles, least recently used first.
+        self._idle: List[Tuple[Tuple[str, Optional[str]], Tuple[int, int, Optional[int]], AlignmentFile]] = []
+
+    @contextmanager
+    def acquire(self, alignment_file: str, reference_fasta_file: Optional[str]) -> Iterator[AlignmentFile]:
+        key = (os.path.abspath(alignment_file), reference_fasta_file)
+        identity = file_identity(alignment_file)
+
+        handle = None
+        with self._lock:
+            for index in reversed(range(len(self._idle))):
+                if self._idle[index][0] != key:
+                    continue
+                _, idle_identity, idle_handle = self._idle.pop(index)
+                if idle_identity == identity:
+                    handle = idle_handle
+                    break
+                idle_handle.close()
+
+        if handle is None:
+            handle = self._open_file(alignment_file, reference_fasta_file)
+
+        try:
+            yield handle
+        except BaseException:
+            handle.close()
+            raise
+
+        with self._lock:
+            self._idle.append((key, identity, handle))
+            while len(self._idle) > self._maximum_size:
+                self._idle.pop(0)[2].close()
+
+    def close(self) -> None:
+        with self._lock:
+            for _, _, handle in self._idle:
+                handle.close()
+            self._idle = []
+
+
+class FingerprintService:
+    """Runs germline and somatic jobs for a server, keeping the settings, the panel
+    and open alignment files (in a HandlePool) between jobs."""
+
+    def __init__(self, settings: Settings, panel: BasePanel, bed_file: str, pool: HandlePool, cache: Optional[CountsCache] = None,
+                 collect_metrics: bool = False) -> None:
+        self._settings = settings
+        self._panel = panel
+        self._bed_file = bed_file
+        self._pool = pool
+        self._cache = cache
+        self._collect_metrics = collect_metrics
+
+    def run(self, request: Dict) -> Dict:
+        """Runs a job and returns the same results document as the germline and somatic commands."""
+
+        metrics = Metrics() if self._collect_metrics else None
+        reference_fasta_file = request.get('reference_fasta_file')
+        include_details = not request.get('summary_only', False)
+
+        # Jobs are counted on pooled handles, so the panel is ordered by their headers.
+        with ExitStack() as stack:
+            def acquire(bam_file: str) -> AlignmentFile:
+                return stack.enter_context(self._pool.acquire(alignment_file=bam_file, reference_fasta_file=reference_fasta_file))
+
+            if request['mode'] == 'germline':
+                source = acquire(request['bam_file'])
+                results = germline_results(settings=self._settings,
+                                           panel=self._panel,
+                                           bed_file=self._bed_file,
+                                           source=source,
+                                           reference_fasta_file=reference_fasta_file,
+                                           workers=1,
+                                           cache=self._cache,
+                                           include_details=include_details,
+                                           metrics=metrics)
+            else:
+                germline = acquire(request['germline_bam_file'])
+                tumors: List[Source] = [acquire(path) for path in request['tumor_bam_files']]
+                results = somatic_results(settings=self._settings,
+                                          panel=self._panel,
+                                          bed_file=self._bed_file,
+                                          tumors=tumors,
+                                          germline=germline,
+                                          reference_fasta_file=reference_fasta_file,
+                                          workers=1,
+                                          cache=self._cache,
+                                          include_details=include_details,
+                                          metrics=metrics)
+
+        if metrics:
+            results['metrics'] = metrics.report()
+
+        return results
+
+
+def validate_request(request: Dict) -> None:
+    """Checks that a request describes a germline or somatic job."""
+
+    if not isinstance(request, dict):
+        raise JobError('Request must be a JSON object')
+
+    mode = request.get('mode')
+    if mode == 'germline':
+        required = ['bam_file']
+    elif mode == 'somatic':
+        required = ['tumor_bam_files', 'germline_bam_file']
+    else:
+        raise JobError('Request mode must be germline or somatic')
+
+    for field in required:
+        if not request.get(field):
+            raise JobError(f'Request is missing {field}')
+
+    if mode == 'somatic':
+        if not isinstance(request['tumor_bam_files'], list):
+            raise JobError('Request field tumor_bam_files must be a list')
+        tumor_names = [os.path.basename(path) for path in request['tumor_bam_files']]
+        if len(set(tumor_names)) < len(tumor_names):
+            raise JobError('Tumor BAM files must have distinct names')
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON request line and writes one JSON response line."""
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            # Connection closed without a request (like the probe in remove_stale_socket).
+            return
+        try:
+            request = json.loads(line)
+            validate_request(request=request)
+            response = {'results': self.server.run_job(request)}  # type: ignore
+        except Exception as error:
+            response = {'error': str(error) or type(error).__name__}
+        self.wfile.write((json.dumps(response) + '\n').encode())
+
+
+class FingerprintServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server running each job on a thread of its own."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_file: str, run_job: Callable[[Dict], Dict]) -> None:
+        super().__init__(socket_file, _RequestHandler)
+        self.run_job = run_job
+
+
+def remove_stale_socket(socket_file: str) -> None:
+    """Removes a socket file left behind by a server which is no longer running."""
+    if not os.path.exists(socket_file):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_file)
+        except ConnectionRefusedError:
+            os.remove(socket_file)
+            return
+    raise JobError(f'A server is already listening on {socket_file}')
+
+
+def submit(socket_file: str, request: Dict) -> Dict:
+    """Sends a request to a server and returns the results document."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_file)
+        connection.sendall((json.dumps(request) + '\n').encode())
+        with connection.makefile('rb') as f:
+            response = json.loads(f.readline())
+    if 'error' in response:
+        raise JobError(response['error'])
+    return response['results']
@@ -0,0 +1,231 @@
+import gzip
+import os
+
+from collections import defaultdict
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import TextIO
+from typing import Tuple
+
+from pysam import FastaFile
+from pysam import VariantFile
+
+from snpahoy.core import BASES
+from snpahoy.counting import make_windows
+from snpahoy.exceptions import CountsFileError
+
+
+COUNTS_FORMATS = ['mpileup', 'vcf', 'tsv']
+
+SINGLE_BASES = set(BASES)
+
+# File name extensions (after removing any .gz or .bgz) of each counts format.
+COUNTS_FORMAT_EXTENSIONS = {'.pileup': 'mpileup', '.mpileup': 'mpileup',
+                            '.vcf': 'vcf', '.gvcf': 'vcf', '.bcf': 'vcf',
+                            '.tsv': 'tsv', '.txt': 'tsv'}
+
+
+def detect_counts_format(counts_file: str) -> str:
+    """Guesses the format of a counts file from its name."""
+    root, extension = os.path.splitext(counts_file.lower())
+    if extension in ('.gz', '.bgz'):
+        _, extension = os.path.splitext(root)
+    if extension not in COUNTS_FORMAT_EXTENSIONS:
+        raise CountsFileError(f'Cannot tell the format of {counts_file} from its name')
+    return COUNTS_FORMAT_EXTENSIONS[extension]
+
+
+def open_text_file(path: str) -> TextIO:
+    """Opens a plain or gzipped (including bgzipped) text file."""
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    return gzip.open(path, 'rt') if compressed else open(path, 'rt')
+
+
+def parse_pileup_bases(bases: str, qualities: str, reference_base: str, minimum_base_quality: int) -> Dict[str, int]:
+    """Counts the bases of one samtools mpileup read base column. Bases are counted like
+    from alignments: only A, C, G and T, and only with at least minimum_base_quality."""
+
+    counts = {base: 0 for base in BASES}
+    reference_base = reference_base.upper()
+
+    index = 0
+    quality_index = 0
+    while index < len(bases):
+        character = bases[index]
+        if character == '^':
+            # Start of a read, followed by its mapping quality.
+            index += 2
+            continue
+        if character == '$':
+            index += 1
+            continue
+        if character in '+-':
+            # Insertion or deletion after this position: +3ACG or -2TT.
+            end = index + 1
+            while end < len(bases) and bases[end].isdigit():
+                end += 1
+            index = end + int(bases[index + 1:end])
+            continue
+
+        # Everything else (bases, deletions and reference skips) has a base quality.
+        if quality_index >= len(qualities):
+            raise CountsFileError('More bases than base qualities in mpileup line')
+        quality = ord(qualities[quality_index]) - 33
+        quality_index += 1
+        index += 1
+
+        base = reference_base if character in '.,' else character.upper()
+        if base in counts and quality >= minimum_base_quality:
+            counts[base] += 1
+
+    return counts
+
+
+def parse_mpileup(stream: Iterable[str], sites: Set[Tuple[str, int]], minimum_base_quality: int) -> Iterator[Tuple[Tuple[str, int], Dict[str, int]]]:
+    """Yields base counts at sites from samtools mpileup output (of the first sample only)."""
+    for line in stream:
+        if not line.strip():
+            continue
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) < 4:
+            raise CountsFileError(f'Expected at least 4 columns in mpileup line: {line.rstrip()}')
+        site = (fields[0], int(fields[1]) - 1)
+        if site not in sites:
+            continue
+        if fields[3] == '0':
+            yield site, {base: 0 for base in BASES}
+        else:
+            yield site, parse_pileup_bases(bases=fields[4], qualities=fields[5], reference_base=fields[2], minimum_base_quality=minimum_base_quality)
+
+
+def parse_counts_tsv(stream: Iterable[str], sites: Set[Tuple[str, int]]) -> Iterator[Tuple[Tuple[str, int], Dict[str, int]]]:
+    """Yields base counts at sites from tab-separated chromosome, (1-based) position, A, C, G
+    and T columns. Comment lines and a header line are skipped."""
+    for line in stream:
+        if not line.strip() or line.startswith('#'):
+            continue
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) < 6:
+            raise CountsFileError(f'Expected 6 columns in counts line: {line.rstrip()}')
+        if not fields[1].isdigit():
+            # Header line.
+            continue
+        site = (fields[0], int(fields[1]) - 1)
+        if site in sites:
+            yield site, dict(zip(BASES, (int(count) for count in fields[2:6])))
+
+
+def _get_format_field(sample, name: str) -> Optional[Tuple]:
+    """Returns a FORMAT field of a VCF sample as a tuple, or None if missing."""
+    if name not in sample:
+        return None
+    value = sample[name]
+    if value is None:
+        return None
+    return value if isinstance(value, tuple) else (value,)
+
+
+def read_vcf_counts(vcf_file: str, coordinates: List[Tuple[str, int]],
+                    reference_fasta_file: Optional[str] = None) -> Iterator[Tuple[Tuple[str, int], Dict[str, int]]]:
+    """Yields base counts at sites from the AD (allelic depths) field of the first sample
+    of a VCF/BCF file. Only single base alleles are counted. Sites inside gVCF reference
+    blocks get the block depth (MIN_DP, or else DP) on the reference base, which is only
+    known at the start of a block unless a reference FASTA file is given. Indexed files
+    are read window by window, others from start to end."""
+
+    sites = set(coordinates)
+    reference = FastaFile(reference_fasta_file) if reference_fasta_file else None
+
+    with VariantFile(vcf_file) as variants:
+        if not variants.header.samples:
+            raise CountsFileError(f'No samples in {vcf_file}')
+        if variants.index is not None:
+            records: Iterable = (record for window in make_windows(coordinates=coordinates)
+                                 if window.chromosome in variants.index
+                                 for record in variants.fetch(window.chromosome, window.start, window.stop))
+        else:
+            records = variants
+
+        for record in records:
+            if len(record.ref) != 1:
+                continue
+            sample = record.samples[0]
+            alleles = [allele.upper() for allele in record.alleles]
+            allele_depths = _get_format_field(sample, 'AD')
+            block_end = record.stop if record.stop > record.pos else None
+
+            if block_end is not None and not any(allele in SINGLE_BASES for allele in alleles[1:]):
+                depth = allele_depths[0] if allele_depths else None
+                if depth is None:
+                    block_depths = _get_format_field(sample, 'MIN_DP') or _get_format_field(sample, 'DP')
+                    depth = block_depths[0] if block_depths else None
+                if depth is None:
+                    continue
+                for position in range(record.start, block_end):
+                    if (record.chrom, position) not in sites:
+                        continue
+                    if position == record.start:
+                        base = alleles[0]
+                    elif reference is not None:
+                        base = reference.fetch(record.chrom, position, position + 1).upper()
+                    else:
+                        continue
+                    if base in SINGLE_BASES:
+                        yield (record.chrom, position), {**{other: 0 for other in BASES}, base: depth}
+                continue
+
+            site = (record.chrom, record.start)
+            if site not in sites or not allele_depths:
+                continue
+            counts = {base: 0 for base in BASES}
+            for allele, depth in zip(alleles, allele_depths):
+                if allele in counts and depth is not None:
+                    counts[allele] += depth
+            yield site, counts
+
+    if reference is not None:
+        reference.close()
+
+
+class CountsFile:
+    """Base counts at SNP positions read from precomputed counts (samtools mpileup output,
+    VCF/gVCF allelic depths or a counts TSV file) instead of an alignment file. The file is
+    read once, keeping only the counts at SNP positions. Instances are callable and can be
+    passed to get_snps as get_counts. Positions missing from the file have no coverage."""
+
+    def __init__(self, counts_file: str, coordinates: List[Tuple[str, int]], counts_format: Optional[str] = None,
+                 minimum_base_quality: int = 0, reference_fasta_file: Optional[str] = None) -> None:
+        counts_format = counts_format or detect_counts_format(counts_file=counts_file)
+        sites = set(coordinates)
+
+        if counts_format == 'vcf':
+            site_counts = read_vcf_counts(vcf_file=counts_file, coordinates=coordinates, reference_fasta_file=reference_fasta_file)
+            self._counts = self._merge(site_counts=site_counts)
+        elif counts_format in ('mpileup', 'tsv'):
+            with open_text_file(counts_file) as f:
+                if counts_format == 'mpileup':
+                    site_counts = parse_mpileup(stream=f, sites=sites, minimum_base_quality=minimum_base_quality)
+                else:
+                    site_counts = parse_counts_tsv(stream=f, sites=sites)
+                self._counts = self._merge(site_counts=site_counts)
+        else:
+            raise CountsFileError(f'Unknown counts format {counts_format}')
+
+    @staticmethod
+    def _merge(site_counts: Iterable[Tuple[Tuple[str, int], Dict[str, int]]]) -> Dict[Tuple[str, int], Dict[str, int]]:
+        # A site may be reported more than once (like in split multi-allelic VCF records,
+        # which repeat the reference depth), so the largest count of each base is kept.
+        result: Dict[Tuple[str, int], Dict[str, int]] = defaultdict(lambda: {base: 0 for base in BASES})
+        for site, counts in site_counts:
+            merged = result[site]
+            for base in BASES:
+                merged[base] = max(merged[base], counts[base])
+        return dict(result)
+
+    def __call__(self, chromosome: str, position: int) -> Dict[str, int]:
+        return dict(self._counts.get((chromosome, position), {base: 0 for base in BASES}))
@@ -0,0 +1,104 @@
+from typing import Dict
+from typing import Optional
+
+from snpahoy.contamination import ContaminationEstimate
+from snpahoy.contamination import estimate_contamination
+from snpahoy.core import SNPTable
+from snpahoy.utilities import mean_frequency
+
+
+class SampleStatistics:
+    """Genotype statistics of a sample over a set of genotyped sites."""
+
+    def __init__(self, heterozygotes_fraction: float, mean_maf_homozygote_sites: float, mean_off_genotype_frequency: float) -> None:
+        self.heterozygotes_fraction = heterozygotes_fraction
+        self.mean_maf_homozygote_sites = mean_maf_homozygote_sites
+        self.mean_off_genotype_frequency = mean_off_genotype_frequency
+
+    def as_dict(self) -> Dict:
+        return {'heterozygotes-fraction': float('%.4f' % self.heterozygotes_fraction),
+                'mean-maf-homozygote-sites': float('%.4f' % self.mean_maf_homozygote_sites),
+                'mean-off-genotype-frequency': float('%.4f' % self.mean_off_genotype_frequency)}
+
+
+class SampleSummary:
+    """Summary of a germline mode run. There are no statistics (and no contamination
+    estimate) if no site was genotyped."""
+
+    def __init__(self, total: int, genotyped: int, statistics: Optional[SampleStatistics],
+                 contamination: Optional[ContaminationEstimate] = None) -> None:
+        self.total = total
+        self.genotyped = genotyped
+        self.statistics = statistics
+        self.contamination = contamination
+
+    def as_dict(self) -> Dict:
+        summary: Dict = {'snps': {'total': self.total, 'genotyped': self.genotyped}}
+        if self.statistics:
+            summary.update(self.statistics.as_dict())
+        if self.contamination:
+            summary['contamination'] = self.contamination.as_dict()
+        return summary
+
+
+class PairSummary:
+    """Summary of a somatic mode run, over the sites genotyped in both samples. The
+    contamination is that of the tumor sample, given the germline genotypes. There are
+    no statistics if no site was genotyped in both samples."""
+
+    def __init__(self, total: int, genotyped: int, tumor: Optional[SampleStatistics], germline: Optional[SampleStatistics],
+                 contamination: Optional[ContaminationEstimate] = None) -> None:
+        self.total = total
+        self.genotyped = genotyped
+        self.tumor = tumor
+        self.germline = germline
+        self.contamination = contamination
+
+    def as_dict(self) -> Dict:
+        summary: Dict = {'snps': {'total': self.total, 'genotyped': self.genotyped}}
+        if self.tumor and self.germline:
+            summary['tumor'] = self.tumor.as_dict()
+            summary['germline'] = self.germline.as_dict()
+        if self.contamination:
+            summary['contamination'] = self.contamination.as_dict()
+        return summary
+
+
+def summarize_sample(snps: SNPTable) -> SampleSummary:
+
+    genotyped = snps.genotyped()
+    number_of_genotyped = int(genotyped.sum())
+
+    statistics = None
+    contamination = None
+    if number_of_genotyped:
+        statistics = SampleStatistics(heterozygotes_fraction=float(snps.heterozygotes().sum() / number_of_genotyped),
+                                      mean_maf_homozygote_sites=mean_frequency(snps.minor_allele_frequencies()[snps.homozygotes()]),
+                                      mean_off_genotype_frequency=mean_frequency(snps.off_genotype_frequencies()[genotyped]))
+        contamination = estimate_contamination(snps=snps, sites=genotyped)
+
+    return SampleSummary(total=len(snps), genotyped=number_of_genotyped, statistics=statistics, contamination=contamination)
+
+
+def summarize_pair(germline_snps: SNPTable, tumor_snps: SNPTable) -> PairSummary:
+
+    # Only consider SNPs which are genotyped in both germline and tumor sample.
+    genotyped_pairs = germline_snps.genotyped() & tumor_snps.genotyped()
+    number_of_genotyped_pairs = int(genotyped_pairs.sum())
+
+    # Homozygote positions are those at which the germline sample is homzygote.
+    homozygote_positions = genotyped_pairs & germline_snps.homozygotes()
+
+    def statistics(snps: SNPTable) -> SampleStatistics:
+        return SampleStatistics(heterozygotes_fraction=float((snps.heterozygotes() & genotyped_pairs).sum() / number_of_genotyped_pairs),
+                                mean_maf_homozygote_sites=mean_frequency(snps.minor_allele_frequencies()[homozygote_positions]),
+                                mean_off_genotype_frequency=mean_frequency(snps.off_genotype_frequencies()[genotyped_pairs]))
+
+    if not number_of_genotyped_pairs:
+        return PairSummary(total=len(germline_snps), genotyped=0, tumor=None, germline=None)
+
+    return PairSummary(total=len(germline_snps),
+                       genotyped=number_of_genotyped_pairs,
+                       tumor=statistics(tumor_snps),
+                       germline=statistics(germline_snps),
+                       contamination=estimate_contamination(snps=tumor_snps, germline_snps=germline_snps, sites=genotyped_pairs))
@@ -0,0 +1,109 @@
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+
+from snpahoy.core import SNP
+
+
+MATCH = 'match'
+MISMATCH = 'mismatch'
+UNDECIDED = 'undecided'
+
+# Probability of the tumor genotype not fitting the germline genotype at a site, if both samples
+# come from the same person (from genotyping errors) and if they come from different persons.
+# Unrelated persons differ at about a third of the sites of a typical panel, so the latter is
+# on the low side to also detect swaps with relatives or with samples of a low heterozygosity.
+MATCH_DISCORDANCE = 0.02
+MISMATCH_DISCORDANCE = 0.2
+
+DEFAULT_CONFIDENCE = 0.999
+
+
+def is_discordant(germline_genotype: str, tumor_genotype: str) -> bool:
+    """Whether a tumor genotype does not fit the germline genotype. Tumors may lose either allele
+    of a germline heterozygote site, so only tumor alleles missing from the germline genotype count."""
+    return not set(tumor_genotype) <= set(germline_genotype)
+
+
+def shuffle_coordinates(coordinates: List[Tuple[str, int]], seed: int = 0) -> List[Tuple[str, int]]:
+    """Puts SNP positions in a random order, which is the same for the same positions and seed.
+    Nearby positions are then spread out, so that local events (like losses of a region in the
+    tumor) do not weigh on the first sites examined."""
+    order = np.random.default_rng(seed).permutation(len(coordinates))
+    return [coordinates[index] for index in order.tolist()]
+
+
+class TriageResult:
+    """Outcome of a sequential test of whether a tumor and a germline sample come from the same
+    person. The confidence is the probability of the decision (or, if undecided, of the more likely
+    outcome) given equal prior odds."""
+
+    def __init__(self, decision: str, confidence: float, examined: int, genotyped: int, discordant: int) -> None:
+        self.decision = decision
+        self.confidence = confidence
+        self.examined = examined
+        self.genotyped = genotyped
+        self.discordant = discordant
+
+    def as_dict(self) -> Dict:
+        return {'decision': self.decision,
+                'confidence': float('%.4f' % self.confidence),
+                'snps': {'examined': self.examined, 'genotyped': self.genotyped, 'discordant': self.discordant}}
+
+
+class SequentialTest:
+    """Wald's sequential probability ratio test of MATCH_DISCORDANCE against MISMATCH_DISCORDANCE,
+    updated one genotyped site at a time. Decides once either outcome reaches the confidence
+    (which bounds the probabilities of both wrong decisions at one minus the confidence)."""
+
+    def __init__(self, confidence: float = DEFAULT_CONFIDENCE) -> None:
+        if not 0.5 < confidence < 1:
+            raise ValueError('Confidence must be between 0.5 and 1')
+        self._threshold = float(np.log(confidence / (1 - confidence)))
+        self._discordant_step = float(np.log(MISMATCH_DISCORDANCE / MATCH_DISCORDANCE))
+        self._concordant_step = float(np.log((1 - MISMATCH_DISCORDANCE) / (1 - MATCH_DISCORDANCE)))
+        self.log_likelihood_ratio = 0.0
+        self.genotyped = 0
+        self.discordant = 0
+
+    def update(self, discordant: bool) -> None:
+        self.genotyped += 1
+        self.discordant += discordant
+        self.log_likelihood_ratio += self._discordant_step if discordant else self._concordant_step
+
+    @property
+    def decision(self) -> Optional[str]:
+        if self.log_likelihood_ratio >= self._threshold:
+            return MISMATCH
+        if self.log_likelihood_ratio <= -self._threshold:
+            return MATCH
+        return None
+
+    @property
+    def confidence(self) -> float:
+        return float(1 / (1 + np.exp(-abs(self.log_likelihood_ratio))))
+
+
+def triage_pair(germline_snps: Iterable[SNP], tumor_snps: Iterable[SNP], confidence: float = DEFAULT_CONFIDENCE) -> TriageResult:
+    """Compares the SNPs of a germline and a tumor sample (at the same positions, in the same order)
+    until the sequential test decides. SNPs are only taken from the iterables as long as needed,
+    so with lazily counted SNPs (see generate_snps) the remaining positions are never counted."""
+
+    test = SequentialTest(confidence=confidence)
+    examined = 0
+    for germline_snp, tumor_snp in zip(germline_snps, tumor_snps):
+        examined += 1
+        if germline_snp.genotype and tumor_snp.genotype:
+            test.update(discordant=is_discordant(germline_genotype=germline_snp.genotype, tumor_genotype=tumor_snp.genotype))
+            if test.decision:
+                break
+
+    return TriageResult(decision=test.decision or UNDECIDED,
+                        confidence=test.confidence,
+                        examined=examined,
+                        genotyped=test.genotyped,
+                        discordant=test.discordant)
@@ -1,6 +1,10 @@
+import math
+
 from statistics import mean
 from typing import List
 
+import numpy as np
+
 from snpahoy.core import SNP
 
 
@@ -21,3 +25,10 @@ def mean_off_genotype_frequency(snps: List[SNP]) -> float:
     if not snps:
         return 0.0
     return mean([snp.off_genotype_frequency() for snp in snps])
+
+
+def mean_frequency(frequencies: np.ndarray) -> float:
+    """Computes the mean of an array of frequencies (like those of SNPTable)."""
+    if not len(frequencies):
+        return 0.0
+    return math.fsum(frequencies) / len(frequencies)
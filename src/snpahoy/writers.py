@@ -0,0 +1,71 @@
+import json
+
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import TextIO
+from typing import Union
+
+from snpahoy.core import SNP
+
+
+def get_detail(snp: SNP) -> Dict:
+    detail = {
+        'depth': snp.depth,
+        'counts': {base: snp.count(base) for base in list('ACGT')},
+        'alleles': {
+            'major': {
+                'base': snp.major_allele if snp.count(snp.major_allele) > 0 else '',
+                'frequency': float('%.4f' % snp.major_allele_frequency())
+            },
+            'minor': {
+                'base': snp.minor_allele if snp.count(snp.minor_allele) > 0 else '',
+                'frequency': float('%.4f' % snp.minor_allele_frequency())
+            }
+        },
+        'genotype': snp.genotype if snp.genotype else '',
+        'off_genotype_frequency': float('%.4f' % snp.off_genotype_frequency()) if snp.genotype else 0.0
+    }
+    if snp.raw_depth is not None:
+        detail['raw_depth'] = snp.raw_depth
+    if snp.reference is not None:
+        detail['reference'] = snp.reference
+        detail['alternate'] = snp.alternate
+    return detail
+
+
+class NDJSONWriter:
+    """Writes one JSON record per SNP and sample, with the same content as the details in the JSON output."""
+
+    def __init__(self, stream: TextIO) -> None:
+        self._stream = stream
+
+    def write(self, sample: str, snps: Iterable[SNP]) -> None:
+        for snp in snps:
+            self._stream.write(json.dumps({'sample': sample, 'snp': snp.__str__(), **get_detail(snp)}) + '\n')
+
+
+class TSVWriter:
+    """Writes one tab-separated line per SNP and sample. The reference and alternate columns
+    are empty unless the reference bases are known (with compiled panels)."""
+
+    COLUMNS = ['sample', 'snp', 'depth', 'raw_depth', 'A', 'C', 'G', 'T', 'major_allele', 'major_allele_frequency',
+               'minor_allele', 'minor_allele_frequency', 'genotype', 'off_genotype_frequency', 'reference', 'alternate']
+
+    def __init__(self, stream: TextIO) -> None:
+        self._stream = stream
+        self._stream.write('\t'.join(self.COLUMNS) + '\n')
+
+    def write(self, sample: str, snps: Iterable[SNP]) -> None:
+        for snp in snps:
+            detail = get_detail(snp)
+            fields = [sample, snp.__str__(), detail['depth'], detail.get('raw_depth', detail['depth']), *detail['counts'].values(),
+                      detail['alleles']['major']['base'], detail['alleles']['major']['frequency'],
+                      detail['alleles']['minor']['base'], detail['alleles']['minor']['frequency'],
+                      detail['genotype'], detail['off_genotype_frequency'], detail.get('reference', ''), detail.get('alternate', '')]
+            self._stream.write('\t'.join(str(field) for field in fields) + '\n')
+
+
+DetailsWriter = Union[NDJSONWriter, TSVWriter]
+
+WRITERS: Dict[str, Callable[[TextIO], DetailsWriter]] = {'ndjson': NDJSONWriter, 'tsv': TSVWriter}
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+
+from snpahoy.api import Panel
+from snpahoy.api import PrecomputedCounts
+from snpahoy.api import Settings
+from snpahoy.api import compile_panel
+from snpahoy.api import fingerprint_germline
+from snpahoy.api import fingerprint_somatic
+from snpahoy.api import iterate_snps
+from snpahoy.api import triage_somatic
+
+
+class TestApi(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.panel = Panel(intervals=[('chr2', 10, 11), ('chr1', 20, 22)])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_counts(self, name, rows):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as f:
+            for chromosome, position, *counts in rows:
+                f.write('\t'.join([chromosome, str(position + 1), *map(str, counts)]) + '\n')
+        return PrecomputedCounts(counts_file=path)
+
+    def test_settings(self):
+        self.assertEqual(Settings().describe(), {'minimum-coverage': 30, 'minimum-base-quality': 1, 'homozygosity-threshold': 0.95})
+        self.assertEqual(Settings(maximum_depth=100, minimum_mapping_quality=20).describe(),
+                         {'minimum-coverage': 30, 'minimum-base-quality': 1, 'homozygosity-threshold': 0.95,
+                          'maximum-depth': 100, 'minimum-mapping-quality': 20})
+        with self.assertRaises(ValueError):
+            Settings(minimum_coverage=30, maximum_depth=20)
+
+    def test_panel_coordinates(self):
+        self.assertEqual(self.panel.coordinates(), [('chr2', 10), ('chr1', 20), ('chr1', 21)])
+        self.assertEqual(self.panel.coordinates(contig_order=['chr1', 'chr2']), [('chr1', 20), ('chr1', 21), ('chr2', 10)])
+        self.assertEqual(len(self.panel), 3)
+
+    def test_fingerprint_germline(self):
+        source = self.write_counts('sample.tsv', [('chr2', 10, 40, 0, 0, 0), ('chr1', 20, 20, 20, 0, 0)])
+
+        fingerprint = fingerprint_germline(source=source, panel=self.panel)
+
+        self.assertEqual([snp.genotype for snp in fingerprint.snps], ['AA', 'AC', None])
+        self.assertEqual((fingerprint.summary.total, fingerprint.summary.genotyped), (3, 2))
+        self.assertEqual(fingerprint.summary.statistics.heterozygotes_fraction, 0.5)
+
+        # Intervals and BED files can be given instead of a Panel.
+        bed_file = os.path.join(self.directory.name, 'panel.bed')
+        with open(bed_file, 'w') as f:
+            f.write('chr2\t10\t11\nchr1\t20\t22\n')
+        for panel in [bed_file, [('chr2', 10, 11), ('chr1', 20, 22)]]:
+            self.assertEqual(fingerprint_germline(source=source, panel=panel).summary.as_dict(), fingerprint.summary.as_dict())
+
+    def test_fingerprint_germline_compiled_panel(self):
+        source = self.write_counts('sample.tsv', [('chr2', 10, 40, 0, 0, 0), ('chr1', 20, 20, 20, 0, 0)])
+        reference_fasta_file = os.path.join(self.directory.name, 'reference.fa')
+        with open(reference_fasta_file, 'w') as f:
+            f.write('>chr1\n' + 'C' * 30 + '\n>chr2\n' + 'A' * 30 + '\n')
+        bed_file = os.path.join(self.directory.name, 'panel.bed')
+        with open(bed_file, 'w') as f:
+            f.write('chr2\t10\t11\nchr1\t20\t22\n')
+        panel = compile_panel(bed_file=bed_file, reference_fasta_file=reference_fasta_file, panel_file=os.path.join(self.directory.name, 'panel.snpahoy'))
+
+        fingerprint = fingerprint_germline(source=source, panel=panel)
+
+        self.assertEqual([snp.genotype for snp in fingerprint.snps], ['AA', 'AC', None])
+        self.assertEqual([(snp.reference, snp.alternate) for snp in fingerprint.snps], [('A', ''), ('C', 'A'), ('C', '')])
+        self.assertEqual(fingerprint.summary.as_dict(), fingerprint_germline(source=source, panel=self.panel).summary.as_dict())
+
+    def test_iterate_snps(self):
+        source = self.write_counts('sample.tsv', [('chr2', 10, 40, 0, 0, 0), ('chr1', 20, 20, 20, 0, 0)])
+        settings = Settings(maximum_depth=30)
+
+        snps = list(iterate_snps(source=source, panel=self.panel, settings=settings))
+
+        self.assertEqual([str(snp) for snp in snps], [str(snp) for snp in fingerprint_germline(source=source, panel=self.panel, settings=settings).snps])
+        # Counts files are used as they are, the maximum depth only applies to BAM/CRAM files.
+        self.assertEqual([(snp.depth, snp.raw_depth) for snp in snps], [(40, None), (40, None), (0, None)])
+
+    def test_fingerprint_somatic(self):
+        germline = self.write_counts('germline.tsv', [('chr2', 10, 40, 0, 0, 0), ('chr1', 20, 20, 20, 0, 0)])
+        tumor = self.write_counts('tumor.tsv', [('chr2', 10, 38, 2, 0, 0), ('chr1', 20, 40, 0, 0, 0)])
+
+        fingerprint = fingerprint_somatic(tumors=tumor, germline=germline, panel=self.panel)
+
+        self.assertEqual(len(fingerprint.tumors_snps), 1)
+        self.assertEqual([snp.genotype for snp in fingerprint.tumor_snps], ['AA', 'AA', None])
+        self.assertEqual(fingerprint.summary.genotyped, 2)
+        self.assertEqual(fingerprint.summary.germline.heterozygotes_fraction, 0.5)
+        self.assertEqual(fingerprint.summary.tumor.heterozygotes_fraction, 0.0)
+
+        fingerprint = fingerprint_somatic(tumors=[tumor, germline], germline=germline, panel=self.panel)
+        self.assertEqual(len(fingerprint.summaries), 2)
+        self.assertEqual(fingerprint.summaries[1].tumor.heterozygotes_fraction, 0.5)
+
+    def test_triage_somatic(self):
+        # Alternating homozygote sites, with a tumor from another person swapping the genotypes.
+        panel = Panel(intervals=[('chr1', 0, 200)])
+        germline = self.write_counts('germline.tsv', [('chr1', position, *((40, 0, 0, 0) if position % 2 else (0, 40, 0, 0))) for position in range(200)])
+        swapped = self.write_counts('swapped.tsv', [('chr1', position, *((0, 40, 0, 0) if position % 2 else (40, 0, 0, 0))) for position in range(200)])
+
+        match, mismatch = triage_somatic(tumors=[germline, swapped], germline=germline, panel=panel)
+
+        self.assertEqual((match.decision, match.discordant), ('match', 0))
+        self.assertEqual((mismatch.decision, mismatch.discordant), ('mismatch', mismatch.genotyped))
+        self.assertLess(match.examined, 200)
+        self.assertGreaterEqual(match.confidence, 0.999)
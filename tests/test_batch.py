@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+from snpahoy.batch import parse_manifest
+from snpahoy.batch import read_checkpoint
+from snpahoy.batch import write_checkpoint
+
+from snpahoy.exceptions import ManifestError
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_parse_manifest(self):
+
+        manifest_lines = ['\t'.join(['sample', 'bam_file', 'germline_bam_file']),
+                          '# Comment',
+                          '\t'.join(['normal', 'normal.bam', '']),
+                          '\t'.join(['tumor', 'tumor.bam', 'normal.bam'])]
+
+        samples = parse_manifest(stream=manifest_lines)
+
+        self.assertEqual([(sample.name, sample.bam_file, sample.germline_bam_file) for sample in samples],
+                         [('normal', 'normal.bam', None),
+                          ('tumor', 'tumor.bam', 'normal.bam')])
+
+    def test_parse_manifest_without_germline_column(self):
+        samples = parse_manifest(stream=['sample\tbam_file', 'normal\tnormal.bam'])
+        self.assertIsNone(samples[0].germline_bam_file)
+
+    def test_parse_manifest_missing_column_raises_exception(self):
+        with self.assertRaises(ManifestError):
+            parse_manifest(stream=['sample\tgermline_bam_file', 'tumor\tnormal.bam'])
+
+    def test_parse_manifest_wrong_number_of_fields_raises_exception(self):
+        with self.assertRaises(ManifestError):
+            parse_manifest(stream=['sample\tbam_file', 'normal\tnormal.bam\textra'])
+
+    def test_parse_manifest_duplicate_samples_raises_exception(self):
+        with self.assertRaises(ManifestError):
+            parse_manifest(stream=['sample\tbam_file', 'normal\tnormal.bam', 'normal\tother.bam'])
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_file = os.path.join(directory, 'checkpoint.txt')
+            self.assertEqual(read_checkpoint(checkpoint_file=checkpoint_file), set())
+            write_checkpoint(checkpoint_file=checkpoint_file, name='normal')
+            write_checkpoint(checkpoint_file=checkpoint_file, name='tumor')
+            self.assertEqual(read_checkpoint(checkpoint_file=checkpoint_file), {'normal', 'tumor'})
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from snpahoy.cache import CountsCache
+from snpahoy.cache import find_index_file
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.alignment_file = os.path.join(self.directory.name, 'sample.bam')
+        with open(self.alignment_file, 'wb') as f:
+            f.write(b'BAM')
+        self.coordinates = [('chr1', 1000), ('chr2', 5000)]
+        self.counts = [{'A': 50, 'C': 0, 'G': 0, 'T': 0}, {'A': 0, 'C': 30, 'G': 30, 'T': 1}]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_find_index_file(self):
+        self.assertIsNone(find_index_file(self.alignment_file))
+        with open(os.path.join(self.directory.name, 'sample.bai'), 'wb'):
+            pass
+        self.assertEqual(find_index_file(self.alignment_file), os.path.join(self.directory.name, 'sample.bai'))
+
+    def test_get_and_put(self):
+        cache = CountsCache(directory=os.path.join(self.directory.name, 'cache'))
+        key = cache.key(alignment_file=self.alignment_file, coordinates=self.coordinates, minimum_base_quality=1)
+        self.assertIsNone(cache.get(key=key))
+        cache.put(key=key, counts=self.counts)
+        self.assertEqual(cache.get(key=key), self.counts)
+
+    def test_key(self):
+        cache = CountsCache(directory=os.path.join(self.directory.name, 'cache'))
+        key = cache.key(alignment_file=self.alignment_file, coordinates=self.coordinates, minimum_base_quality=1)
+        self.assertEqual(key, cache.key(alignment_file=self.alignment_file, coordinates=self.coordinates, minimum_base_quality=1))
+        self.assertNotEqual(key, cache.key(alignment_file=self.alignment_file, coordinates=self.coordinates, minimum_base_quality=20))
+        self.assertNotEqual(key, cache.key(alignment_file=self.alignment_file, coordinates=self.coordinates[:1], minimum_base_quality=1))
+        self.assertEqual(key, cache.key(alignment_file=self.alignment_file, coordinates=self.coordinates, minimum_base_quality=1, read_filter={}))
+        self.assertNotEqual(key, cache.key(alignment_file=self.alignment_file, coordinates=self.coordinates, minimum_base_quality=1,
+                                           read_filter={'minimum-mapping-quality': 20}))
+        os.utime(self.alignment_file, ns=(0, 0))
+        self.assertNotEqual(key, cache.key(alignment_file=self.alignment_file, coordinates=self.coordinates, minimum_base_quality=1))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = CountsCache(directory=os.path.join(self.directory.name, 'cache'), maximum_size=1)
+        # Each entry is far below one megabyte, so shrink the limit to roughly two entries.
+        cache._maximum_size = 2 * len('[[50,0,0,0],[0,30,30,1]]')
+        cache.put(key='first', counts=self.counts)
+        cache.put(key='second', counts=self.counts)
+        os.utime(os.path.join(self.directory.name, 'cache', 'first.json'), (0, 0))
+        os.utime(os.path.join(self.directory.name, 'cache', 'second.json'), (1, 1))
+        self.assertEqual(cache.get(key='first'), self.counts)
+        cache.put(key='third', counts=self.counts)
+        self.assertIsNone(cache.get(key='second'))
+        self.assertEqual(cache.get(key='first'), self.counts)
+        self.assertEqual(cache.get(key='third'), self.counts)
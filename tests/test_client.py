@@ -0,0 +1,182 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+
+from snpahoy.client import client
+from snpahoy.client import write_results
+from snpahoy.metrics import Metrics
+
+from tests.test_counting import write_alignment_file
+
+
+class TestClient(unittest.TestCase):
+
+    def test_write_results(self):
+        results = {'input': {'files': {'bed-file': 'snps.bed'}}, 'output': {'details': {'chr1:1000': {'genotype': 'AA'}}}}
+        with tempfile.TemporaryDirectory() as directory:
+            output_json_file = os.path.join(directory, 'output.json')
+            write_results(results=results, output_json_file=output_json_file, metrics=Metrics())
+            with open(output_json_file) as f:
+                text = f.read()
+        written = json.loads(text)
+        self.assertIn('write-json', written['metrics']['phases'])
+        self.assertEqual(text, json.dumps({**results, 'metrics': written['metrics']}, indent=4))
+
+
+class TestSomaticCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        _, bam_file, coordinates = write_alignment_file(directory=self.directory.name)
+        self.bed_file = self.path('panel.bed')
+        with open(self.bed_file, 'w') as f:
+            f.writelines(f'{chromosome}\t{position}\t{position + 1}\n' for chromosome, position in coordinates)
+        for name in ['germline.bam', 'tumor1.bam', 'tumor2.bam']:
+            shutil.copy(bam_file, self.path(name))
+            shutil.copy(bam_file + '.bai', self.path(name) + '.bai')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def somatic(self, tumor_bam_files):
+        arguments = ['--no_cache', '--minimum_coverage', '10', 'somatic', '--bed_file', self.bed_file,
+                     '--germline_bam_file', self.path('germline.bam'), '--output_json_file', self.path('output.json')]
+        for tumor_bam_file in tumor_bam_files:
+            arguments.extend(['--tumor_bam_file', tumor_bam_file])
+        result = CliRunner().invoke(client, arguments, obj={})
+        self.assertEqual(result.exit_code, 0, result.output)
+        with open(self.path('output.json')) as f:
+            return json.load(f)
+
+    def test_several_tumors(self):
+        output = self.somatic([self.path('tumor1.bam'), self.path('tumor2.bam')])
+        single_output = self.somatic([self.path('tumor1.bam')])
+        self.assertGreater(single_output['output']['summary']['snps']['genotyped'], 0)
+
+        self.assertEqual(output['input']['files'], {'bed-file': 'panel.bed', 'tumor-bam-files': ['tumor1.bam', 'tumor2.bam'], 'germline-bam-file': 'germline.bam'})
+        self.assertEqual(single_output['input']['files'], {'bed-file': 'panel.bed', 'tumor-bam-file': 'tumor1.bam', 'germline-bam-file': 'germline.bam'})
+
+        self.assertEqual(list(output['output']['summary']['tumors']), ['tumor1.bam', 'tumor2.bam'])
+        self.assertEqual(list(output['output']['details']['tumors']), ['tumor1.bam', 'tumor2.bam'])
+        for name in ['tumor1.bam', 'tumor2.bam']:
+            self.assertEqual(output['output']['summary']['tumors'][name], single_output['output']['summary'])
+            self.assertEqual(output['output']['details']['tumors'][name], single_output['output']['details']['tumor'])
+        self.assertEqual(output['output']['details']['germline'], single_output['output']['details']['germline'])
+
+    def test_duplicate_tumor_names(self):
+        os.mkdir(self.path('other'))
+        shutil.copy(self.path('tumor1.bam'), self.path('other/tumor1.bam'))
+        result = CliRunner().invoke(client, ['--no_cache', 'somatic', '--bed_file', self.bed_file,
+                                             '--tumor_bam_file', self.path('tumor1.bam'), '--tumor_bam_file', self.path('other/tumor1.bam'),
+                                             '--germline_bam_file', self.path('germline.bam'), '--output_json_file', self.path('output.json')], obj={})
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn('Tumor files must have distinct names', result.output)
+        self.assertFalse(os.path.exists(self.path('output.json')))
+
+
+class TestBatchCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        _, self.bam_file, coordinates = write_alignment_file(directory=self.directory.name)
+        self.bed_file = self.path('panel.bed')
+        with open(self.bed_file, 'w') as f:
+            f.writelines(f'{chromosome}\t{position}\t{position + 1}\n' for chromosome, position in coordinates)
+        self.manifest_file = self.path('manifest.tsv')
+        with open(self.manifest_file, 'w') as f:
+            f.write('sample\tbam_file\tgermline_bam_file\n')
+            f.write(f'normal\t{self.bam_file}\t\n')
+            f.write(f'tumor\t{self.path("tumor.bam")}\t{self.bam_file}\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def invoke(self, arguments):
+        return CliRunner().invoke(client, ['--no_cache', '--minimum_coverage', '10'] + arguments, obj={})
+
+    def batch(self):
+        return self.invoke(['batch', '--bed_file', self.bed_file, '--manifest_file', self.manifest_file, '--output_directory', self.path('output')])
+
+    def read_output(self, name):
+        with open(self.path(name)) as f:
+            return json.load(f)
+
+    def test_batch(self):
+        # The tumor BAM file is missing, so only the normal sample completes.
+        result = self.batch()
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('Sample tumor failed', result.output)
+        self.assertEqual(sorted(os.listdir(self.path('output'))), ['checkpoint.txt', 'normal.json'])
+
+        germline_result = self.invoke(['germline', '--bed_file', self.bed_file, '--bam_file', self.bam_file, '--output_json_file', self.path('germline.json')])
+        self.assertEqual(germline_result.exit_code, 0, germline_result.output)
+        self.assertEqual(self.read_output('output/normal.json'), self.read_output('germline.json'))
+
+        # Resuming skips the completed normal sample and runs the tumor sample.
+        shutil.copy(self.bam_file, self.path('tumor.bam'))
+        shutil.copy(self.bam_file + '.bai', self.path('tumor.bam.bai'))
+        os.remove(self.path('output/normal.json'))
+        result = self.batch()
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Skipping 1 completed samples', result.output)
+        self.assertEqual(sorted(os.listdir(self.path('output'))), ['checkpoint.txt', 'tumor.json'])
+
+        somatic_result = self.invoke(['somatic', '--bed_file', self.bed_file, '--tumor_bam_file', self.path('tumor.bam'),
+                                      '--germline_bam_file', self.bam_file, '--output_json_file', self.path('somatic.json')])
+        self.assertEqual(somatic_result.exit_code, 0, somatic_result.output)
+        somatic_output = self.read_output('somatic.json')
+        self.assertGreater(somatic_output['output']['summary']['snps']['genotyped'], 0)
+        self.assertEqual(self.read_output('output/tumor.json'), somatic_output)
+
+
+class TestDatabaseCommands(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        _, self.bam_file, coordinates = write_alignment_file(directory=self.directory.name)
+        self.bed_file = self.path('panel.bed')
+        with open(self.bed_file, 'w') as f:
+            f.writelines(f'{chromosome}\t{position}\t{position + 1}\n' for chromosome, position in coordinates)
+        self.database_file = self.path('fingerprints.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def invoke(self, command, bed_file):
+        return CliRunner().invoke(client, ['--no_cache', '--minimum_coverage', '10', 'db', command, '--database_file', self.database_file,
+                                           '--bed_file', bed_file, '--bam_file', self.bam_file], obj={})
+
+    def test_add_and_query(self):
+        result = self.invoke('add', self.bed_file)
+        self.assertEqual(result.exit_code, 0, result.output)
+        result = self.invoke('query', self.bed_file)
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(result.output.splitlines()[1].split('\t')[:2], ['sample.bam', '1.0000'])
+
+    def test_missing_contig(self):
+        bed_file = self.path('other.bed')
+        shutil.copy(self.bed_file, bed_file)
+        with open(bed_file, 'a') as f:
+            f.write('chr3\t1000\t1001\n')
+        result = self.invoke('add', bed_file)
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn('Contigs of the panel missing from the alignment file: chr3', result.output)
+        self.assertFalse(os.path.exists(self.database_file))
+
+        self.assertEqual(self.invoke('add', self.bed_file).exit_code, 0)
+        result = self.invoke('query', bed_file)
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn('Contigs of the panel missing from the alignment file: chr3', result.output)
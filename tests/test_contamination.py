@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+
+from snpahoy.contamination import MINIMUM_SITES
+from snpahoy.contamination import estimate_contamination
+from snpahoy.contamination import genotype_priors
+from snpahoy.core import SNPTable
+
+
+def simulate(fraction, depth=200, number_of_sites=2000, minor_allele_frequency=0.3, error_rate=0.001, seed=0):
+    """Simulates A/C counts of a sample contaminated with reads from an unrelated person,
+    returning the table and the (A allele) genotypes of the sample."""
+
+    random = np.random.default_rng(seed)
+    sample = random.binomial(2, minor_allele_frequency, size=number_of_sites)
+    contaminant = random.binomial(2, minor_allele_frequency, size=number_of_sites)
+    allele_fractions = (1 - fraction) * sample / 2 + fraction * contaminant / 2
+    # Errors are spread evenly over the three other bases.
+    probabilities = np.full((number_of_sites, 4), error_rate / 3)
+    probabilities[:, 0] = (1 - allele_fractions) * (1 - error_rate) + allele_fractions * error_rate / 3
+    probabilities[:, 1] = allele_fractions * (1 - error_rate) + (1 - allele_fractions) * error_rate / 3
+    counts = random.multinomial(depth, probabilities).astype(np.uint32)
+    genotypes = [['AA', 'AC', 'CC'][genotype] for genotype in sample]
+
+    return SNPTable(chromosomes=['chr1'] * number_of_sites, positions=list(range(number_of_sites)), counts=counts, genotypes=genotypes), genotypes
+
+
+class TestContamination(unittest.TestCase):
+
+    def test_genotype_priors(self):
+        priors = genotype_priors(heterozygosity=0.42)
+        self.assertAlmostEqual(priors[0].sum(), 1.0)
+        self.assertAlmostEqual(priors[1].sum(), 1.0)
+        # A homozygote sample can only be homozygote.
+        self.assertEqual(priors[0, 1:].sum(), 0.0)
+
+    def test_germline(self):
+        for fraction in (0.02, 0.1):
+            snps, _ = simulate(fraction=fraction)
+            estimate = estimate_contamination(snps=snps)
+            self.assertAlmostEqual(estimate.fraction, fraction, delta=0.1 * fraction)
+            self.assertGreater(estimate.log_likelihood_ratio, 10)
+            self.assertEqual(estimate.sites, len(snps))
+
+    def test_no_contamination(self):
+        snps, _ = simulate(fraction=0.0)
+        estimate = estimate_contamination(snps=snps)
+        self.assertLess(estimate.fraction, 0.002)
+        self.assertLess(estimate.log_likelihood_ratio, 3)
+
+    def test_somatic(self):
+        tumor_snps, genotypes = simulate(fraction=0.05, seed=1)
+        counts = np.zeros((len(genotypes), 4), dtype=np.uint32)
+        counts[:, 0] = [100 * genotype.count('A') for genotype in genotypes]
+        counts[:, 1] = [100 * genotype.count('C') for genotype in genotypes]
+        germline_snps = SNPTable(chromosomes=tumor_snps.chromosomes, positions=tumor_snps.positions, counts=counts, genotypes=genotypes)
+
+        # Heterozygote sites where the tumor lost an allele do not count as contamination.
+        tumor_counts = tumor_snps.counts.copy()
+        lost = np.array([genotype == 'AC' for genotype in genotypes])
+        tumor_counts[lost] = [200, 0, 0, 0]
+        tumor_snps = SNPTable(chromosomes=tumor_snps.chromosomes, positions=tumor_snps.positions, counts=tumor_counts, genotypes=tumor_snps.genotypes)
+
+        estimate = estimate_contamination(snps=tumor_snps, germline_snps=germline_snps)
+        self.assertAlmostEqual(estimate.fraction, 0.05, delta=0.005)
+        self.assertEqual(estimate.sites, int((~lost).sum()))
+
+    def test_outlier_sites(self):
+        snps, _ = simulate(fraction=0.0)
+        # A few sites with reads of a third base in the middle (like from mapping artifacts).
+        counts = snps.counts.copy()
+        counts[:10] = [150, 0, 50, 0]
+        snps = SNPTable(chromosomes=snps.chromosomes, positions=snps.positions, counts=counts, genotypes=snps.genotypes)
+        self.assertLess(estimate_contamination(snps=snps).fraction, 0.01)
+
+    def test_no_sites(self):
+        snps, _ = simulate(fraction=0.0, number_of_sites=10)
+        self.assertIsNone(estimate_contamination(snps=snps, sites=np.zeros(10, dtype=np.bool_)))
+        self.assertEqual(estimate_contamination(snps=snps).as_dict()['sites'], 10)
+
+    def test_too_few_sites(self):
+        snps, _ = simulate(fraction=0.1, number_of_sites=2 * MINIMUM_SITES)
+        self.assertEqual(estimate_contamination(snps=snps, sites=np.arange(len(snps)) < MINIMUM_SITES).sites, MINIMUM_SITES)
+        self.assertIsNone(estimate_contamination(snps=snps, sites=np.arange(len(snps)) < MINIMUM_SITES - 1))
+
+        # In somatic mode, only germline homozygote sites count.
+        counts = np.zeros((len(snps), 4), dtype=np.uint32)
+        counts[:, 0] = 50
+        counts[:MINIMUM_SITES + 1, 1] = 50
+        genotypes = ['AC'] * (MINIMUM_SITES + 1) + ['AA'] * (MINIMUM_SITES - 1)
+        germline_snps = SNPTable(chromosomes=snps.chromosomes, positions=snps.positions, counts=counts, genotypes=genotypes)
+        self.assertIsNone(estimate_contamination(snps=snps, germline_snps=germline_snps))
@@ -1,6 +1,10 @@
+import random
 import unittest
 
+import numpy as np
+
 from snpahoy.core import SNP
+from snpahoy.core import SNPTable
 from snpahoy.core import Genotyper
 
 from snpahoy.exceptions import MissingGenotypeError, UnknownBaseError
@@ -17,6 +21,17 @@ class TestGenotyper(unittest.TestCase):
         self.assertEqual(genotyper.genotype({'A': 0, 'C': 0, 'G': 10, 'T': 90}), 'GT')
         self.assertEqual(genotyper.genotype({'A': 20, 'C': 5, 'G': 0, 'T': 0}), None)
 
+    def test_genotype_batch(self):
+        genotyper = Genotyper(minimum_coverage=30, homozygosity_threshold=0.95)
+        counts = np.array([[50, 0, 0, 0], [0, 50, 50, 0], [0, 95, 5, 0], [0, 0, 90, 10], [0, 0, 10, 90], [20, 5, 0, 0], [0, 0, 0, 0]], dtype=np.uint32)
+        self.assertEqual(genotyper.genotype_batch(counts), ['AA', 'CG', 'CC', 'GT', 'GT', None, None])
+
+    def test_genotype_batch_agrees_with_genotype(self):
+        genotyper = Genotyper(minimum_coverage=10, homozygosity_threshold=0.9)
+        generator = random.Random(0)
+        counts = np.array([[generator.choice([0, 1, 2, 5, 20, 40]) for _ in range(4)] for _ in range(1000)], dtype=np.uint32)
+        self.assertEqual(genotyper.genotype_batch(counts), [genotyper.genotype(dict(zip('ACGT', row))) for row in counts.tolist()])
+
 
 class TestSNP(unittest.TestCase):
 
@@ -92,3 +107,50 @@ class TestSNP(unittest.TestCase):
 
     def test_snp_string_representation(self):
         self.assertEqual(self.snp.__str__(), 'chr1:1000')
+
+
+class TestSNPTable(unittest.TestCase):
+
+    def setUp(self):
+        self.snps = [SNP(chromosome='chr1', position=1000, genotype='AA', counts={'A': 95, 'C': 1, 'G': 3, 'T': 1}),
+                     SNP(chromosome='chr2', position=5000, genotype='GT', counts={'A': 3, 'C': 2, 'G': 25, 'T': 20}),
+                     SNP(chromosome='chr3', position=2000, genotype=None, counts={'A': 0, 'C': 0, 'G': 0, 'T': 0})]
+        self.table = SNPTable.from_snps(self.snps)
+
+    def test_create_snp_table(self):
+        self.assertEqual(self.table.chromosomes, ['chr1', 'chr2', 'chr3'])
+        self.assertEqual(self.table.positions.tolist(), [1000, 5000, 2000])
+        self.assertEqual(self.table.counts.tolist(), [[95, 1, 3, 1], [3, 2, 25, 20], [0, 0, 0, 0]])
+        self.assertEqual(self.table.genotypes, ['AA', 'GT', None])
+
+    def test_snp_views(self):
+        self.assertEqual(len(self.table), 3)
+        for snp, view in zip(self.snps, self.table):
+            self.assertEqual(view.__str__(), snp.__str__())
+            self.assertEqual(view.genotype, snp.genotype)
+            self.assertEqual(view._counts, snp._counts)
+
+    def test_depths(self):
+        self.assertEqual(self.table.depths().tolist(), [100, 50, 0])
+
+    def test_raw_depths(self):
+        self.assertEqual(self.table.raw_depths().tolist(), [100, 50, 0])
+        self.assertIsNone(self.table[0].raw_depth)
+        capped_table = SNPTable(chromosomes=['chr1'], positions=[1000], counts=[[100, 0, 0, 0]], genotypes=['AA'], raw_depths=[3000])
+        self.assertEqual(capped_table.raw_depths().tolist(), [3000])
+        self.assertEqual((capped_table[0].depth, capped_table[0].raw_depth), (100, 3000))
+
+    def test_genotyped(self):
+        self.assertEqual(self.table.genotyped().tolist(), [True, True, False])
+
+    def test_homozygotes(self):
+        self.assertEqual(self.table.homozygotes().tolist(), [True, False, False])
+
+    def test_heterozygotes(self):
+        self.assertEqual(self.table.heterozygotes().tolist(), [False, True, False])
+
+    def test_minor_allele_frequencies(self):
+        self.assertEqual(self.table.minor_allele_frequencies().tolist(), [snp.minor_allele_frequency() for snp in self.snps])
+
+    def test_off_genotype_frequencies(self):
+        self.assertEqual(self.table.off_genotype_frequencies().tolist(), [0.05, 0.1, 0.0])
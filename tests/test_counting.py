@@ -0,0 +1,287 @@
+import os
+import random
+import tempfile
+import unittest
+
+import pysam
+
+from snpahoy.counting import DecodingOptions
+from snpahoy.counting import FetchCounter
+from snpahoy.counting import ReadFilter
+from snpahoy.counting import WindowedCounter
+from snpahoy.counting import count_in_parallel
+from snpahoy.counting import make_shards
+from snpahoy.counting import make_windows
+from snpahoy.counting import open_alignment_file
+from snpahoy.metrics import Metrics
+
+
+class FakeAlignment:
+    """Reports position-dependent coverage and remembers which regions were queried."""
+
+    def __init__(self):
+        self.calls = []
+
+    def count_coverage(self, contig, start, stop, quality_threshold):
+        self.calls.append((contig, start, stop))
+        return [[position % 7 for position in range(start, stop)],
+                [position % 5 for position in range(start, stop)],
+                [position % 3 for position in range(start, stop)],
+                [quality_threshold for _ in range(start, stop)]]
+
+
+class FakeRead:
+
+    def __init__(self, reference_start, cigartuples, query_sequence, query_qualities=None, flag=0, mapping_quality=60):
+        self.reference_start = reference_start
+        self.cigartuples = cigartuples
+        self.query_sequence = query_sequence
+        self.query_qualities = query_qualities if query_qualities is not None else [30] * len(query_sequence)
+        self.flag = flag
+        self.mapping_quality = mapping_quality
+        self.reference_end = reference_start + sum(length for operation, length in cigartuples if operation in {0, 2, 3, 7, 8})
+
+
+class FakeReadsAlignment:
+    """Returns the reads overlapping a fetched region and remembers which regions were fetched."""
+
+    def __init__(self, reads):
+        self.reads = reads
+        self.calls = []
+
+    def fetch(self, contig, start, stop):
+        self.calls.append((contig, start, stop))
+        return [read for read in self.reads if read.reference_start < stop and read.reference_end > start]
+
+
+def write_alignment_file(directory, seed=0):
+    """Writes a reference FASTA file and a sorted and indexed BAM file with reads around groups
+    of SNP positions (some reads filtered, clipped, with indels or low base qualities). Returns
+    the paths of both files and the coordinates of the SNP positions."""
+
+    rng = random.Random(seed)
+    contigs = [('chr1', 20000), ('chr2', 12000)]
+    reference = {contig: ''.join(rng.choices('ACGT', k=length)) for contig, length in contigs}
+    reference_fasta_file = os.path.join(directory, 'reference.fa')
+    with open(reference_fasta_file, 'w') as f:
+        for contig, sequence in reference.items():
+            f.write(f'>{contig}\n{sequence}\n')
+    pysam.faidx(reference_fasta_file)
+
+    # Groups of positions far enough apart to be counted in separate windows.
+    coordinates = [(contig, group + offset) for contig, length in contigs for group in range(1000, length - 1000, 2500) for offset in range(0, 200, 20)]
+
+    reads = []
+    for contig, position in coordinates:
+        for _ in range(30):
+            start = position - rng.randrange(50)
+            sequence = [base if rng.random() > 0.1 else rng.choice('ACGT') for base in reference[contig][start:start + 60]]
+            cigar = rng.choice([[(0, 60)], [(4, 5), (0, 55)], [(0, 30), (1, 2), (0, 28)], [(0, 30), (2, 3), (0, 30)]])
+            reads.append((contig, start, cigar, ''.join(sequence[:sum(length for operation, length in cigar if operation != 2)]),
+                          rng.choice([0, 0, 0, 16, 0x400, 0x800]), rng.choice([0, 20, 60])))
+    reads.sort(key=lambda read: ([contig for contig, _ in contigs].index(read[0]), read[1]))
+
+    bam_file = os.path.join(directory, 'sample.bam')
+    header = {'HD': {'VN': '1.6', 'SO': 'coordinate'}, 'SQ': [{'SN': contig, 'LN': length} for contig, length in contigs]}
+    with pysam.AlignmentFile(bam_file, 'wb', header=header) as output:
+        for number, (contig, start, cigar, sequence, flag, mapping_quality) in enumerate(reads):
+            read = pysam.AlignedSegment(output.header)
+            read.query_name = f'read{number}'
+            read.flag = flag
+            read.reference_name = contig
+            read.reference_start = start
+            read.mapping_quality = mapping_quality
+            read.cigartuples = cigar
+            read.query_sequence = sequence
+            read.query_qualities = pysam.qualitystring_to_array(''.join(rng.choice('+5I') for _ in sequence))
+            output.write(read)
+    pysam.index(bam_file)
+
+    return reference_fasta_file, bam_file, coordinates
+
+
+class TestCounting(unittest.TestCase):
+
+    def test_make_windows(self):
+        coordinates = [('chr1', 5000), ('chr1', 1000), ('chr2', 1000), ('chr1', 1500), ('chr1', 1500)]
+        windows = make_windows(coordinates=coordinates, maximum_gap=1000)
+        self.assertEqual([(window.chromosome, window.start, window.stop, window.positions) for window in windows],
+                         [('chr1', 1000, 1501, [1000, 1500]),
+                          ('chr1', 5000, 5001, [5000]),
+                          ('chr2', 1000, 1001, [1000])])
+
+    def test_make_windows_maximum_size(self):
+        coordinates = [('chr1', 1000), ('chr1', 1100), ('chr1', 1200)]
+        windows = make_windows(coordinates=coordinates, maximum_gap=1000, maximum_size=150)
+        self.assertEqual([window.positions for window in windows], [[1000, 1100], [1200]])
+
+    def test_windowed_counter(self):
+        alignment = FakeAlignment()
+        coordinates = [('chr1', 1000), ('chr1', 1500), ('chr2', 1000)]
+        counter = WindowedCounter(alignment=alignment, coordinates=coordinates, minimum_base_quality=20)
+        self.assertEqual(counter('chr1', 1500), {'A': 2, 'C': 0, 'G': 0, 'T': 20})
+        self.assertEqual(counter('chr1', 1000), {'A': 6, 'C': 0, 'G': 1, 'T': 20})
+        self.assertEqual(counter('chr2', 1000), {'A': 6, 'C': 0, 'G': 1, 'T': 20})
+        self.assertEqual(alignment.calls, [('chr1', 1000, 1501), ('chr2', 1000, 1001)])
+
+    def test_windowed_counter_unknown_position(self):
+        alignment = FakeAlignment()
+        counter = WindowedCounter(alignment=alignment, coordinates=[], minimum_base_quality=1)
+        self.assertEqual(counter('chr3', 10), {'A': 3, 'C': 0, 'G': 1, 'T': 1})
+        self.assertEqual(alignment.calls, [('chr3', 10, 11)])
+
+    def test_windowed_counter_metrics(self):
+        metrics = Metrics()
+        counter = WindowedCounter(alignment=FakeAlignment(), coordinates=[('chr1', 1000), ('chr2', 1000)], minimum_base_quality=1, metrics=metrics)
+        counter('chr1', 1000)
+        self.assertEqual(list(metrics.contigs), ['chr1'])
+
+    def test_make_shards(self):
+        coordinates = [('chr1', 1000), ('chr1', 1500), ('chr1', 5000), ('chr2', 1000), ('chr3', 1000)]
+        windows = make_windows(coordinates=coordinates)
+        shards = make_shards(windows=windows, number_of_shards=2)
+        self.assertEqual([[(window.chromosome, window.start) for window in shard] for shard in shards],
+                         [[('chr1', 1000), ('chr1', 5000)], [('chr2', 1000), ('chr3', 1000)]])
+
+    def test_make_shards_more_shards_than_windows(self):
+        windows = make_windows(coordinates=[('chr1', 1000), ('chr2', 1000)])
+        self.assertEqual(len(make_shards(windows=windows, number_of_shards=8)), 2)
+
+    def test_fetch_counter(self):
+        reads = [FakeRead(reference_start=100, cigartuples=[(0, 10)], query_sequence='ACGTACGTAC'),
+                 # Soft clip, insertion and deletion: 102 is G, 103 is deleted, 104 is T.
+                 FakeRead(reference_start=100, cigartuples=[(4, 2), (0, 3), (1, 1), (2, 1), (0, 2)], query_sequence='NNAAGCTT'),
+                 # Spliced over 102 to 111.
+                 FakeRead(reference_start=98, cigartuples=[(0, 4), (3, 10), (0, 2)], query_sequence='CCCCGG'),
+                 FakeRead(reference_start=102, cigartuples=[(0, 3)], query_sequence='NGA')]
+        alignment = FakeReadsAlignment(reads=reads)
+        counter = FetchCounter(alignment=alignment, coordinates=[('chr1', 102), ('chr1', 103), ('chr1', 104), ('chr1', 110)], minimum_base_quality=1)
+        self.assertEqual(counter('chr1', 102), {'A': 0, 'C': 0, 'G': 2, 'T': 0})
+        self.assertEqual(counter('chr1', 103), {'A': 0, 'C': 0, 'G': 1, 'T': 1})
+        self.assertEqual(counter('chr1', 104), {'A': 2, 'C': 0, 'G': 0, 'T': 1})
+        self.assertEqual(counter('chr1', 110), {'A': 0, 'C': 0, 'G': 0, 'T': 0})
+        self.assertEqual(alignment.calls, [('chr1', 102, 111)])
+
+    def test_fetch_counter_base_quality(self):
+        reads = [FakeRead(reference_start=10, cigartuples=[(0, 2)], query_sequence='AC', query_qualities=[10, 30]),
+                 FakeRead(reference_start=10, cigartuples=[(0, 2)], query_sequence='AC')]
+        reads[1].query_qualities = None
+        counter = FetchCounter(alignment=FakeReadsAlignment(reads=reads), coordinates=[('chr1', 10), ('chr1', 11)], minimum_base_quality=20)
+        self.assertEqual(counter('chr1', 10), {'A': 0, 'C': 0, 'G': 0, 'T': 0})
+        self.assertEqual(counter('chr1', 11), {'A': 0, 'C': 1, 'G': 0, 'T': 0})
+        counter = FetchCounter(alignment=FakeReadsAlignment(reads=reads), coordinates=[('chr1', 10)], minimum_base_quality=0)
+        self.assertEqual(counter('chr1', 10), {'A': 2, 'C': 0, 'G': 0, 'T': 0})
+
+    def test_fetch_counter_read_filter(self):
+        reads = [FakeRead(reference_start=10, cigartuples=[(0, 1)], query_sequence='A'),
+                 FakeRead(reference_start=10, cigartuples=[(0, 1)], query_sequence='A', mapping_quality=5),
+                 FakeRead(reference_start=10, cigartuples=[(0, 1)], query_sequence='C', flag=0x800),
+                 FakeRead(reference_start=10, cigartuples=[(0, 1)], query_sequence='G', flag=0x400),
+                 FakeRead(reference_start=10, cigartuples=[(0, 1)], query_sequence='G', flag=0x100),
+                 FakeRead(reference_start=10, cigartuples=[(0, 1)], query_sequence='G', flag=0x200)]
+        counter = FetchCounter(alignment=FakeReadsAlignment(reads=reads), coordinates=[('chr1', 10)], minimum_base_quality=1)
+        self.assertEqual(counter('chr1', 10), {'A': 2, 'C': 1, 'G': 0, 'T': 0})
+        read_filter = ReadFilter(minimum_mapping_quality=20, exclude_supplementary=True)
+        counter = FetchCounter(alignment=FakeReadsAlignment(reads=reads), coordinates=[('chr1', 10)], minimum_base_quality=1, read_filter=read_filter)
+        self.assertEqual(counter('chr1', 10), {'A': 1, 'C': 0, 'G': 0, 'T': 0})
+
+    def test_fetch_counter_maximum_depth(self):
+        reads = [FakeRead(reference_start=8, cigartuples=[(0, 2)], query_sequence='GG', mapping_quality=5),
+                 # Deleted at 11, so counted at 10 only.
+                 FakeRead(reference_start=9, cigartuples=[(0, 2), (2, 1), (0, 1)], query_sequence='CCC'),
+                 FakeRead(reference_start=10, cigartuples=[(0, 2)], query_sequence='GG', query_qualities=[0, 0])]
+        reads += [FakeRead(reference_start=10, cigartuples=[(0, 2)], query_sequence='AA' if number % 2 else 'TT') for number in range(5)]
+        reads += [FakeRead(reference_start=11, cigartuples=[(0, 10)], query_sequence='G' * 10)]
+        coordinates = [('chr1', 8), ('chr1', 10), ('chr1', 11), ('chr1', 20)]
+
+        def count(maximum_depth):
+            read_filter = ReadFilter(minimum_mapping_quality=20, maximum_depth=maximum_depth)
+            counter = FetchCounter(alignment=FakeReadsAlignment(reads=reads), coordinates=coordinates, minimum_base_quality=1, read_filter=read_filter)
+            return [counter(*coordinate) for coordinate in coordinates]
+
+        # Deleted and low quality bases neither count towards the maximum depth nor the raw depth.
+        self.assertEqual(count(maximum_depth=3),
+                         [{'A': 0, 'C': 0, 'G': 0, 'T': 0, 'raw_depth': 0},
+                          {'A': 1, 'C': 1, 'G': 0, 'T': 1, 'raw_depth': 6},
+                          {'A': 1, 'C': 0, 'G': 0, 'T': 2, 'raw_depth': 6},
+                          {'A': 0, 'C': 0, 'G': 1, 'T': 0, 'raw_depth': 1}])
+        # Positions with fewer bases than the maximum depth are counted as usual.
+        read_filter = ReadFilter(minimum_mapping_quality=20)
+        counter = FetchCounter(alignment=FakeReadsAlignment(reads=reads), coordinates=coordinates, minimum_base_quality=1, read_filter=read_filter)
+        self.assertEqual([{base: position_counts[base] for base in 'ACGT'} for position_counts in count(maximum_depth=10)],
+                         [counter(*coordinate) for coordinate in coordinates])
+
+    def test_read_filter_describe(self):
+        self.assertEqual(ReadFilter().describe(), {})
+        self.assertEqual(ReadFilter(minimum_mapping_quality=20, exclude_supplementary=True).describe(),
+                         {'minimum-mapping-quality': 20, 'exclude-supplementary': True})
+        self.assertEqual(ReadFilter(maximum_depth=100).describe(), {'maximum-depth': 100})
+
+
+class TestAlignmentFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.reference_fasta_file, self.bam_file, self.coordinates = write_alignment_file(directory=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def count(self, alignment_file, reference_fasta_file=None, decoding=None, **options):
+        with open_alignment_file(alignment_file=alignment_file, reference_fasta_file=reference_fasta_file or self.reference_fasta_file, decoding=decoding) as alignment:
+            counter = FetchCounter(alignment=alignment, coordinates=self.coordinates, minimum_base_quality=20, **options)
+            return {coordinate: counter(*coordinate) for coordinate in self.coordinates}
+
+    def write_cram_file(self):
+        cram_file = os.path.join(self.directory.name, 'sample.cram')
+        with pysam.AlignmentFile(self.bam_file) as bam, pysam.AlignmentFile(cram_file, 'wc', template=bam, reference_filename=self.reference_fasta_file) as cram:
+            for read in bam:
+                cram.write(read)
+        pysam.index(cram_file)
+        return cram_file
+
+    def test_count_in_parallel(self):
+        counts = self.count(self.bam_file)
+        self.assertGreater(sum(sum(position_counts.values()) for position_counts in counts.values()), 0)
+        for workers in [1, 4]:
+            self.assertEqual(count_in_parallel(alignment_file=self.bam_file, reference_fasta_file=None, coordinates=self.coordinates,
+                                               minimum_base_quality=20, workers=workers), counts)
+
+        # Read filters are passed on to the workers.
+        read_filter = ReadFilter(minimum_mapping_quality=20, exclude_supplementary=True)
+        self.assertEqual(count_in_parallel(alignment_file=self.bam_file, reference_fasta_file=None, coordinates=self.coordinates,
+                                           minimum_base_quality=20, workers=4, read_filter=read_filter),
+                         self.count(self.bam_file, read_filter=read_filter))
+
+    def test_maximum_depth(self):
+        counts = self.count(self.bam_file)
+        for maximum_depth in [10, 40]:
+            capped_counts = self.count(self.bam_file, read_filter=ReadFilter(maximum_depth=maximum_depth))
+            for coordinate, position_counts in counts.items():
+                depth = sum(position_counts.values())
+                capped_position_counts = capped_counts[coordinate]
+                self.assertEqual(sum(capped_position_counts[base] for base in 'ACGT'), min(depth, maximum_depth))
+                self.assertEqual(capped_position_counts['raw_depth'], depth)
+                self.assertTrue(all(capped_position_counts[base] <= position_counts[base] for base in 'ACGT'))
+
+        read_filter = ReadFilter(maximum_depth=40)
+        self.assertEqual(count_in_parallel(alignment_file=self.bam_file, reference_fasta_file=None, coordinates=self.coordinates,
+                                           minimum_base_quality=20, workers=4, read_filter=read_filter), capped_counts)
+
+    def test_cram_decoding(self):
+        cram_file = self.write_cram_file()
+        counts = self.count(self.bam_file)
+        # Only the fields needed for counting are decoded.
+        for decoding in [DecodingOptions(), DecodingOptions(threads=2, verify_reference_md5=False)]:
+            self.assertEqual(self.count(cram_file, decoding=decoding), counts)
+        self.assertEqual(count_in_parallel(alignment_file=cram_file, reference_fasta_file=self.reference_fasta_file, coordinates=self.coordinates,
+                                           minimum_base_quality=20, workers=2, decoding=DecodingOptions(verify_reference_md5=False)), counts)
+
+        # Decoding with the wrong reference only fails when checksums are verified.
+        other_reference_fasta_file = os.path.join(self.directory.name, 'other.fa')
+        with pysam.FastaFile(self.reference_fasta_file) as reference, open(other_reference_fasta_file, 'w') as f:
+            for contig in reference.references:
+                f.write(f'>{contig}\n{reference.fetch(contig)[::-1]}\n')
+        with self.assertRaises(OSError):
+            self.count(cram_file, reference_fasta_file=other_reference_fasta_file)
+        self.count(cram_file, reference_fasta_file=other_reference_fasta_file, decoding=DecodingOptions(verify_reference_md5=False))
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from snpahoy.database import FingerprintDatabase
+from snpahoy.database import compare_fingerprints
+from snpahoy.database import encode_genotypes
+
+from snpahoy.exceptions import PanelMismatchError
+
+
+class TestDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database_file = os.path.join(self.directory.name, 'fingerprints.db')
+        self.coordinates = [('chr1', 1000), ('chr2', 5000), ('chr3', 2000)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_encode_genotypes(self):
+        self.assertEqual(encode_genotypes(['AA', 'CT', None]).tolist(), [[0b11000000], [0b10000000], [0b01000000], [0], [0b01000000]])
+
+    def test_compare_fingerprints(self):
+        query = encode_genotypes(['AA', 'CT', None])
+        fingerprints = np.stack([encode_genotypes(['AA', 'CT', 'GG']),
+                                 encode_genotypes(['AC', 'CT', 'GG']),
+                                 encode_genotypes([None, None, 'GG'])])
+        genotyped, concordant = compare_fingerprints(query=query, fingerprints=fingerprints)
+        self.assertEqual(genotyped.tolist(), [2, 2, 0])
+        self.assertEqual(concordant.tolist(), [2, 1, 0])
+
+    def test_add_and_query(self):
+        with FingerprintDatabase(path=self.database_file, coordinates=self.coordinates) as database:
+            database.add(name='first', genotypes=['AA', 'CT', 'GG'])
+            database.add(name='second', genotypes=['AC', 'CT', 'GG'])
+            database.add(name='third', genotypes=['AA', None, None])
+        with FingerprintDatabase(path=self.database_file, coordinates=self.coordinates) as database:
+            self.assertEqual(database.query(genotypes=['AA', 'CT', 'GG']), [('first', 1.0, 3), ('third', 1.0, 1), ('second', 2 / 3, 3)])
+            self.assertEqual(database.query(genotypes=['AA', 'CT', 'GG'], top=1), [('first', 1.0, 3)])
+
+    def test_add_replaces_sample(self):
+        with FingerprintDatabase(path=self.database_file, coordinates=self.coordinates) as database:
+            database.add(name='first', genotypes=['AA', 'CT', 'GG'])
+            database.add(name='first', genotypes=['CC', 'CT', 'GG'])
+            self.assertEqual(database.query(genotypes=['AA', 'CT', 'GG']), [('first', 2 / 3, 3)])
+
+    def test_query_empty_database(self):
+        with FingerprintDatabase(path=self.database_file, coordinates=self.coordinates) as database:
+            self.assertEqual(database.query(genotypes=['AA', 'CT', 'GG']), [])
+
+    def test_different_panel_raises_exception(self):
+        with FingerprintDatabase(path=self.database_file, coordinates=self.coordinates):
+            pass
+        with self.assertRaises(PanelMismatchError):
+            FingerprintDatabase(path=self.database_file, coordinates=self.coordinates[:2])
+
+    def test_wrong_number_of_genotypes_raises_exception(self):
+        with FingerprintDatabase(path=self.database_file, coordinates=self.coordinates) as database:
+            with self.assertRaises(PanelMismatchError):
+                database.add(name='first', genotypes=['AA', 'CT'])
@@ -0,0 +1,48 @@
+import unittest
+
+from snpahoy.metrics import Metrics
+from snpahoy.metrics import measure
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_phases_accumulate(self):
+        metrics = Metrics()
+        with metrics.phase('counting'):
+            pass
+        first = metrics.phases['counting']
+        with measure(metrics, 'counting'):
+            pass
+        self.assertGreater(metrics.phases['counting'], first)
+
+    def test_measure_without_metrics(self):
+        with measure(None, 'counting'):
+            pass
+
+    def test_merge(self):
+        metrics = Metrics()
+        metrics.add_contig_time(chromosome='chr1', seconds=1.0)
+        metrics.increment('file-opens')
+        other = Metrics()
+        other.add_contig_time(chromosome='chr1', seconds=0.5)
+        other.add_contig_time(chromosome='chr2', seconds=2.0)
+        other.increment('file-opens', 2)
+        with other.phase('counting'):
+            pass
+        metrics.merge(other)
+        self.assertEqual(metrics.contigs, {'chr1': 1.5, 'chr2': 2.0})
+        self.assertEqual(metrics.counters['file-opens'], 3)
+        self.assertNotIn('counting', metrics.phases)
+
+    def test_report(self):
+        metrics = Metrics()
+        metrics.phases['counting'] = 2.0
+        metrics.increment('sites', 1000)
+        metrics.increment('file-opens', 2)
+        report = metrics.report()
+        self.assertEqual(report['phases'], {'counting': 2.0})
+        self.assertEqual(report['sites'], 1000)
+        self.assertEqual(report['sites-per-second'], 500.0)
+        self.assertEqual(report['file-opens'], 2)
+        self.assertEqual(report['cache-hits'], 0)
+        self.assertGreater(report['peak-rss-mb'], 0.0)
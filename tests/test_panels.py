@@ -0,0 +1,86 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from snpahoy.api import compile_panel
+from snpahoy.counting import make_windows
+from snpahoy.exceptions import ContigMismatchError
+from snpahoy.exceptions import PanelFileError
+from snpahoy.panels import BasePanel
+from snpahoy.panels import CompiledPanel
+from snpahoy.panels import Panel
+from snpahoy.panels import is_panel_file
+
+
+class TestPanels(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.reference_fasta_file = self.path('reference.fa')
+        with open(self.reference_fasta_file, 'w') as f:
+            f.write('>chr1\n' + 'ACGT' * 500 + '\n>chr2\n' + 'acgt' * 25 + '\n')
+        self.bed_file = self.write_bed('panel.bed', ['chr2\t10\t12', 'chr1\t5\t8', 'chr1\t7\t9', 'chr1\t1500\t1501'])
+        self.panel_file = self.path('panel.snpahoy')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write_bed(self, name, lines):
+        with open(self.path(name), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return self.path(name)
+
+    def test_compile_panel(self):
+        panel = compile_panel(bed_file=self.bed_file, reference_fasta_file=self.reference_fasta_file, panel_file=self.panel_file)
+        bed_panel = Panel.from_bed_file(bed_file=self.bed_file)
+
+        self.assertTrue(is_panel_file(self.panel_file))
+        self.assertFalse(is_panel_file(self.bed_file))
+        self.assertIsInstance(BasePanel.load(self.panel_file), CompiledPanel)
+        self.assertIsInstance(BasePanel.load(self.bed_file), Panel)
+        with self.assertRaises(TypeError):
+            BasePanel()
+
+        self.assertEqual(len(panel), len(bed_panel))
+        self.assertEqual(panel.intervals, bed_panel.intervals)
+        self.assertEqual(panel.contigs, ['chr2', 'chr1'])
+        for contig_order in [None, ['chr1', 'chr2']]:
+            coordinates = panel.coordinates(contig_order=contig_order)
+            self.assertEqual(coordinates, bed_panel.coordinates(contig_order=contig_order))
+            self.assertEqual([(window.chromosome, window.positions) for window in panel.windows(contig_order=contig_order)],
+                             [(window.chromosome, window.positions) for window in make_windows(coordinates=coordinates)])
+        self.assertEqual(panel.reference_bases(), 'GTCGTAA')
+        self.assertEqual(panel.reference_bases(contig_order=['chr1', 'chr2']), 'CGTAAGT')
+        self.assertIsNone(bed_panel.reference_bases())
+
+        # Compiled panels are pickled as the path of the file, and BED panels as their intervals.
+        for pickled_panel in [panel, bed_panel]:
+            unpickled_panel = pickle.loads(pickle.dumps(pickled_panel))
+            self.assertIs(type(unpickled_panel), type(pickled_panel))
+            self.assertEqual(unpickled_panel.coordinates(), pickled_panel.coordinates())
+
+    def test_compile_panel_errors(self):
+        with self.assertRaises(PanelFileError):
+            bed_file = self.write_bed('other.bed', ['chr3\t10\t12'])
+            compile_panel(bed_file=bed_file, reference_fasta_file=self.reference_fasta_file, panel_file=self.panel_file)
+        with self.assertRaises(PanelFileError):
+            bed_file = self.write_bed('long.bed', ['chr2\t90\t110'])
+            compile_panel(bed_file=bed_file, reference_fasta_file=self.reference_fasta_file, panel_file=self.panel_file)
+
+    def test_check_contigs(self):
+        panel = compile_panel(bed_file=self.bed_file, reference_fasta_file=self.reference_fasta_file, panel_file=self.panel_file)
+        panel.check_contigs(contigs={'chr1': 2000, 'chr2': 100, 'chr3': 10})
+        with self.assertRaises(ContigMismatchError):
+            panel.check_contigs(contigs={'chr1': 2000})
+        with self.assertRaises(ContigMismatchError):
+            panel.check_contigs(contigs={'chr1': 2000, 'chr2': 200})
+
+        # Lengths are not known for BED files.
+        bed_panel = Panel.from_bed_file(bed_file=self.bed_file)
+        bed_panel.check_contigs(contigs={'chr1': 2000, 'chr2': 200})
+        with self.assertRaises(ContigMismatchError):
+            bed_panel.check_contigs(contigs={'chr1': 2000})
@@ -4,8 +4,12 @@ from typing import Dict
 
 from snpahoy.core import Genotyper
 
+from snpahoy.parsers import get_snp_table
 from snpahoy.parsers import get_snps
+from snpahoy.parsers import iterate_sites
+from snpahoy.parsers import merge_intervals
 from snpahoy.parsers import parse_bed_file
+from snpahoy.parsers import parse_bed_intervals
 
 
 class TestParsers(unittest.TestCase):
@@ -18,6 +22,34 @@ class TestParsers(unittest.TestCase):
 
         self.assertEqual(parse_bed_file(stream=bed_file_lines), [('chr1', 1000), ('chr2', 5000), ('chr3', 2000), ('chr3', 2001)])
 
+    def test_parse_bed_intervals(self):
+
+        bed_file_lines = ['track name=snps',
+                          'browser position chr1:1000-5000',
+                          '# Comment',
+                          '',
+                          '\t'.join(['chr1', '1000', '1001', 'rs1']),
+                          '\t'.join(['chr3', '2000', '2002']) + '\n']
+
+        self.assertEqual(list(parse_bed_intervals(stream=bed_file_lines)), [('chr1', 1000, 1001), ('chr3', 2000, 2002)])
+
+    def test_merge_intervals(self):
+
+        intervals = [('chr2', 5000, 5001), ('chr1', 1005, 1010), ('chr1', 1000, 1006), ('chr1', 1010, 1011), ('chr1', 500, 501), ('chr2', 5000, 5001)]
+
+        self.assertEqual(merge_intervals(intervals=intervals), [('chr2', 5000, 5001), ('chr1', 500, 501), ('chr1', 1000, 1011)])
+
+    def test_merge_intervals_with_contig_order(self):
+
+        intervals = [('chrX', 10, 11), ('chr2', 5000, 5001), ('chrUn', 10, 11), ('chr1', 1000, 1001)]
+
+        self.assertEqual(merge_intervals(intervals=intervals, contig_order=['chr1', 'chr2', 'chrX']),
+                         [('chr1', 1000, 1001), ('chr2', 5000, 5001), ('chrX', 10, 11), ('chrUn', 10, 11)])
+
+    def test_iterate_sites(self):
+
+        self.assertEqual(list(iterate_sites(intervals=[('chr1', 1000, 1001), ('chr3', 2000, 2002)])), [('chr1', 1000), ('chr3', 2000), ('chr3', 2001)])
+
     def test_get_snps(self):
 
         coordinates = [('chr1', 1000), ('chr2', 5000)]
@@ -39,3 +71,20 @@ class TestParsers(unittest.TestCase):
         self.assertEqual(snps[1]._position, 5000)
         self.assertEqual(snps[1]._genotype, 'CG')
         self.assertEqual(snps[1]._counts, {'A': 0, 'C': 30, 'G': 30, 'T': 0})
+
+    def test_get_snp_table(self):
+
+        coordinates = [('chr1', 1000), ('chr2', 5000)]
+        genotyper = Genotyper(minimum_coverage=30, homozygosity_threshold=0.95)
+
+        def get_counts(chromosome: str, position: int) -> Dict[str, int]:
+            counts = {('chr1', 1000): {'A': 50, 'C': 0, 'G': 0, 'T': 0},
+                      ('chr2', 5000): {'A': 0, 'C': 30, 'G': 30, 'T': 0}}
+            return counts[(chromosome, position)]
+
+        table = get_snp_table(coordinates=coordinates, genotyper=genotyper, get_counts=get_counts)
+
+        self.assertEqual(table.chromosomes, ['chr1', 'chr2'])
+        self.assertEqual(table.positions.tolist(), [1000, 5000])
+        self.assertEqual(table.genotypes, ['AA', 'CG'])
+        self.assertEqual(table.counts.tolist(), [[50, 0, 0, 0], [0, 30, 30, 0]])
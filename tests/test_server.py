@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from snpahoy.api import Settings
+from snpahoy.counting import open_alignment_file
+from snpahoy.exceptions import JobError
+from snpahoy.panels import Panel
+from snpahoy.results import germline_results
+from snpahoy.results import somatic_results
+from snpahoy.server import FingerprintServer
+from snpahoy.server import FingerprintService
+from snpahoy.server import HandlePool
+from snpahoy.server import submit
+from snpahoy.server import validate_request
+from tests.test_counting import write_alignment_file
+
+
+class FakeHandle:
+
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestHandlePool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = []
+        for name in ['a.bam', 'b.bam', 'c.bam']:
+            path = os.path.join(self.directory.name, name)
+            with open(path, 'wb') as f:
+                f.write(b'BAM')
+            self.paths.append(path)
+        self.opened = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_file(self, alignment_file, reference_fasta_file):
+        handle = FakeHandle(alignment_file)
+        self.opened.append(handle)
+        return handle
+
+    def test_reuse(self):
+        pool = HandlePool(open_file=self.open_file)
+        with pool.acquire(self.paths[0], None) as first:
+            pass
+        with pool.acquire(self.paths[0], None) as second:
+            self.assertIs(first, second)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_concurrent_jobs_get_own_handles(self):
+        pool = HandlePool(open_file=self.open_file)
+        with pool.acquire(self.paths[0], None) as first, pool.acquire(self.paths[0], None) as second:
+            self.assertIsNot(first, second)
+
+    def test_least_recently_used_closed(self):
+        pool = HandlePool(open_file=self.open_file, maximum_size=2)
+        for path in self.paths:
+            with pool.acquire(path, None):
+                pass
+        self.assertEqual([handle.closed for handle in self.opened], [True, False, False])
+
+    def test_changed_file_reopened(self):
+        pool = HandlePool(open_file=self.open_file)
+        with pool.acquire(self.paths[0], None) as first:
+            pass
+        with open(self.paths[0], 'ab') as f:
+            f.write(b'MORE')
+        with pool.acquire(self.paths[0], None) as second:
+            self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+
+    def test_handle_closed_on_error(self):
+        pool = HandlePool(open_file=self.open_file)
+        with self.assertRaises(ValueError):
+            with pool.acquire(self.paths[0], None):
+                raise ValueError
+        self.assertTrue(self.opened[0].closed)
+        with pool.acquire(self.paths[0], None):
+            pass
+        self.assertEqual(len(self.opened), 2)
+
+
+class TestServer(unittest.TestCase):
+
+    def test_validate_request(self):
+        validate_request({'mode': 'germline', 'bam_file': 'a.bam'})
+        validate_request({'mode': 'somatic', 'tumor_bam_files': ['t.bam'], 'germline_bam_file': 'n.bam'})
+        with self.assertRaises(JobError):
+            validate_request({'mode': 'tumor', 'bam_file': 'a.bam'})
+        with self.assertRaises(JobError):
+            validate_request({'mode': 'somatic', 'germline_bam_file': 'n.bam'})
+        with self.assertRaises(JobError):
+            validate_request({'mode': 'somatic', 'tumor_bam_files': ['x/t.bam', 'y/t.bam'], 'germline_bam_file': 'n.bam'})
+
+    def test_submit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            socket_file = os.path.join(directory, 'snpahoy.sock')
+            server = FingerprintServer(socket_file=socket_file, run_job=lambda request: {'bam-file': request['bam_file']})
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                self.assertEqual(submit(socket_file=socket_file, request={'mode': 'germline', 'bam_file': 'a.bam'}), {'bam-file': 'a.bam'})
+                with self.assertRaises(JobError):
+                    submit(socket_file=socket_file, request={'mode': 'germline'})
+            finally:
+                server.shutdown()
+                server.server_close()
+                thread.join()
+
+
+class TestFingerprintService(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        # Germline and tumor BAM files with different reads at the same positions.
+        self.bam_files = []
+        for name in ['germline', 'tumor']:
+            os.mkdir(os.path.join(self.directory.name, name))
+            _, bam_file, coordinates = write_alignment_file(os.path.join(self.directory.name, name), seed=len(self.bam_files))
+            self.bam_files.append(bam_file)
+        self.bed_file = os.path.join(self.directory.name, 'panel.bed')
+        with open(self.bed_file, 'w') as f:
+            for chromosome, position in coordinates:
+                f.write(f'{chromosome}\t{position}\t{position + 1}\n')
+        self.settings = Settings(minimum_coverage=10)
+        self.panel = Panel.from_bed_file(bed_file=self.bed_file)
+        self.opened = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_file(self, alignment_file, reference_fasta_file):
+        self.opened.append(alignment_file)
+        return open_alignment_file(alignment_file=alignment_file, reference_fasta_file=reference_fasta_file)
+
+    def test_results(self):
+        germline_file, tumor_file = self.bam_files
+        expected_germline = germline_results(settings=self.settings, panel=self.panel, bed_file=self.bed_file, source=germline_file,
+                                             reference_fasta_file=None, workers=1)
+        expected_somatic = somatic_results(settings=self.settings, panel=self.panel, bed_file=self.bed_file, tumors=[tumor_file],
+                                           germline=germline_file, reference_fasta_file=None, workers=1)
+
+        pool = HandlePool(open_file=self.open_file)
+        service = FingerprintService(settings=self.settings, panel=self.panel, bed_file=self.bed_file, pool=pool)
+        socket_file = os.path.join(self.directory.name, 'snpahoy.sock')
+        server = FingerprintServer(socket_file=socket_file, run_job=service.run)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            germline_reply = submit(socket_file=socket_file, request={'mode': 'germline', 'bam_file': germline_file})
+            somatic_reply = submit(socket_file=socket_file, request={'mode': 'somatic', 'tumor_bam_files': [tumor_file],
+                                                                     'germline_bam_file': germline_file})
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            pool.close()
+
+        # Replies are sent as JSON, so the expected results are compared after a round trip.
+        self.assertEqual(germline_reply, json.loads(json.dumps(expected_germline)))
+        self.assertEqual(somatic_reply, json.loads(json.dumps(expected_somatic)))
+        self.assertGreater(germline_reply['output']['summary']['snps']['genotyped'], 0)
+
+        # The germline file is opened for the first job and reused by the second.
+        self.assertEqual(self.opened, [germline_file, tumor_file])
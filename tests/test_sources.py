@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+
+from snpahoy.exceptions import CountsFileError
+from snpahoy.sources import CountsFile
+from snpahoy.sources import detect_counts_format
+from snpahoy.sources import parse_counts_tsv
+from snpahoy.sources import parse_mpileup
+from snpahoy.sources import parse_pileup_bases
+
+
+VCF_HEADER = ['##fileformat=VCFv4.2',
+              '##contig=<ID=chr1,length=100>',
+              '##INFO=<ID=END,Number=1,Type=Integer,Description="End of reference block">',
+              '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+              '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">',
+              '##FORMAT=<ID=MIN_DP,Number=1,Type=Integer,Description="Minimum depth in reference block">',
+              '\t'.join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT', 'sample'])]
+
+
+class TestSources(unittest.TestCase):
+
+    def test_detect_counts_format(self):
+        self.assertEqual(detect_counts_format('sample.mpileup.gz'), 'mpileup')
+        self.assertEqual(detect_counts_format('sample.g.vcf.gz'), 'vcf')
+        self.assertEqual(detect_counts_format('sample.bcf'), 'vcf')
+        self.assertEqual(detect_counts_format('sample.tsv'), 'tsv')
+        with self.assertRaises(CountsFileError):
+            detect_counts_format('sample.bam')
+
+    def test_parse_pileup_bases(self):
+        # Read start (with mapping quality), reference matches, insertion, deletion, read end and an N.
+        counts = parse_pileup_bases(bases='^].,+2ACaT-1G*$N', qualities='IIII#I', reference_base='c', minimum_base_quality=0)
+        self.assertEqual(counts, {'A': 1, 'C': 2, 'G': 0, 'T': 1})
+        counts = parse_pileup_bases(bases='^].,+2ACaT-1G*$N', qualities='II#I#I', reference_base='c', minimum_base_quality=20)
+        self.assertEqual(counts, {'A': 0, 'C': 2, 'G': 0, 'T': 1})
+
+    def test_parse_mpileup(self):
+        lines = ['\t'.join(['chr1', '10', 'A', '3', '.,G', 'III']),
+                 '\t'.join(['chr1', '11', 'A', '2', '..', 'II']),
+                 '\t'.join(['chr1', '12', 'A', '0', '*', '*'])]
+        self.assertEqual(list(parse_mpileup(stream=lines, sites={('chr1', 9), ('chr1', 11)}, minimum_base_quality=1)),
+                         [(('chr1', 9), {'A': 2, 'C': 0, 'G': 1, 'T': 0}),
+                          (('chr1', 11), {'A': 0, 'C': 0, 'G': 0, 'T': 0})])
+
+    def test_parse_counts_tsv(self):
+        lines = ['# Comment',
+                 '\t'.join(['chromosome', 'position', 'A', 'C', 'G', 'T']),
+                 '\t'.join(['chr1', '10', '1', '2', '3', '4']),
+                 '\t'.join(['chr1', '11', '5', '6', '7', '8'])]
+        self.assertEqual(list(parse_counts_tsv(stream=lines, sites={('chr1', 9)})), [(('chr1', 9), {'A': 1, 'C': 2, 'G': 3, 'T': 4})])
+        with self.assertRaises(CountsFileError):
+            list(parse_counts_tsv(stream=['chr1\t10\t1'], sites={('chr1', 9)}))
+
+    def test_vcf_counts(self):
+        records = [['chr1', '10', '.', 'A', '<NON_REF>', '.', '.', 'END=20', 'GT:MIN_DP', '0/0:35'],
+                   ['chr1', '21', '.', 'C', 'T,<NON_REF>', '.', '.', '.', 'GT:AD', '0/1:12,10,0'],
+                   # Split multi-allelic site, repeating the reference depth.
+                   ['chr1', '22', '.', 'G', 'GA,T', '.', '.', '.', 'GT:AD', '0/1:12,10,3'],
+                   ['chr1', '22', '.', 'G', 'C', '.', '.', '.', 'GT:AD', '0/1:12,4'],
+                   ['chr1', '23', '.', 'GT', 'G', '.', '.', '.', 'GT:AD', '0/1:12,4']]
+        with tempfile.TemporaryDirectory() as directory:
+            vcf_file = os.path.join(directory, 'sample.g.vcf')
+            with open(vcf_file, 'w') as f:
+                f.write('\n'.join(VCF_HEADER + ['\t'.join(record) for record in records]) + '\n')
+            reference_fasta_file = os.path.join(directory, 'reference.fa')
+            with open(reference_fasta_file, 'w') as f:
+                f.write('>chr1\n' + 'A' * 9 + 'AAAAAATAAA' + 'ACGGTAAAAA' + 'A' * 71 + '\n')
+
+            coordinates = [('chr1', 9), ('chr1', 15), ('chr1', 20), ('chr1', 21), ('chr1', 22), ('chr1', 50)]
+            counts = CountsFile(counts_file=vcf_file, coordinates=coordinates)
+            self.assertEqual(counts('chr1', 9), {'A': 35, 'C': 0, 'G': 0, 'T': 0})
+            self.assertEqual(counts('chr1', 15), {'A': 0, 'C': 0, 'G': 0, 'T': 0})
+            self.assertEqual(counts('chr1', 20), {'A': 0, 'C': 12, 'G': 0, 'T': 10})
+            self.assertEqual(counts('chr1', 21), {'A': 0, 'C': 4, 'G': 12, 'T': 3})
+            self.assertEqual(counts('chr1', 22), {'A': 0, 'C': 0, 'G': 0, 'T': 0})
+            self.assertEqual(counts('chr1', 50), {'A': 0, 'C': 0, 'G': 0, 'T': 0})
+
+            # With a reference, the reference base is also known inside blocks.
+            counts = CountsFile(counts_file=vcf_file, coordinates=coordinates, reference_fasta_file=reference_fasta_file)
+            self.assertEqual(counts('chr1', 15), {'A': 0, 'C': 0, 'G': 0, 'T': 35})
+
+    def test_counts_file_format(self):
+        with tempfile.TemporaryDirectory() as directory:
+            counts_file = os.path.join(directory, 'sample.txt')
+            with open(counts_file, 'w') as f:
+                f.write('\t'.join(['chr1', '10', 'A', '2', '.G', 'II']) + '\n')
+            counts = CountsFile(counts_file=counts_file, coordinates=[('chr1', 9)], counts_format='mpileup')
+            self.assertEqual(counts('chr1', 9), {'A': 1, 'C': 0, 'G': 1, 'T': 0})
@@ -0,0 +1,52 @@
+import unittest
+
+from snpahoy.core import SNP
+from snpahoy.core import SNPTable
+from snpahoy.summaries import summarize_pair
+from snpahoy.summaries import summarize_sample
+
+
+class TestSummaries(unittest.TestCase):
+
+    def test_summarize_sample(self):
+
+        snps = [SNP(chromosome='chr1', position=1000, genotype='AA', counts={'A': 48, 'C': 2, 'G': 0, 'T': 0}),
+                SNP(chromosome='chr2', position=5000, genotype='GT', counts={'A': 0, 'C': 0, 'G': 25, 'T': 25}),
+                SNP(chromosome='chr3', position=2000, genotype=None, counts={'A': 0, 'C': 5, 'G': 0, 'T': 0})]
+
+        summary = summarize_sample(snps=SNPTable.from_snps(snps))
+
+        self.assertEqual((summary.total, summary.genotyped), (3, 2))
+        self.assertEqual(summary.statistics.heterozygotes_fraction, 0.5)
+        self.assertEqual(summary.as_dict(), {'snps': {'total': 3, 'genotyped': 2},
+                                             'heterozygotes-fraction': 0.5,
+                                             'mean-maf-homozygote-sites': 0.04,
+                                             'mean-off-genotype-frequency': 0.02})
+        # Two sites are too few to estimate contamination from.
+        self.assertIsNone(summary.contamination)
+
+    def test_summarize_pair(self):
+
+        germline_snps = [SNP(chromosome='chr1', position=1000, genotype='AA', counts={'A': 48, 'C': 2, 'G': 0, 'T': 0}),
+                         SNP(chromosome='chr2', position=5000, genotype='GT', counts={'A': 0, 'C': 0, 'G': 25, 'T': 25}),
+                         SNP(chromosome='chr3', position=2000, genotype='CC', counts={'A': 0, 'C': 50, 'G': 0, 'T': 0})]
+
+        tumor_snps = [SNP(chromosome='chr1', position=1000, genotype='AA', counts={'A': 45, 'C': 5, 'G': 0, 'T': 0}),
+                      SNP(chromosome='chr2', position=5000, genotype='GG', counts={'A': 0, 'C': 0, 'G': 49, 'T': 1}),
+                      SNP(chromosome='chr3', position=2000, genotype=None, counts={'A': 0, 'C': 5, 'G': 0, 'T': 0})]
+
+        self.assertEqual(summarize_pair(germline_snps=SNPTable.from_snps(germline_snps), tumor_snps=SNPTable.from_snps(tumor_snps)).as_dict(),
+                         {'snps': {'total': 3, 'genotyped': 2},
+                          'tumor': {'heterozygotes-fraction': 0.0, 'mean-maf-homozygote-sites': 0.1, 'mean-off-genotype-frequency': 0.06},
+                          'germline': {'heterozygotes-fraction': 0.5, 'mean-maf-homozygote-sites': 0.04, 'mean-off-genotype-frequency': 0.02}})
+
+    def test_summarize_pair_nothing_genotyped(self):
+
+        germline_snps = [SNP(chromosome='chr1', position=1000, genotype=None, counts={'A': 1, 'C': 0, 'G': 0, 'T': 0})]
+        tumor_snps = [SNP(chromosome='chr1', position=1000, genotype='AA', counts={'A': 50, 'C': 0, 'G': 0, 'T': 0})]
+
+        summary = summarize_pair(germline_snps=SNPTable.from_snps(germline_snps), tumor_snps=SNPTable.from_snps(tumor_snps))
+
+        self.assertIsNone(summary.tumor)
+        self.assertIsNone(summary.germline)
+        self.assertEqual(summary.as_dict(), {'snps': {'total': 1, 'genotyped': 0}})
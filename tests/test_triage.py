@@ -0,0 +1,61 @@
+import unittest
+
+from snpahoy.core import SNP
+from snpahoy.triage import SequentialTest
+from snpahoy.triage import is_discordant
+from snpahoy.triage import shuffle_coordinates
+from snpahoy.triage import triage_pair
+
+
+def make_snps(genotypes):
+    return [SNP(chromosome='chr1', position=position, genotype=genotype, counts={'A': 0, 'C': 0, 'G': 0, 'T': 0})
+            for position, genotype in enumerate(genotypes)]
+
+
+class TestTriage(unittest.TestCase):
+
+    def test_is_discordant(self):
+        self.assertFalse(is_discordant(germline_genotype='AG', tumor_genotype='AA'))
+        self.assertFalse(is_discordant(germline_genotype='AG', tumor_genotype='AG'))
+        self.assertTrue(is_discordant(germline_genotype='AA', tumor_genotype='AG'))
+        self.assertTrue(is_discordant(germline_genotype='AA', tumor_genotype='GG'))
+
+    def test_shuffle_coordinates(self):
+        coordinates = [('chr1', position) for position in range(100)]
+        shuffled = shuffle_coordinates(coordinates=coordinates)
+        self.assertEqual(sorted(shuffled), coordinates)
+        self.assertNotEqual(shuffled, coordinates)
+        self.assertEqual(shuffle_coordinates(coordinates=coordinates), shuffled)
+        self.assertNotEqual(shuffle_coordinates(coordinates=coordinates, seed=1), shuffled)
+
+    def test_sequential_test(self):
+        test = SequentialTest(confidence=0.99)
+        test.update(discordant=False)
+        self.assertIsNone(test.decision)
+        for _ in range(30):
+            test.update(discordant=False)
+        self.assertEqual(test.decision, 'match')
+        for _ in range(5):
+            test.update(discordant=True)
+        self.assertEqual(test.decision, 'mismatch')
+        self.assertEqual((test.genotyped, test.discordant), (36, 5))
+        with self.assertRaises(ValueError):
+            SequentialTest(confidence=1.0)
+
+    def test_triage_pair(self):
+        germline_snps = make_snps(['AA', 'AG', None, 'GG'] * 100)
+
+        result = triage_pair(germline_snps=germline_snps, tumor_snps=make_snps(['AA', 'AA', 'AA', 'GG'] * 100))
+        self.assertEqual(result.decision, 'match')
+        self.assertLess(result.examined, 100)
+        self.assertEqual(result.as_dict()['snps'], {'examined': result.examined, 'genotyped': result.genotyped, 'discordant': 0})
+
+        # SNPs are only taken until the decision.
+        tumor_snps = iter(make_snps(['GG', 'AG', 'AA', 'AA'] * 100))
+        result = triage_pair(germline_snps=germline_snps, tumor_snps=tumor_snps)
+        self.assertEqual(result.decision, 'mismatch')
+        self.assertEqual(len(list(tumor_snps)), 400 - result.examined)
+
+        result = triage_pair(germline_snps=germline_snps[:8], tumor_snps=make_snps(['AA', 'AG', None, 'GG'] * 2))
+        self.assertEqual((result.decision, result.examined, result.genotyped), ('undecided', 8, 6))
+        self.assertGreater(result.confidence, 0.5)
@@ -1,8 +1,11 @@
 import unittest
 
+import numpy as np
+
 from snpahoy.core import SNP
 
 from snpahoy.utilities import count_heterozygotes
+from snpahoy.utilities import mean_frequency
 from snpahoy.utilities import mean_minor_allele_frequency
 from snpahoy.utilities import mean_off_genotype_frequency
 
@@ -27,3 +30,9 @@ class TestUtilities(unittest.TestCase):
 
     def test_mean_off_genotype_frequency_empty_list(self):
         self.assertEqual(mean_off_genotype_frequency([]), 0)
+
+    def test_mean_frequency(self):
+        self.assertEqual(mean_frequency(np.array([0.06, 0.36])), 0.21)
+
+    def test_mean_frequency_empty_array(self):
+        self.assertEqual(mean_frequency(np.array([])), 0)
@@ -0,0 +1,65 @@
+import io
+import json
+import unittest
+
+from snpahoy.core import SNP
+
+from snpahoy.writers import NDJSONWriter
+from snpahoy.writers import TSVWriter
+from snpahoy.writers import get_detail
+
+
+class TestWriters(unittest.TestCase):
+
+    def setUp(self):
+        self.snps = [SNP(chromosome='chr1', position=1000, genotype='AA', counts={'A': 95, 'C': 1, 'G': 3, 'T': 1}),
+                     SNP(chromosome='chr2', position=5000, genotype=None, counts={'A': 0, 'C': 0, 'G': 0, 'T': 0})]
+
+    def test_get_detail(self):
+        self.assertEqual(get_detail(self.snps[0]), {'depth': 100,
+                                                    'counts': {'A': 95, 'C': 1, 'G': 3, 'T': 1},
+                                                    'alleles': {'major': {'base': 'A', 'frequency': 0.95},
+                                                                'minor': {'base': 'G', 'frequency': 0.03}},
+                                                    'genotype': 'AA',
+                                                    'off_genotype_frequency': 0.05})
+
+    def test_get_detail_uncovered_position(self):
+        self.assertEqual(get_detail(self.snps[1]), {'depth': 0,
+                                                    'counts': {'A': 0, 'C': 0, 'G': 0, 'T': 0},
+                                                    'alleles': {'major': {'base': '', 'frequency': 0.0},
+                                                                'minor': {'base': '', 'frequency': 0.0}},
+                                                    'genotype': '',
+                                                    'off_genotype_frequency': 0.0})
+
+    def test_get_detail_capped_depth(self):
+        snp = SNP(chromosome='chr1', position=1000, genotype='AA', counts={'A': 200, 'C': 0, 'G': 0, 'T': 0}, raw_depth=3000)
+        detail = get_detail(snp)
+        self.assertEqual((detail['depth'], detail['raw_depth']), (200, 3000))
+
+    def test_ndjson_writer(self):
+        stream = io.StringIO()
+        NDJSONWriter(stream).write(sample='normal', snps=self.snps)
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([(record['sample'], record['snp'], record['genotype']) for record in records], [('normal', 'chr1:1000', 'AA'), ('normal', 'chr2:5000', '')])
+        self.assertEqual(records[0]['counts'], {'A': 95, 'C': 1, 'G': 3, 'T': 1})
+
+    def test_tsv_writer(self):
+        stream = io.StringIO()
+        TSVWriter(stream).write(sample='normal', snps=self.snps)
+        self.assertEqual(stream.getvalue().splitlines(),
+                         ['\t'.join(TSVWriter.COLUMNS),
+                          '\t'.join(['normal', 'chr1:1000', '100', '100', '95', '1', '3', '1', 'A', '0.95', 'G', '0.03', 'AA', '0.05', '', '']),
+                          '\t'.join(['normal', 'chr2:5000', '0', '0', '0', '0', '0', '0', '', '0.0', '', '0.0', '', '0.0', '', ''])])
+
+    def test_reference_alleles(self):
+        snp = SNP(chromosome='chr1', position=1000, genotype='AG', counts={'A': 50, 'C': 0, 'G': 50, 'T': 0}, reference='G')
+        detail = get_detail(snp)
+        self.assertEqual((detail['reference'], detail['alternate']), ('G', 'A'))
+
+        stream = io.StringIO()
+        TSVWriter(stream).write(sample='normal', snps=[snp])
+        self.assertEqual(stream.getvalue().splitlines()[1].split('\t')[-2:], ['G', 'A'])
+
+        snp = SNP(chromosome='chr1', position=1000, genotype='CT', counts={'A': 0, 'C': 50, 'G': 0, 'T': 50}, reference='G')
+        self.assertEqual(snp.alternate, 'C,T')
+        self.assertNotIn('reference', get_detail(self.snps[0]))